@@ -0,0 +1,279 @@
+"""Offline benchmarks for the Notecard host code used by this sample.
+
+No Notecard is needed; the Notecard is simulated in-process. Run from this
+folder, for example:
+
+    python benchmark.py serial-receive
+    python benchmark.py upload --latency 0.05 --bandwidth 20000
+"""
+import argparse
+import binascii
+import io
+import json
+import os
+import time
+import tracemalloc
+import zlib
+
+import notecard
+import notecard.binary_helpers
+import notecard.notecard
+import notecardDataTransfer
+from notecard.cobs import _cobs_encode_fast, _cobs_decode_fast, _cobs_encode_loop, _cobs_decode_loop
+from notecard import json_backend
+from notecard.crc32 import crc32, _crc32_table
+from notecard.timeout import start_timeout, has_timed_out
+from testutil import FakeNotecard, FakeUart, halfByteCrc32
+
+
+class ByteAtATimeSerial(notecard.OpenSerial):
+    """OpenSerial with the original one-byte-per-read receive loop."""
+
+    def receive(self, timeout_secs=notecard.CARD_INTRA_TRANSACTION_TIMEOUT_SEC,
+                delay=True):
+        data = bytearray()
+        received_newline = False
+        start = start_timeout()
+
+        while not received_newline:
+            while not self._available():
+                if timeout_secs != 0 and has_timed_out(start, timeout_secs):
+                    raise Exception('Timed out waiting to receive data from Notecard.')
+                if delay and len(data) == 0:
+                    time.sleep(.001)
+
+            timeout_secs = notecard.CARD_INTRA_TRANSACTION_TIMEOUT_SEC
+            start = start_timeout()
+            byte = self._read_byte()
+            data.extend(byte)
+            received_newline = byte == b'\n'
+
+        return data
+
+
+def _timeIt(fcn, repeat):
+    best = None
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        fcn()
+        elapsed = time.perf_counter() - startTime
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _report(name, numBytes, seconds):
+    print(f"{name:<28} {numBytes / seconds / (1024 * 1024):10.2f} MB/s  ({seconds * 1000:.2f} ms)")
+
+
+def benchSerialReceive(args):
+    payload = bytes(range(11, 255)) * (args.size // 244) + b'\n'
+    print(f"serial receive: {len(payload)} byte response, {args.block} bytes waiting per read")
+
+    for name, cls in (("byte-at-a-time (before)", ByteAtATimeSerial),
+                      ("block read (after)", notecard.OpenSerial)):
+        uart = FakeUart(maxWaiting=args.block)
+        card = cls(uart)
+
+        def run():
+            uart.feed(payload)
+            card.receive(delay=False)
+
+        _report(name, len(payload), _timeIt(run, args.repeat))
+
+
+def benchCrc32(args):
+    data = os.urandom(args.size)
+    print(f"crc32: {len(data)} bytes")
+
+    for name, fcn in (("half-byte table (before)", halfByteCrc32),
+                      ("256-entry table", _crc32_table),
+                      ("crc32() (after)", crc32)):
+        _report(name, len(data), _timeIt(lambda: fcn(data), args.repeat))
+
+
+def benchCobs(args):
+    data = os.urandom(args.size)
+    encoded = _cobs_encode_fast(data, ord('\n'))
+    print(f"cobs: {len(data)} bytes")
+
+    for name, fcn, arg in (("encode loop (before)", _cobs_encode_loop, data),
+                           ("encode fast (after)", _cobs_encode_fast, data),
+                           ("decode loop (before)", _cobs_decode_loop, encoded),
+                           ("decode fast (after)", _cobs_decode_fast, encoded)):
+        _report(name, len(data), _timeIt(lambda: fcn(arg, ord('\n')), args.repeat))
+
+
+class CpuTimer:
+    """Add up the CPU time spent in a module-level function while in use."""
+
+    def __init__(self, module, name):
+        self.seconds = 0.0
+        self._module = module
+        self._name = name
+        self._fcn = getattr(module, name)
+
+    def __enter__(self):
+        def timed(*args, **kwargs):
+            startTime = time.thread_time()
+            try:
+                return self._fcn(*args, **kwargs)
+            finally:
+                self.seconds += time.thread_time() - startTime
+
+        setattr(self._module, self._name, timed)
+        return self
+
+    def __exit__(self, *exc):
+        setattr(self._module, self._name, self._fcn)
+
+
+UPLOADERS = {
+    "binary": notecardDataTransfer.BinaryDataUploader,
+    "legacy": notecardDataTransfer.BinaryDataUploaderLegacy,
+}
+
+
+def _makeUpload(args, name, keepData):
+    """Connect an uploader to a simulated Notecard over a fake UART."""
+    fake = FakeNotecard(binaryMax=args.binary_max, latency=args.latency,
+                        bandwidth=args.bandwidth or None, keepData=keepData)
+    card = notecard.OpenSerial(FakeUart(fake.respond, record=False))
+    card.SetPacing(args.pacing)
+
+    uploader = UPLOADERS[name](card, "web.post", "benchmark", printFcn=lambda *a: None,
+                               waitForNotehubConnection=False, setTempContinuousMode=False)
+    if name == "binary":
+        if args.binary_size:
+            uploader.setBinaryBuffSize(args.binary_size)
+        uploader.setAdaptiveChunkSize(args.adaptive)
+        uploader.setPipelined(args.pipeline)
+        if args.compress:
+            uploader.setCompression(args.compress)
+
+    return fake, uploader
+
+
+def benchUpload(args):
+    content = os.urandom(args.size // 2) + bytes(args.size - args.size // 2)
+    print(f"upload: {len(content)} bytes (half random, half zeros), {args.latency * 1000:.0f} ms per request, " +
+          f"{args.bandwidth or 'unlimited'} bytes/s to Notehub, {args.pacing} pacing")
+
+    names = list(UPLOADERS) if args.uploader == "both" else [args.uploader]
+    for name in names:
+        fake, uploader = _makeUpload(args, name, keepData=True)
+        with CpuTimer(notecard.binary_helpers, "cobs_encode") as cobs, \
+                CpuTimer(notecard.binary_helpers, "_md5_hash") as md5, \
+                CpuTimer(notecard.notecard, "crc32") as crc:
+            startCpu = time.process_time()
+            startTime = time.perf_counter()
+            uploader.upload(io.BytesIO(content))
+            seconds = time.perf_counter() - startTime
+            cpuSeconds = time.process_time() - startCpu
+
+        uploaded = fake.uploadedBytes()
+        if args.compress and name == "binary":
+            # Accepts either a gzip or a zlib header
+            uploaded = zlib.decompress(uploaded, 32 + zlib.MAX_WBITS)
+        if uploaded != content:
+            print(f"{name}: the uploaded data doesn't match the file")
+
+        # Peak memory is measured on a second run, because tracing slows everything down
+        fake, uploader = _makeUpload(args, name, keepData=False)
+        tracemalloc.start()
+        uploader.upload(io.BytesIO(content))
+        peakBytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        megabytes = len(content) / (1024 * 1024)
+        print(f"{name:<8} {len(content) / 1024 / seconds:10.1f} KB/s  {seconds:.2f} s  " +
+              f"{len(fake.requests) / megabytes:.0f} round trips/MB  peak memory {peakBytes / 1024:.0f} KB")
+        print(f"{'':<8} CPU {cpuSeconds * 1000:.0f} ms: COBS {cobs.seconds * 1000:.1f} ms, " +
+              f"MD5 {md5.seconds * 1000:.1f} ms, CRC {crc.seconds * 1000:.1f} ms")
+
+
+def stringCrcCheckAndParse(card, rsp_bytes):
+    """The original response path: parse, strip the CRC field as a string, parse again."""
+    rsp_json = json.loads(rsp_bytes)
+    seq_number, crc = rsp_json['crc'].split(':')
+    rsp_str = rsp_bytes.decode()
+    rsp_str_crc_removed = rsp_str.split('"crc":')[0]
+    if rsp_str_crc_removed[-1] == ',':
+        rsp_str_crc_removed = rsp_str_crc_removed[:-1] + '}'
+    else:
+        rsp_str_crc_removed = rsp_str_crc_removed.rstrip() + '}'
+    if int(crc, 16) != crc32(rsp_str_crc_removed.encode('utf-8')):
+        raise Exception("CRC error")
+    return json.loads(rsp_bytes)
+
+
+def byteCrcCheckAndParse(card, rsp_bytes):
+    """The current response path: parse once, check the CRC on the bytes."""
+    rsp_json = json_backend.loads(rsp_bytes)
+    if card._crc_error(rsp_bytes, rsp_json):
+        raise Exception("CRC error")
+    return rsp_json
+
+
+def benchResponse(args):
+    notes = {f"note{i}": {"body": {"temp": 21.5 + i, "humidity": 40.25, "site": "north-field"}, "time": 1700000000 + i}
+             for i in range(args.size // 90)}
+    body = json.dumps({"notes": notes}, separators=(',', ':')).encode()
+    crc = binascii.crc32(body) & 0xFFFFFFFF
+    rsp_bytes = bytearray(body[:-1] + f',"crc":"0000:{crc:08x}"}}\r\n'.encode())
+    card = notecard.OpenSerial(FakeUart())
+    card._card_supports_crc = True
+    print(f"response: {len(rsp_bytes)} byte note.changes style response, JSON backend {json_backend.backend}")
+
+    for name, fcn in (("string CRC, 2 parses (before)", stringCrcCheckAndParse),
+                      ("byte CRC, 1 parse (after)", byteCrcCheckAndParse)):
+        _report(name, len(rsp_bytes), _timeIt(lambda: fcn(card, rsp_bytes), args.repeat))
+
+
+def parseCommandLineArgs():
+    p = argparse.ArgumentParser(description=__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-r", "--repeat", help="Number of runs; the best is reported. Not used by upload",
+                   default=5, type=int)
+    sub = p.add_subparsers(dest="benchmark", required=True)
+
+    s = sub.add_parser("serial-receive", help="OpenSerial.receive throughput against a fake UART")
+    s.add_argument("-s", "--size", help="Response size in bytes", default=100 * 1024, type=int)
+    s.add_argument("-k", "--block", help="Bytes the fake UART reports as waiting per read", default=4096, type=int)
+    s.set_defaults(fcn=benchSerialReceive)
+
+    s = sub.add_parser("crc32", help="CRC32 implementations used for request/response CRCs")
+    s.add_argument("-s", "--size", help="Input size in bytes", default=8 * 1024, type=int)
+    s.set_defaults(fcn=benchCrc32)
+
+    s = sub.add_parser("cobs", help="COBS encoding and decoding of card.binary data")
+    s.add_argument("-s", "--size", help="Input size in bytes", default=256 * 1024, type=int)
+    s.set_defaults(fcn=benchCobs)
+
+    s = sub.add_parser("response", help="CRC check and JSON parsing of a Notecard response")
+    s.add_argument("-s", "--size", help="Approximate response size in bytes", default=8 * 1024, type=int)
+    s.set_defaults(fcn=benchResponse)
+
+    s = sub.add_parser("upload", help="BinaryDataUploader and BinaryDataUploaderLegacy against a simulated Notecard")
+    s.add_argument("-s", "--size", help="File size in bytes", default=256 * 1024, type=int)
+    s.add_argument("-u", "--uploader", choices=["binary", "legacy", "both"], default="both")
+    s.add_argument("-l", "--latency", help="Seconds each Notecard request takes", default=0.0, type=float)
+    s.add_argument("-w", "--bandwidth", help="Bytes per second web requests send to Notehub. 0 for no limit",
+                   default=0, type=int)
+    s.add_argument("-m", "--binary-max", help="Capacity of the simulated binary store", default=64 * 1024, type=int)
+    s.add_argument("-B", "--binary-size", help="Size of binary data sent in each transaction", type=int)
+    s.add_argument("--pacing", choices=["safe", "fast", "auto", "tune"], default="fast")
+    s.add_argument("-A", "--adaptive", help="Adapt the chunk size to the measured throughput", action="store_true")
+    s.add_argument("-P", "--pipeline", help="Encode the next chunk while the current one is sent", action="store_true")
+    s.add_argument("-z", "--compress", choices=["gzip", "zlib"])
+    s.set_defaults(fcn=benchUpload)
+
+    return p.parse_args()
+
+
+def main():
+    args = parseCommandLineArgs()
+    args.fcn(args)
+
+
+if __name__ == "__main__":
+    main()
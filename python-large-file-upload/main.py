@@ -4,7 +4,13 @@ import logging
 import configargparse
 import time
 import notecardDataTransfer
+from uploadJournal import UploadJournal
+from notecard.metrics import MetricsCollector
+from notecard.pacing import PacingProfileStore, TuningPacingPolicy
 import os
+import glob
+import re
+import sys
 
 # Define default options
 DEFAULT_SERIAL_PORT_ID = "COM4"
@@ -15,6 +21,11 @@ DEFAULT_ROUTE_NAME = "ping"
 DEFAULT_WEB_REQUEST_TIMEOUT = 30
 DEFAULT_MEASURE_TRANSFER_TIME = True
 DEFAULT_CONNECTION_TIMEOUT_SECS = 90
+DEFAULT_PACING = "safe"
+DEFAULT_RESUME_JOURNAL = "./upload_journal.json"
+DEFAULT_SERIAL_LOCK_PATH = "serial.lock"
+DEFAULT_SERIAL_LOCK = "file"
+DEFAULT_PACING_PROFILES = "./pacing_profiles.json"
 
 
 ## Function to parse command-line arguments
@@ -28,10 +39,10 @@ def parseCommandLineArgs():
     p = configargparse.ArgumentParser(description=DESCRIPTION,
                                       default_config_files=['./config.txt'])
 
-    p.add("-p", "--port", help="Serial port identifier for port connected to Notecard", default=DEFAULT_SERIAL_PORT_ID)
+    p.add("-p", "--port", help="Serial port identifier for port connected to Notecard. Separate several ports with commas to upload over several Notecards at once", default=DEFAULT_SERIAL_PORT_ID)
     p.add("-b", "--baudrate", help="Serial port baudrate (bps)", default=DEFAULT_PORT_BAUDRATE, type = int)
     p.add("-r", "--route", help="Name of route Notecard web request transactions will use", default=DEFAULT_ROUTE_NAME)
-    p.add("-f", "--file", help="File to use as data source for transfer", required=True)
+    p.add("-f", "--file", help="File to use as data source for transfer. Use '-' to stream from stdin. A directory or glob pattern (e.g. 'spool/*.csv') uploads every matching file in one batch", required=True)
     p.add("-c", "--connection-timeout", help="Time in seconds to wait for Notecard to connect to Notehub before throwing exception", default=DEFAULT_CONNECTION_TIMEOUT_SECS, type=int)
     p.add("-d", "--debug", help="Log debug messages", action='store_true')
     p.add("-l", "--log-folder", help="Directory where log files are stored", default=DEFAULT_LOG_FOLDER, env_var="LOG_FOLDER")
@@ -44,8 +55,23 @@ def parseCommandLineArgs():
     p.add("-B", "--binary-size", help="Size of binary data to send in each transaction", type=int)
     p.add("-w", "--web-req-method", help="HTTP request method (PUT, POST, etc)", default="POST")
     p.add("-s", "--cloud-service", type=str, choices=['azure', 'aws', 'gcp'], help="Specify the cloud provider (azure, aws, gcp)")
+    p.add("-A", "--adaptive-binary-size", help="Adapt the size of binary data sent in each transaction to the measured throughput. -B sets the upper limit", action='store_true')
+    p.add("-z", "--compress", choices=['gzip', 'zlib'], help="Compress the file before sending it. The route receives a gzip (or zlib) stream")
+    p.add("-P", "--pipeline", help="Read and encode the next chunk while the current chunk is being sent to Notehub", action='store_true')
+    p.add("--resume", help="Resume interrupted uploads. Progress is kept in the given journal file (default: %(const)s)", nargs='?', const=DEFAULT_RESUME_JOURNAL)
+    p.add("--stream-size", help="Number of bytes to expect when streaming from stdin or a pipe. If not given, the total is finalized on the last chunk", type=int)
+    p.add("--stripe-size", help="Size of the ranges a single file is split into when it is striped across several Notecards", default=notecardDataTransfer.DEFAULT_STRIPE_SIZE, type=int)
+    p.add("--pack", help="In batch mode, pack small files together into shared binary transfers. The web request name carries a manifest of name:offset:length for each file", action='store_true')
+    p.add("--metrics", help="Measure every Notecard transaction and print a summary per request type at the end", action='store_true')
+    p.add("--serial-lock", choices=notecard.SERIAL_LOCK_STRATEGIES, help="How the serial port is locked. 'file' uses a lock file in the working directory, 'device' a lock file named after the port that every process shares, 'thread' an in-process lock for when only this process uses the port, 'none' no lock", default=DEFAULT_SERIAL_LOCK)
+    p.add("--pacing", choices=['safe', 'fast', 'auto', 'tune'], help="How fast requests are pushed to the Notecard. 'fast' suits USB connections, 'auto' backs off on I/O errors, 'tune' finds the fastest pacing without errors and saves it for the Notecard", default=DEFAULT_PACING)
+    p.add("--pacing-profiles", help="File where pacing tuned with '--pacing tune' is kept for each Notecard", default=DEFAULT_PACING_PROFILES)
 
     opts = p.parse_args()
+    if opts.pack and opts.compress:
+        ## Packs are sent uncompressed, so they can't honour -z
+        p.error("--pack can't be combined with -z/--compress")
+
     hub_config = {}
     if opts.mode:
         hub_config['mode'] = opts.mode
@@ -58,13 +84,97 @@ def parseCommandLineArgs():
 
     return opts
 
-def connectToNotecard(opts):
+def connectToNotecard(opts, port, lockPath=DEFAULT_SERIAL_LOCK_PATH):
     ## Connect to Notecard
-    port = serial.Serial(opts.port, baudrate=opts.baudrate)
-    card = notecard.OpenSerial(port, debug=opts.debug)
+    serialPort = serial.Serial(port, baudrate=opts.baudrate)
+    card = notecard.OpenSerial(serialPort, debug=opts.debug, lock_path=lockPath, lock_strategy=opts.serial_lock)
+    card.SetPacing(opts.pacing)
 
     return card
 
+def serialLockPath(port):
+    ## Serial lock file for one of several Notecards, so they don't wait for each other
+    return f"serial-{re.sub('[^A-Za-z0-9]+', '_', port).strip('_')}.lock"
+
+def createUploader(opts, card, journal=None):
+    if opts.web_req_method.upper() == "PUT":
+        req = "web.put"
+    elif opts.web_req_method.upper() == "POST":
+        req = "web.post"
+    else:
+        raise(Exception(f"Error: Invalid web request method: {opts.web_req_method}, options are 'PUT' or 'POST'"))
+
+    if opts.legacy:
+        uploader = notecardDataTransfer.BinaryDataUploaderLegacy(
+            card,
+            req,
+            opts.route,
+            printFcn=logging.debug,
+            timeout=opts.timeout,
+            )
+    else:
+        uploader = notecardDataTransfer.BinaryDataUploader(
+            card,
+            req,
+            opts.route,
+            printFcn=logging.debug,
+            timeout=opts.timeout,
+            )
+
+    if opts.cloud_service:
+        uploader.setCloudService(opts.cloud_service)
+
+    if opts.binary_size:
+        uploader.setBinaryBuffSize(opts.binary_size)
+
+    if opts.adaptive_binary_size and not opts.legacy:
+        uploader.setAdaptiveChunkSize()
+
+    if opts.compress and not opts.legacy:
+        uploader.setCompression(opts.compress)
+
+    if opts.pipeline and not opts.legacy:
+        uploader.setPipelined()
+
+    if journal is not None and not opts.legacy:
+        uploader.setResumeJournal(journal)
+
+    return uploader
+
+def findBatchFiles(pathOrPattern):
+    ## Return the files to upload in batch mode, or None if pathOrPattern is a single file
+    if os.path.isdir(pathOrPattern):
+        paths = [os.path.join(pathOrPattern, n) for n in os.listdir(pathOrPattern)]
+    elif any(c in pathOrPattern for c in "*?["):
+        paths = glob.glob(pathOrPattern)
+    else:
+        return None
+
+    return sorted(p for p in paths if os.path.isfile(p))
+
+def printReport(opts, report):
+    if opts.debug:
+        logging.info(report)
+    else:
+        print(report)
+
+def batchReport(results, elapsedSeconds):
+    lines = []
+    for r in results:
+        card = f"[card {r['card']}] " if r.get("card") is not None else ""
+        if r["error"] is None:
+            lines.append(f"{card}{r['path']}: {r['bytes']/1024:.1f} KB in {r['seconds']:.2f} seconds " +
+                         f"({r['bytes']/1024/max(r['seconds'], 1e-6):.1f} KB/s)")
+        else:
+            lines.append(f"{card}{r['path']}: FAILED after {r['seconds']:.2f} seconds: {r['error']}")
+
+    sent = [r for r in results if r["error"] is None]
+    totalBytes = sum(r["bytes"] for r in sent)
+    lines.append(f"Sent {len(sent)} of {len(results)} files, {totalBytes/1024:.1f} KB in {elapsedSeconds:.2f} seconds " +
+                 f"({totalBytes/1024/max(elapsedSeconds, 1e-6):.1f} KB/s)")
+
+    return "\n".join(lines)
+
 ## Notecard Request Method
 def sendRequest(card, req, args=None, errRaisesException=True):
     if isinstance(req,str):
@@ -102,66 +212,135 @@ def main():
 
     logging.info(opts)
 
-    card = connectToNotecard(opts)
-
-    ## Log Notecard Info
-    rsp = sendRequest(card, "card.version")
-    logging.info(f"NOTECARD INFO Device: {rsp['device']} SKU: {rsp['sku']} Firmware Version: {rsp['version']}")
-
-
-    if opts.hub_config:
-        sendRequest(card, "hub.set", opts.hub_config)
-        logging.info(f"HUB config: {opts.hub_config}")
-
-
-    if opts.web_req_method.upper() == "PUT":
-        req = "web.put"
-    elif opts.web_req_method.upper() == "POST":
-        req = "web.post"
-    else:
-        raise(Exception(f"Error: Invalid web request method: {opts.web_req_method}, options are 'PUT' or 'POST'"))
-
-    if opts.legacy:
-        uploader = notecardDataTransfer.BinaryDataUploaderLegacy(
-            card,
-            req,
-            opts.route,
-            printFcn=logging.debug,
-            timeout=opts.timeout,
-            )
-    else:
-        uploader = notecardDataTransfer.BinaryDataUploader(
-            card,
-            req,
-            opts.route,
-            printFcn=logging.debug,
-            timeout=opts.timeout,
-            )
-
-    if opts.cloud_service:
-        uploader.setCloudService(opts.cloud_service)
+    ## Several comma separated ports upload a batch over several Notecards at once
+    ports = opts.port.split(",")
+    uploaders = []
+    # Uploaders share one journal, so they don't overwrite each other's progress
+    journal = UploadJournal(opts.resume) if opts.resume else None
+    collectors = []
+    pacingStore = PacingProfileStore(opts.pacing_profiles) if opts.pacing == "tune" else None
+    devices = []
+    for port in ports:
+        lockPath = DEFAULT_SERIAL_LOCK_PATH if len(ports) == 1 else serialLockPath(port)
+        card = connectToNotecard(opts, port, lockPath)
+
+        ## Log Notecard Info
+        rsp = sendRequest(card, "card.version")
+        logging.info(f"NOTECARD INFO Port: {port} Device: {rsp['device']} SKU: {rsp['sku']} Firmware Version: {rsp['version']}")
+        devices.append((rsp['device'], card))
+
+        if pacingStore is not None:
+            ## Pacing tuned in an earlier run is used as is
+            pacing = pacingStore.load(rsp['device'])
+            if pacing is not None:
+                card.SetPacing(pacing)
+                logging.info(f"Pacing for {rsp['device']}: {pacing.segment_max_len} byte segments, {pacing.segment_delay_ms} ms segment delay, {pacing.chunk_delay_ms} ms chunk delay, {pacing.chunk_pause_ms} ms chunk pause")
+
+        if opts.hub_config:
+            sendRequest(card, "hub.set", opts.hub_config)
+            logging.info(f"HUB config: {opts.hub_config}")
+
+        if opts.metrics:
+            # One collector per Notecard, since each runs on its own thread when there are several
+            collectors.append(MetricsCollector())
+            card.SetMetricsSink(collectors[-1])
+
+        uploaders.append(createUploader(opts, card, journal))
+
+    try:
+        uploadFile(opts, ports, uploaders)
+    finally:
+        for port, collector in zip(ports, collectors):
+            printReport(opts, f"Notecard transactions on {port}:\n{collector.summary()}")
+
+        if pacingStore is not None:
+            savePacing(pacingStore, devices)
+
+def savePacing(pacingStore, devices):
+    ## Keep the pacing of every Notecard that finished tuning, so the next run doesn't tune again
+    for device, card in devices:
+        pacing = card.GetPacing()
+        if isinstance(pacing, TuningPacingPolicy) and pacing.tuned:
+            pacingStore.save(device, pacing)
+            logging.info(f"Saved pacing for {device}: {pacing.segment_max_len} byte segments, {pacing.segment_delay_ms} ms segment delay, {pacing.chunk_delay_ms} ms chunk delay, {pacing.chunk_pause_ms} ms chunk pause")
+
+def uploadFile(opts, ports, uploaders):
+    uploader = uploaders[0]
 
     if opts.include_file_name:
         fileName = os.path.basename(os.path.normpath(opts.file))
         uploader.setFileName(fileName)
 
-    if opts.binary_size:
-        uploader.setBinaryBuffSize(opts.binary_size)
+    batchFiles = findBatchFiles(opts.file)
+    if len(uploaders) > 1:
+        multiUploader = notecardDataTransfer.MultiCardUploader(uploaders, printFcn=logging.debug)
+        if batchFiles is not None:
+            startTime = time.time()
+            results = multiUploader.uploadFiles(batchFiles)
+            endTime = time.time()
+
+            printReport(opts, batchReport(results, endTime - startTime))
+            return
+
+        # A single file is striped across the Notecards
+        if opts.include_file_name:
+            multiUploader.setFileName(os.path.basename(os.path.normpath(opts.file)))
+
+        with open(opts.file, 'rb') as f:
+            startTime = time.time()
+            multiUploader.upload(f, stripeSize=opts.stripe_size)
+            endTime = time.time()
+
+        if opts.measure_elapsed_time:
+            stats = multiUploader.lastUploadStats
+            report = f"Sent file: {opts.file}\n{stats['bytes']/1024} KB\n{endTime-startTime} seconds"
+            for index, cardBytes in enumerate(stats["cardBytes"]):
+                report += f"\nCard {index} ({ports[index]}): {cardBytes/1024} KB"
+            report += f"\n{stats['retries']} ranges retried"
+            printReport(opts, report)
+        return
+
+    if batchFiles is not None:
+        # File names are always included in batch mode, so the uploads can be told apart
+        startTime = time.time()
+        if opts.pack and not opts.legacy:
+            results = uploader.uploadFilesPacked(batchFiles)
+        else:
+            results = uploader.uploadFiles(batchFiles)
+        endTime = time.time()
+
+        printReport(opts, batchReport(results, endTime - startTime))
+        return
 
     startTime = 0
     fileSizeInBytes = 0
-    with open(opts.file, 'rb') as f:
+    with (sys.stdin.buffer if opts.file == "-" else open(opts.file, 'rb')) as f:
         startTime = time.time()
-        uploader.upload(f)
+        if f.seekable():
+            uploader.upload(f)
+            fileSizeInBytes = f.seek(0,2)
+        elif opts.legacy:
+            raise Exception("The legacy upload method can't stream. Upload a regular file instead")
+        else:
+            # Pipes and stdin are streamed without being written to disk first
+            uploader.uploadStream(f, opts.stream_size)
+            stats = uploader.lastUploadStats
+            fileSizeInBytes = stats.get("uncompressedBytes", stats["bytes"])
         endTime = time.time()
-        fileSizeInBytes = f.seek(0,2)
 
 
     if opts.measure_elapsed_time:
-        if opts.debug:
-            logging.info(f"Sent file: {opts.file}\n{fileSizeInBytes/1024} KB\n{endTime-startTime} seconds")
-        else:
-            print(f"Sent file: {opts.file}\n{fileSizeInBytes/1024} KB\n{endTime-startTime} seconds")
+        report = f"Sent file: {opts.file}\n{fileSizeInBytes/1024} KB\n{endTime-startTime} seconds"
+
+        stats = uploader.lastUploadStats
+        if "uncompressedBytes" in stats:
+            report += f"\nCompressed to {stats['bytes']/1024} KB"
+
+        if stats.get("chunks"):
+            report += f"\n{stats['chunks']} chunks, {stats['transactions']} Notecard transactions " + \
+                      f"({stats['transactions']/stats['chunks']:.1f} per chunk)"
+
+        printReport(opts, report)
 
 if __name__ == "__main__":
     main()
@@ -35,48 +35,74 @@ def binary_store_reset(card: Notecard):
             f'Error in response to card.binary delete request: {rsp["err"]}.')
 
 
-def binary_store_transmit(card: Notecard, data: bytearray, offset: int):
-    """Write bytes to index `offset` of the binary data store."""
-    # Make a copy of the data to transmit. We do not modify the user's passed in
-    # `data` object.
-    tx_data = bytearray(data)
-    rsp = card.Transaction({'req': 'card.binary'})
+def binary_store_encode(data: bytearray):
+    """Encode bytes for transmission to the binary data store.
+
+    Returns a tuple of the newline-terminated COBS encoding of `data` and its
+    MD5 digest. Passing this to `binary_store_transmit` lets the encoding be
+    done ahead of time, e.g. while the Notecard is busy with another request.
+    """
+    return cobs_encode(data, ord('\n'), terminate=True), _md5_hash(data)
 
-    # Ignore `{bad-bin}` errors, because we intend to overwrite the data.
-    if 'err' in rsp and '{bad-bin}' not in rsp['err']:
-        raise Exception(rsp['err'])
 
-    if 'max' not in rsp or rsp['max'] == 0:
+def binary_store_transmit(card: Notecard, data: bytearray, offset: int,
+                          encoded=None, known_max=None):
+    """Write bytes to index `offset` of the binary data store.
+
+    `data` may be any bytes-like object, such as a bytearray or a memoryview
+    of one. It is only read, never copied or modified. `encoded` is the
+    result of `binary_store_encode(data)`, if already computed.
+
+    If the caller already knows the store's capacity and that it holds exactly
+    `offset` bytes (e.g. right after `binary_store_reset`), passing the
+    capacity as `known_max` skips the initial card.binary query.
+    """
+    if known_max is None:
+        rsp = card.Transaction({'req': 'card.binary'})
+
+        # Ignore `{bad-bin}` errors, because we intend to overwrite the data.
+        if 'err' in rsp and '{bad-bin}' not in rsp['err']:
+            raise Exception(rsp['err'])
+
+        max_len = rsp['max'] if 'max' in rsp else 0
+        curr_len = rsp['length'] if 'length' in rsp else 0
+    else:
+        max_len = known_max
+        curr_len = offset
+
+    if max_len == 0:
         raise Exception(('Unexpected card.binary response: max is zero or not '
                          'present.'))
 
-    curr_len = rsp['length'] if 'length' in rsp else 0
     if offset != curr_len:
         raise Exception('Notecard data length is misaligned with offset.')
 
-    max_len = rsp['max']
     remaining = max_len - curr_len if offset > 0 else max_len
-    if len(tx_data) > remaining:
+    if len(data) > remaining:
         raise Exception(('Data to transmit won\'t fit in the Notecard\'s binary'
                          ' store.'))
 
-    encoded = cobs_encode(tx_data, ord('\n'))
+    if encoded is None:
+        encoded = binary_store_encode(data)
+    encoded, md5_hash = encoded
+
+    # The encoded data is terminated with a newline, which isn't counted in the
+    # 'cobs' length.
     req = {
         'req': 'card.binary.put',
-        'cobs': len(encoded),
-        'status': _md5_hash(tx_data)
+        'cobs': len(encoded) - 1,
+        'status': md5_hash
     }
-    encoded.append(ord('\n'))
     if offset > 0:
         req['offset'] = offset
 
     tries = 1 + BINARY_RETRIES
-    while tries > 0:
-        try:
-            # We need to hold the lock for both the card.binary.put transaction
-            # and the subsequent transmission of the binary data.
-            card.lock()
-
+    # Hold the lock for the card.binary.put transaction, the transmission of
+    # the binary data and the card.binary check that follows, so nothing
+    # gets in between them and the lock is only taken once.
+    card.lock()
+    try:
+        while tries > 0:
             # Pass lock=false because we're already locked.
             rsp = card.Transaction(req, lock=False)
             if 'err' in rsp:
@@ -84,22 +110,22 @@ def binary_store_transmit(card: Notecard, data: bytearray, offset: int):
 
             # Send the binary data.
             card.transmit(encoded, delay=False)
-        finally:
-            card.unlock()
-
-        rsp = card.Transaction({'req': 'card.binary'})
-        if 'err' in rsp:
-            # Retry on {bad-bin} errors.
-            if '{bad-bin}' in rsp['err']:
-                tries -= 1
 
-                if card._debug and tries > 0:
-                    print('Error during binary transmission, retrying...')
-            # Fail on all other error types.
+            rsp = card.Transaction({'req': 'card.binary'}, lock=False)
+            if 'err' in rsp:
+                # Retry on {bad-bin} errors.
+                if '{bad-bin}' in rsp['err']:
+                    tries -= 1
+
+                    if card._debug and tries > 0:
+                        print('Error during binary transmission, retrying...')
+                # Fail on all other error types.
+                else:
+                    raise Exception(rsp['err'])
             else:
-                raise Exception(rsp['err'])
-        else:
-            break
+                break
+    finally:
+        card.unlock()
 
     if tries == 0:
         raise Exception('Failed to transmit binary data.')
@@ -123,9 +149,11 @@ def binary_store_receive(card, offset: int, length: int):
             raise Exception(rsp['err'])
 
         # Receive the binary data, keeping everything except the last byte,
-        # which is a newline.
+        # which is a newline. The newline is removed in place to avoid copying
+        # the data.
         try:
-            encoded = card.receive(delay=False)[:-1]
+            encoded = card.receive(delay=False)
+            del encoded[-1:]
         except Exception as e:
             # Queue up a reset if there was an issue receiving the binary data.
             # The reset will attempt to drain the binary data from the Notecard
@@ -1,10 +1,16 @@
 """Methods for COBS encoding and decoding arbitrary bytearrays."""
 
+import sys
 
-def cobs_encode(data: bytearray, eop: int) -> bytearray:
-    """COBS encode an array of bytes, using eop as the end of packet marker."""
+# The largest number of data bytes a single COBS code byte can cover.
+COBS_MAX_RUN = 254
+
+
+def _cobs_encode_loop(data: bytearray, eop: int,
+                      terminate: bool = False) -> bytearray:
+    """COBS encode an array of bytes one byte at a time."""
     cobs_overhead = 1 + (len(data) // 254)
-    encoded = bytearray(len(data) + cobs_overhead)
+    encoded = bytearray(len(data) + cobs_overhead + 1)
     code = 1
     idx = 0
     code_idx = idx
@@ -23,11 +29,15 @@ def cobs_encode(data: bytearray, eop: int) -> bytearray:
 
     encoded[code_idx] = code ^ eop
 
+    if terminate:
+        encoded[idx] = eop
+        idx += 1
+
     return encoded[:idx]
 
 
-def cobs_decode(encoded: bytes, eop: int) -> bytearray:
-    """COBS decode an array of bytes, using eop as the end of packet marker."""
+def _cobs_decode_loop(encoded: bytes, eop: int) -> bytearray:
+    """COBS decode an array of bytes one byte at a time."""
     decoded = bytearray(len(encoded))
     idx = 0
     copy = 0
@@ -51,3 +61,135 @@ def cobs_decode(encoded: bytes, eop: int) -> bytearray:
         copy -= 1
 
     return decoded[:idx]
+
+
+_xor_tables = {}
+
+
+def _xor_table(eop):
+    """Get a bytes.translate table that XORs every byte with `eop`."""
+    table = _xor_tables.get(eop)
+    if table is None:
+        table = bytes(byte ^ eop for byte in range(256))
+        _xor_tables[eop] = table
+    return table
+
+
+def _translate(data, table):
+    """Translate any bytes-like object, copying it only if it must."""
+    if isinstance(data, memoryview) and \
+            isinstance(data.obj, (bytes, bytearray)) and \
+            data.c_contiguous and data.nbytes == len(data.obj):
+        # A contiguous view of a whole bytes or bytearray can use it directly.
+        # A reversed or strided view of the same length can't.
+        data = data.obj
+    elif not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)
+    return data.translate(table)
+
+
+def _cobs_encode_fast(data: bytearray, eop: int,
+                      terminate: bool = False) -> bytearray:
+    """COBS encode an array of bytes a run of non-zero bytes at a time.
+
+    XORing with `eop` is done up front with bytes.translate. Afterwards, the
+    zeros in `data` are the `eop` bytes in the translated copy, so runs are
+    found with find and copied into the preallocated output as whole slices.
+    The output is identical to _cobs_encode_loop.
+    """
+    xored = _translate(data, _xor_table(eop))
+    src = memoryview(xored)
+    src_len = len(xored)
+    # One extra byte is reserved for the `eop` terminator.
+    encoded = bytearray(src_len + 2 + (src_len // COBS_MAX_RUN))
+    full_run_code = 0xFF ^ eop
+    idx = 0
+    pos = 0
+
+    while True:
+        end = xored.find(eop, pos)
+        if end == -1:
+            end = src_len
+
+        while end - pos >= COBS_MAX_RUN:
+            encoded[idx] = full_run_code
+            encoded[idx + 1:idx + 1 + COBS_MAX_RUN] = \
+                src[pos:pos + COBS_MAX_RUN]
+            idx += 1 + COBS_MAX_RUN
+            pos += COBS_MAX_RUN
+
+        run_len = end - pos
+        encoded[idx] = (run_len + 1) ^ eop
+        encoded[idx + 1:idx + 1 + run_len] = src[pos:end]
+        idx += 1 + run_len
+
+        if end == src_len:
+            break
+        pos = end + 1
+
+    if terminate:
+        encoded[idx] = eop
+        idx += 1
+
+    del encoded[idx:]
+    return encoded
+
+
+def _cobs_decode_fast(encoded: bytes, eop: int) -> bytearray:
+    """COBS decode an array of bytes a block at a time.
+
+    The output is identical to _cobs_decode_loop.
+    """
+    unxored = _translate(encoded, _xor_table(eop))
+    src = memoryview(unxored)
+    src_len = len(unxored)
+    decoded = bytearray(src_len)
+    idx = 0
+    pos = 0
+    code = 0xFF
+
+    while pos < src_len:
+        if code != 0xFF:
+            decoded[idx] = 0
+            idx += 1
+
+        code = unxored[pos]
+        if code == 0:
+            break
+
+        pos += 1
+        end = min(pos + code - 1, src_len)
+        decoded[idx:idx + end - pos] = src[pos:end]
+        idx += end - pos
+        pos = end
+
+    del decoded[idx:]
+    return decoded
+
+
+# MicroPython and CircuitPython builds may lack bytearray.translate and
+# memoryview slice assignment, so they keep the byte-at-a-time loops.
+if sys.implementation.name == 'cpython':
+    _cobs_encode = _cobs_encode_fast
+    _cobs_decode = _cobs_decode_fast
+else:
+    _cobs_encode = _cobs_encode_loop
+    _cobs_decode = _cobs_decode_loop
+
+
+def cobs_encode(data: bytearray, eop: int,
+                terminate: bool = False) -> bytearray:
+    """COBS encode an array of bytes, using eop as the end of packet marker.
+
+    `data` may be any bytes-like object. If `terminate` is True, `eop` is
+    appended to the encoded data, saving the caller a reallocation.
+    """
+    return _cobs_encode(data, eop, terminate)
+
+
+def cobs_decode(encoded: bytes, eop: int) -> bytearray:
+    """COBS decode an array of bytes, using eop as the end of packet marker.
+
+    `encoded` may be any bytes-like object.
+    """
+    return _cobs_decode(encoded, eop)
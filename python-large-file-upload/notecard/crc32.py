@@ -1,33 +1,53 @@
 """Module for computing the CRC32 of arbitrary data."""
 
-crc32_lookup_table = [
-    0x00000000, 0x1DB71064, 0x3B6E20C8, 0x26D930AC, 0x76DC4190, 0x6B6B51F4,
-    0x4DB26158, 0x5005713C, 0xEDB88320, 0xF00F9344, 0xD6D6A3E8, 0xCB61B38C,
-    0x9B64C2B0, 0x86D3D2D4, 0xA00AE278, 0xBDBDF21C
-]
+import sys
 
+# Reversed form of the standard CRC32 (IEEE 802.3) polynomial.
+CRC32_POLYNOMIAL = 0xEDB88320
 
-def _logical_rshift(val, shift_amount, num_bits=32):
-    """Logcally right shift `val` by `shift_amount` bits.
 
-    Logical right shift (i.e. right shift that fills with 0s instead of the
-    sign bit) isn't supported natively in Python. This is a simple
-    implementation. See:
-    https://realpython.com/python-bitwise-operators/#arithmetic-vs-logical-shift
-    """
-    unsigned_val = val % (1 << num_bits)
-    return unsigned_val >> shift_amount
+def _make_lookup_table():
+    """Build the 256-entry lookup table for the byte-at-a-time algorithm."""
+    table = []
+    for idx in range(256):
+        crc = idx
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ CRC32_POLYNOMIAL
+            else:
+                crc >>= 1
+        table.append(crc)
+    return table
+
+
+crc32_lookup_table = _make_lookup_table()
+
 
+def _crc32_table(data, crc=0):
+    """Compute CRC32 of the given data using a 256-entry lookup table.
 
-def crc32(data):
-    """Compute CRC32 of the given data.
+    Byte-at-a-time lookup-table CRC32 algorithm based on:
+    https://create.stephan-brumme.com/crc32/#bytewise
 
-    Small lookup-table half-byte CRC32 algorithm based on:
-    https://create.stephan-brumme.com/crc32/#half-byte
+    `crc` is the CRC32 of any data that came before, so a CRC can be computed
+    piece by piece without joining the pieces.
     """
-    crc = ~0
-    for idx in range(len(data)):
-        crc = crc32_lookup_table[(crc ^ data[idx]) & 0x0F] ^ _logical_rshift(crc, 4)
-        crc = crc32_lookup_table[(crc ^ _logical_rshift(data[idx], 4)) & 0x0F] ^ _logical_rshift(crc, 4)
+    table = crc32_lookup_table
+    crc ^= 0xFFFFFFFF
+    for byte in data:
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+
+    return crc ^ 0xFFFFFFFF
+
+
+# CPython's binascii.crc32 is implemented in C (via zlib when available) and
+# computes the same CRC32, so use it there. MicroPython and CircuitPython
+# builds may not include it, so they fall back to the lookup table.
+if sys.implementation.name == 'cpython':
+    import binascii
 
-    return ~crc & 0xffffffff
+    def crc32(data, crc=0):
+        """Compute CRC32 of the given data, continuing from `crc`."""
+        return binascii.crc32(data, crc) & 0xFFFFFFFF
+else:
+    crc32 = _crc32_table
@@ -0,0 +1,46 @@
+"""JSON encoding and decoding for Notecard requests and responses."""
+
+import sys
+import json
+
+# The name of the JSON library in use.
+backend = 'json'
+
+
+def _json_loads(data):
+    """Parse a JSON document from bytes-like `data`."""
+    return json.loads(data)
+
+
+def _json_dumps(obj):
+    """Serialize `obj` as compact JSON, returning UTF-8 bytes."""
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+loads = _json_loads
+dumps = _json_dumps
+
+# On CPython, orjson and ujson parse responses several times faster than the
+# standard library, so use one of them if it's installed. MicroPython and
+# CircuitPython's json is already native code. Requests are always serialized
+# by the standard library: orjson and ujson differ from it on e.g. non-ASCII
+# strings, NaN and non-str keys, which would change what's sent.
+if sys.implementation.name == 'cpython':
+    try:
+        import orjson
+
+        backend = 'orjson'
+        loads = orjson.loads
+    except ImportError:
+        try:
+            import ujson
+
+            backend = 'ujson'
+
+            def loads(data):
+                """Parse a JSON document from bytes-like `data` with ujson."""
+                if not isinstance(data, (str, bytes)):
+                    data = bytes(data)
+                return ujson.loads(data)
+        except ImportError:
+            pass
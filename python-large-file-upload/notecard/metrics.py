@@ -0,0 +1,94 @@
+"""Transaction metrics for note-python."""
+
+##
+# @file metrics.py
+#
+# @brief Measure where the time goes in Notecard transactions.
+#
+# A metrics sink set with Notecard.SetMetricsSink receives a
+# TransactionMetrics for every transaction. Nothing is measured while no sink
+# is set.
+
+
+class TransactionMetrics:
+    """Measurements of a single Notecard transaction.
+
+    Times are in seconds. Byte counts and times add up over all attempts when
+    the transaction is retried. `retries` counts the attempts made after the
+    first, so a failure that isn't retried doesn't count.
+    """
+
+    def __init__(self, name):
+        """Initialize empty metrics for a request named `name`."""
+        self.name = name
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.transmit_secs = 0.0
+        self.first_byte_secs = 0.0
+        self.receive_secs = 0.0
+        self.total_secs = 0.0
+        self.retries = 0
+        self.crc_errors = 0
+        self.resets = 0
+        self.reset_secs = 0.0
+        self.error = False
+
+
+class MetricsSink:
+    """Receives the metrics of every transaction.
+
+    Subclass this and override on_transaction. Any callable that takes a
+    TransactionMetrics can be used as a sink too.
+    """
+
+    def on_transaction(self, metrics):
+        """Handle the metrics of a completed (or failed) transaction."""
+        pass
+
+
+class MetricsCollector(MetricsSink):
+    """A sink that totals the metrics of each request type."""
+
+    FIELDS = ('bytes_sent', 'bytes_received', 'transmit_secs',
+              'first_byte_secs', 'receive_secs', 'total_secs', 'retries',
+              'crc_errors', 'resets', 'reset_secs')
+
+    def __init__(self):
+        """Initialize the collector with no transactions."""
+        self.totals = {}
+
+    def on_transaction(self, metrics):
+        """Add the metrics to the totals for their request type."""
+        totals = self.totals.get(metrics.name)
+        if totals is None:
+            totals = dict.fromkeys(self.FIELDS, 0)
+            totals['count'] = 0
+            totals['errors'] = 0
+            totals['max_secs'] = 0.0
+            self.totals[metrics.name] = totals
+
+        totals['count'] += 1
+        for field in self.FIELDS:
+            totals[field] += getattr(metrics, field)
+        if metrics.error:
+            totals['errors'] += 1
+        if metrics.total_secs > totals['max_secs']:
+            totals['max_secs'] = metrics.total_secs
+
+    def summary(self):
+        """Return a table of the totals, the request types that took longest first."""
+        lines = ['{:<20} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9} {:>7} {:>5} {:>6} '
+                 '{:>9}'
+                 .format('request', 'count', 'total s', 'tx s', 'wait s',
+                         'rx s', 'max s', 'retries', 'crc', 'resets',
+                         'reset s')]
+        for name, t in sorted(self.totals.items(),
+                              key=lambda item: -item[1]['total_secs']):
+            lines.append('{:<20} {:>6} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f} '
+                         '{:>9.3f} {:>7} {:>5} {:>6} {:>9.3f}'
+                         .format(name, t['count'], t['total_secs'],
+                                 t['transmit_secs'], t['first_byte_secs'],
+                                 t['receive_secs'], t['max_secs'],
+                                 t['retries'], t['crc_errors'], t['resets'],
+                                 t['reset_secs']))
+        return '\n'.join(lines)
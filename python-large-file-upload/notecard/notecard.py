@@ -32,11 +32,15 @@
 
 import sys
 import os
-import json
 import time
-from .timeout import start_timeout, has_timed_out
+from .timeout import start_timeout, has_timed_out, elapsed_secs
 from .transaction_manager import TransactionManager, NoOpTransactionManager
 from .crc32 import crc32
+from . import json_backend
+from .metrics import TransactionMetrics
+from .pacing import PacingPolicy, pacing_policy
+from .retry import BackoffRetryPolicy, RETRY_TRANSPORT, RETRY_DECODE, \
+    RETRY_CRC, RETRY_IO
 
 use_periphery = False
 use_serial_lock = False
@@ -56,6 +60,11 @@ else:
 
 use_i2c_lock = not use_periphery and sys.implementation.name != 'micropython'
 
+if sys.implementation.name == 'cpython':
+    import select
+    import tempfile
+    import threading
+
 NOTECARD_I2C_ADDRESS = 0x17
 NOTECARD_I2C_MAX_TRANSFER_DEFAULT = 255
 
@@ -70,13 +79,30 @@ CARD_REQUEST_SEGMENT_DELAY_MS = 250
 # "A 20ms delay is commonly used to separate smaller I2C transactions known as
 # 'chunks'". See the same document linked above.
 CARD_REQUEST_I2C_CHUNK_DELAY_MS = 20
+# The pause, in miliseconds, before every I2C chunk. This prevents a fast host
+# from hammering a slow/busy Notecard with requests.
+CARD_REQUEST_I2C_CHUNK_PAUSE_MS = 5
 # The delay, in miliseconds, to wait after receiving a NACK I2C.
 CARD_REQUEST_I2C_NACK_WAIT_MS = 1000
+# The shortest and longest delays, in miliseconds, between I2C queries for
+# response data. The delay doubles from the shortest to the longest while the
+# Notecard is still working on a request.
+CARD_I2C_POLL_MIN_MS = 5
+CARD_I2C_POLL_MAX_MS = 50
 # The number of times to retry syncing up with the Notecard during a reset
 # before giving up.
 CARD_RESET_SYNC_RETRIES = 10
 # The time, in miliseconds, to drain incoming messages during a reset.
 CARD_RESET_DRAIN_MS = 500
+# The time, in miliseconds, to wait for the Notecard to answer the newline
+# sent by a quick reset, and then how long no more data must arrive for the
+# channel to be considered in sync.
+CARD_RESET_QUICK_SYNC_MS = 100
+CARD_RESET_QUICK_SYNC_QUIET_MS = 10
+# The longest time, in miliseconds, a single blocking read waits for data on a
+# pyserial port without a file descriptor. Setting the port's timeout
+# reconfigures the port, so longer waits reuse this one value and loop.
+CARD_SERIAL_READ_WAIT_MAX_MS = 50
 CARD_INTER_TRANSACTION_TIMEOUT_SEC = 30
 CARD_INTRA_TRANSACTION_TIMEOUT_SEC = 1
 CARD_TRANSACTION_RETRIES = 5
@@ -106,6 +132,62 @@ class NoOpSerialLock():
         pass
 
 
+class ThreadSerialLock():
+    """An in-process serial lock for when one process owns the port.
+
+    Much cheaper than a lock file, since nothing touches the filesystem. All
+    ThreadSerialLocks for the same port share one lock. Like FileLock, it is
+    re-entrant, so a thread holding it may acquire it again.
+    """
+
+    _port_locks = {}
+
+    def __init__(self, port):
+        """Initialize the lock for the serial port named `port`."""
+        self.port = port
+        self._lock = self._port_locks.setdefault(port, threading.RLock())
+
+    def acquire(self, timeout=-1):
+        """Acquire the lock, waiting at most `timeout` seconds."""
+        if not self._lock.acquire(timeout=timeout):
+            raise SerialLockTimeout(self.port)
+        return NoOpContextManager()
+
+    def release(self):
+        """Release the lock."""
+        self._lock.release()
+
+
+class HeldLock:
+    """A context manager that holds a Notecard's lock while it is open."""
+
+    def __init__(self, card):
+        """Initialize the context manager for `card`."""
+        self._card = card
+
+    def __enter__(self):
+        """Lock the Notecard."""
+        self._card.lock()
+        return self._card
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Unlock the Notecard."""
+        self._card.unlock()
+
+
+SERIAL_LOCK_STRATEGIES = ('file', 'device', 'thread', 'none')
+
+
+def device_lock_path(port):
+    """Return a lock file path for the serial port named `port`.
+
+    The path is in the system temporary directory, so every process using
+    the same port agrees on it, whatever directory it runs from.
+    """
+    name = ''.join(c if c.isalnum() else '_' for c in port).strip('_')
+    return os.path.join(tempfile.gettempdir(), 'notecard-' + name + '.lock')
+
+
 class Notecard:
     """Base Notecard class."""
 
@@ -126,10 +208,33 @@ class Notecard:
         self._transaction_manager = NoOpTransactionManager()
         self._debug = debug
         self._last_request_seq_number = 0
+        self._transaction_count = 0
         self._card_supports_crc = False
         self._reset_required = True
+        self._pacing = PacingPolicy(CARD_REQUEST_SEGMENT_MAX_LEN,
+                                    CARD_REQUEST_SEGMENT_DELAY_MS,
+                                    CARD_REQUEST_I2C_CHUNK_DELAY_MS,
+                                    CARD_REQUEST_I2C_CHUNK_PAUSE_MS)
+        self._metrics_sink = None
+        # Metrics of the transaction in progress, if a sink is set.
+        self._txn_metrics = None
+        self._retry_policy = BackoffRetryPolicy()
+        # Retry policies for particular request types, by request name.
+        self._retry_policies = {}
+
+    def locked(self):
+        """Return a context manager that holds the lock on the Notecard.
+
+        Transactions made inside it don't acquire and release the lock each
+        time, and no other user of the Notecard can get in between them:
+
+            with card.locked():
+                card.Transaction({'req': 'card.binary'})
+                card.Transaction({'req': 'card.binary.put', ...})
+        """
+        return HeldLock(self)
 
-    def _crc_add(self, req_string, seq_number):
+    def _crc_add(self, req_bytes, seq_number):
         """Add a CRC field to the request.
 
         The CRC field also contains a sequence number and has this format:
@@ -139,22 +244,25 @@ class Notecard:
         SSSS is the sequence number encoded as a string of 4 hex digits.
         CCCCCCCC is the CRC32 encoded as a string of 8 hex digits.
         """
-        req_bytes = req_string.encode('utf-8')
-        crc_hex = '{:08x}'.format(crc32(req_bytes))
-        seq_number_hex = '{:04x}'.format(seq_number)
-        crc_field = f'"crc":"{seq_number_hex}:{crc_hex}"'
-        req_string_w_crc = req_string[:-1]
-        if req_string[-2] == '{':
-            req_string_w_crc += f'{crc_field}'
+        crc_field = '"crc":"{:04x}:{:08x}"}}'.format(seq_number,
+                                                    crc32(req_bytes))
+        # Splice the field in before the closing brace.
+        if req_bytes[-2] == ord('{'):
+            separator = b''
         else:
-            req_string_w_crc += f',{crc_field}'
-        req_string_w_crc += '}'
+            separator = b','
+
+        return req_bytes[:-1] + separator + crc_field.encode('utf-8')
 
-        return req_string_w_crc
+    def _crc_error(self, rsp_bytes, rsp_json):
+        """Check the CRC in a Notecard response.
 
-    def _crc_error(self, rsp_bytes):
-        """Check the CRC in a Notecard response."""
-        rsp_json = json.loads(rsp_bytes)
+        `rsp_json` is `rsp_bytes` already parsed. The CRC is checked against
+        the bytes as received, rather than re-encoding the JSON. In Python,
+        numbers with long decimal parts (e.g. 10.11111111111111123445522123)
+        get truncated in the decoding process, so the CRC would be computed
+        over a different string than was originally sent.
+        """
         if 'crc' not in rsp_json:
             # If there's not a 'crc' field in the response, it's only an error
             # if the Notecard supports CRC.
@@ -162,22 +270,15 @@ class Notecard:
 
         self._card_supports_crc = True
 
-        # Extract the sequence number and CRC. We do all this via string
-        # operations instead of decoding the JSON. In Python, numbers with long
-        # decimal parts (e.g. 10.11111111111111123445522123) get truncated in
-        # the decoding process. When re-encoded, the string representation is
-        # also truncated, and so the CRC will be computed over a different
-        # string than was originally sent, resulting in a CRC error.
-        seq_number, crc = rsp_json['crc'].split(':')
-
-        # Convert the received CRC and sequence number to integers for later
-        # comparison.
+        # Extract the sequence number and CRC, and convert them to integers
+        # for later comparison.
         try:
+            seq_number, crc = rsp_json['crc'].split(':')
             seq_number_as_int = int(seq_number, 16)
         except ValueError:
             if self._debug:
-                print(f'Received sequence number "{seq_number}" cannot be ' + \
-                      'converted to integer.')
+                print(f'Received sequence number in "{rsp_json["crc"]}" ' + \
+                      'cannot be converted to integer.')
             return True
         try:
             crc_as_int = int(crc, 16)
@@ -186,17 +287,16 @@ class Notecard:
                 print(f'Received CRC "{crc}" cannot be converted to integer.')
             return True
 
-        # Remove the 'crc' field from the response.
-        rsp_str = rsp_bytes.decode()
-        rsp_str_crc_removed = rsp_str.split('"crc":')[0]
-        if rsp_str_crc_removed[-1] == ',':
-            rsp_str_crc_removed = rsp_str_crc_removed[:-1] + '}'
+        # The Notecard adds the 'crc' field at the end of the response. The CRC
+        # covers the response without it: everything before the field, less
+        # any separating comma or whitespace, and then the closing brace.
+        end = rsp_bytes.rfind(b'"crc":')
+        if rsp_bytes[end - 1] == ord(','):
+            end -= 1
         else:
-            rsp_str_crc_removed = rsp_str_crc_removed.rstrip() + '}'
-
-        # Compute the CRC over the response, with the 'crc' field removed.
-        bytes_for_crc_calc = rsp_str_crc_removed.encode('utf-8')
-        computed_crc = crc32(bytes_for_crc_calc)
+            while rsp_bytes[end - 1] in b' \t\r\n':
+                end -= 1
+        computed_crc = crc32(b'}', crc32(memoryview(rsp_bytes)[:end]))
 
         if seq_number_as_int != self._last_request_seq_number:
             if self._debug:
@@ -212,8 +312,12 @@ class Notecard:
 
         return False
 
-    def _prepare_request(self, req):
-        """Prepare a request for transmission to the Notecard."""
+    def _prepare_request(self, req, seq_number=None):
+        """Prepare a request for transmission to the Notecard.
+
+        `seq_number` is the sequence number to put in the CRC field. It
+        defaults to the number of the next request.
+        """
         # Inspect the request for hub.set and add the User Agent.
         if 'hub.set' in req.values():
             # Merge the User Agent to send along with the hub.set request.
@@ -224,21 +328,20 @@ class Notecard:
 
         rsp_expected = 'req' in req
 
+        # Serialize the JSON request to UTF-8 bytes, removing any unnecessary
+        # whitespace.
+        req_bytes = json_backend.dumps(req)
+
         # If this is a request and not a command, add a CRC.
-        req_string = json.dumps(req, separators=(',', ':'))
         if rsp_expected:
-            req_string = self._crc_add(req_string,
-                                       self._last_request_seq_number)
+            if seq_number is None:
+                seq_number = self._last_request_seq_number
+            req_bytes = self._crc_add(req_bytes, seq_number)
 
-        # Serialize the JSON request to a string, removing any unnecessary
-        # whitespace.
         if self._debug:
-            print(req_string)
-
-        req_string += "\n"
+            print(req_bytes.decode('utf-8'))
 
-        # Encode the request string as UTF-8 bytes.
-        return (req_string.encode('utf-8'), rsp_expected)
+        return (req_bytes + b'\n', rsp_expected)
 
     def _transaction_timeout_seconds(self, req):
         """Determine the timeout to use, in seconds, for the transaction.
@@ -292,23 +395,81 @@ class Notecard:
 
         The underlying transport channel (serial or I2C) is locked for the
         duration of the request and response if `lock` is True.
+
+        Failed attempts are retried as the retry policy for the request type
+        decides. See SetRetryPolicy.
         """
-        rsp_json = None
         timeout_secs = self._transaction_timeout_seconds(req)
         req_bytes, rsp_expected = self._prepare_request(req)
 
+        return self._transaction(req, req_bytes, rsp_expected, timeout_secs,
+                                 lock)
+
+    def Transactions(self, reqs, stop_on_error=False):
+        """Send several requests to the Notecard, locking it only once.
+
+        All the requests are serialized before the Notecard is locked. They
+        are then sent one after another, with nothing else getting in between.
+        Return the list of responses, in order, with None for commands.
+
+        If `stop_on_error` is True, no more requests are sent after a response
+        with an 'err' field, so the list ends with that response. A failed
+        transaction raises an exception, the same as with Transaction.
+        """
+        first_seq_number = self._last_request_seq_number
+        prepared = []
+        for idx, req in enumerate(reqs):
+            timeout_secs = self._transaction_timeout_seconds(req)
+            req_bytes, rsp_expected = self._prepare_request(
+                req, first_seq_number + idx)
+            prepared.append((req, req_bytes, rsp_expected, timeout_secs))
+
+        rsps = []
+        with self.locked():
+            for idx, (req, req_bytes, rsp_expected,
+                      timeout_secs) in enumerate(prepared):
+                # Another user of the Notecard may have got in before the
+                # lock, in which case the sequence numbers have moved on.
+                if self._last_request_seq_number != first_seq_number + idx:
+                    req_bytes, rsp_expected = self._prepare_request(req)
+
+                rsp = self._transaction(req, req_bytes, rsp_expected,
+                                        timeout_secs, lock=False)
+                rsps.append(rsp)
+                if stop_on_error and rsp is not None and 'err' in rsp:
+                    break
+
+        return rsps
+
+    def _transaction(self, req, req_bytes, rsp_expected, timeout_secs, lock):
+        """Send a prepared request to the Notecard and read back a response."""
+        rsp_json = None
+        self._transaction_count += 1
+
+        req_name = req.get('req', req.get('cmd'))
+        retry_policy = self._retry_policies.get(req_name, self._retry_policy)
+        txn_start = start_timeout()
+
+        metrics = None
+        if self._metrics_sink is not None:
+            metrics = TransactionMetrics(req_name)
+        self._txn_metrics = metrics
+
         if self._reset_required:
-            self.Reset()
+            self._reset()
 
+        failures = 0
+        # Only failures followed by another attempt count as retries.
+        retries = 0
+        error = False
         try:
             self._transaction_manager.start(CARD_INTER_TRANSACTION_TIMEOUT_SEC)
             if lock:
                 self.lock()
 
-            retries_left = CARD_TRANSACTION_RETRIES
-            error = False
             if rsp_expected:
-                while retries_left > 0:
+                while True:
+                    failure = None
                     try:
                         rsp_bytes = self._transact(
                             req_bytes, rsp_expected=True,
@@ -317,42 +478,38 @@ class Notecard:
                         if self._debug:
                             print(e)
 
-                        error = True
-                        self.Reset()
-                        retries_left -= 1
-                        time.sleep(0.5)
-                        continue
+                        failure = RETRY_TRANSPORT
+                        self._pacing.on_error()
+                        self._reset()
 
-                    if self._crc_error(rsp_bytes):
-                        if self._debug:
-                            print('CRC error on response from Notecard.')
+                    if failure is None:
+                        # The response is parsed once. The CRC is then checked
+                        # against the raw bytes.
+                        try:
+                            rsp_json = json_backend.loads(rsp_bytes)
+                        except Exception as e:
+                            if self._debug:
+                                print(e)
 
-                        error = True
-                        retries_left -= 1
-                        time.sleep(0.5)
-                        continue
+                            failure = RETRY_DECODE
 
-                    try:
-                        rsp_json = json.loads(rsp_bytes)
-                    except Exception as e:
+                    if failure is None and self._crc_error(rsp_bytes, rsp_json):
                         if self._debug:
-                            print(e)
+                            print('CRC error on response from Notecard.')
+                        if metrics is not None:
+                            metrics.crc_errors += 1
 
-                        error = True
-                        retries_left -= 1
-                        time.sleep(0.5)
-                        continue
+                        failure = RETRY_CRC
+                        self._pacing.on_error()
 
-                    if 'err' in rsp_json:
+                    if failure is None and 'err' in rsp_json:
                         if '{io}' in rsp_json['err'] and '{not-supported}' not in rsp_json['err']:
                             if self._debug:
                                 print('Response has error field indicating ' + \
                                       f'I/O error: {rsp_json}')
 
-                            error = True
-                            retries_left -= 1
-                            time.sleep(0.5)
-                            continue
+                            failure = RETRY_IO
+                            self._pacing.on_error()
                         elif '{bad-bin}' in rsp_json['err']:
                             if self._debug:
                                 print('Response has error field indicating ' + \
@@ -362,8 +519,23 @@ class Notecard:
                             error = True
                             break
 
-                    error = False
-                    break
+                    if failure is None:
+                        error = False
+                        self._pacing.on_success()
+                        break
+
+                    error = True
+                    failures += 1
+                    delay_secs = retry_policy.retry_delay(
+                        req_name, failure, failures, elapsed_secs(txn_start),
+                        self._card_supports_crc)
+                    if delay_secs is None:
+                        if self._debug:
+                            print('Not retrying after ' + failure + ' failure.')
+                        break
+
+                    retries += 1
+                    time.sleep(delay_secs)
             else:
                 try:
                     self._transact(req_bytes, rsp_expected=False,
@@ -385,11 +557,32 @@ class Notecard:
 
             self._transaction_manager.stop()
 
+            if metrics is not None:
+                self._txn_metrics = None
+                metrics.retries = retries
+                metrics.error = error
+                metrics.total_secs = elapsed_secs(txn_start)
+                self._metrics_sink(metrics)
+
         if self._debug and rsp_json is not None:
             print(rsp_json)
 
         return rsp_json
 
+    def _reset(self):
+        """Reset the Notecard, counting the reset in the transaction metrics."""
+        metrics = self._txn_metrics
+        if metrics is None:
+            self.Reset()
+            return
+
+        start = start_timeout()
+        try:
+            self.Reset()
+        finally:
+            metrics.resets += 1
+            metrics.reset_secs += elapsed_secs(start)
+
     def Command(self, req):
         """Send a command to the Notecard.
 
@@ -415,18 +608,73 @@ class Notecard:
         """Return true if the User Agent has been sent to the Notecard."""
         return self._user_agent_sent
 
+    def GetTransactionCount(self):
+        """Return the number of transactions started on this Notecard."""
+        return self._transaction_count
+
     def SetTransactionPins(self, rtx_pin, ctx_pin):
         """Set the pins used for RTX and CTX."""
         self._transaction_manager = TransactionManager(rtx_pin, ctx_pin)
 
+    def SetPacing(self, pacing):
+        """Set how fast requests are pushed to the Notecard.
+
+        `pacing` is either a PacingPolicy or the name of a preset: 'safe' (the
+        default), 'fast', 'auto' or 'tune'. 'auto' starts fast and backs off
+        when transactions fail with I/O or CRC errors. 'tune' starts safe and
+        tightens the delays until transactions fail, then backs off one step
+        and stays there.
+        """
+        if isinstance(pacing, str):
+            pacing = pacing_policy(pacing)
+        self._pacing = pacing
+
+    def GetPacing(self):
+        """Return the PacingPolicy used by this Notecard."""
+        return self._pacing
+
+    def SetRetryPolicy(self, policy, req=None):
+        """Set how failed transactions are retried.
+
+        `policy` is a RetryPolicy. The default is a BackoffRetryPolicy. If
+        `req` is given (e.g. 'note.add'), the policy is only used for that
+        request type. Pass a policy of None with `req` to go back to the
+        default for it.
+        """
+        if req is None:
+            self._retry_policy = policy
+        elif policy is None:
+            self._retry_policies.pop(req, None)
+        else:
+            self._retry_policies[req] = policy
+
+    def SetMetricsSink(self, sink):
+        """Set where the metrics of every transaction are sent.
+
+        `sink` is a MetricsSink (e.g. a MetricsCollector), or any callable
+        that takes a TransactionMetrics. Pass None to stop measuring, which is
+        the default.
+        """
+        if sink is not None and hasattr(sink, 'on_transaction'):
+            sink = sink.on_transaction
+        self._metrics_sink = sink
+
 
 class OpenSerial(Notecard):
     """Notecard class for Serial communication."""
 
     def _transact(self, req_bytes, rsp_expected,
                   timeout_secs=CARD_INTER_TRANSACTION_TIMEOUT_SEC):
+        metrics = self._txn_metrics
+        if metrics is not None:
+            metrics.bytes_sent += len(req_bytes)
+            mark = start_timeout()
+
         self.transmit(req_bytes)
 
+        if metrics is not None:
+            metrics.transmit_secs += elapsed_secs(mark)
+
         if not rsp_expected:
             return
 
@@ -436,34 +684,70 @@ class OpenSerial(Notecard):
                 raise Exception('Timed out while querying Notecard for ' + \
                                 'available data.')
 
-            # Delay for 10 ms before checking for available data again.
-            time.sleep(.01)
+            if self._wait_for_data is not None:
+                # Block until data arrives rather than polling.
+                if timeout_secs == 0:
+                    self._wait_for_data(None)
+                else:
+                    self._wait_for_data(max(0, timeout_secs - elapsed_secs(start)))
+            else:
+                # Delay for 10 ms before checking for available data again.
+                time.sleep(.01)
+
+        if metrics is None:
+            return self.receive()
+
+        metrics.first_byte_secs += elapsed_secs(start)
+        mark = start_timeout()
+        rsp_bytes = self.receive()
+        metrics.receive_secs += elapsed_secs(mark)
+        metrics.bytes_received += len(rsp_bytes)
 
-        return self.receive()
+        return rsp_bytes
 
     def receive(self, timeout_secs=CARD_INTRA_TRANSACTION_TIMEOUT_SEC,
                 delay=True):
-        """Read a newline-terminated batch of data from the Notecard."""
-        data = bytearray()
-        received_newline = False
+        """Read a newline-terminated batch of data from the Notecard.
+
+        Data is read from the UART in blocks of whatever is waiting, rather
+        than one byte at a time. Any bytes received after the newline are kept
+        in the receive buffer and returned by the next call.
+        """
+        rx_buf = self._rx_buf
+        scan_off = 0
         start = start_timeout()
 
-        while not received_newline:
-            while not self._available():
+        while True:
+            newline_idx = rx_buf.find(b'\n', scan_off)
+            if newline_idx != -1:
+                break
+            scan_off = len(rx_buf)
+
+            block = self._read_available()
+            if not block:
                 if timeout_secs != 0 and has_timed_out(start, timeout_secs):
                     raise Exception('Timed out waiting to receive data from' + \
                                     ' Notecard.')
 
-                # Sleep while awaiting the first byte (lazy). After the first
-                # byte, start to spin for the remaining bytes (greedy).
-                if delay and len(data) == 0:
+                if self._wait_for_data is not None:
+                    # Block until more data arrives.
+                    if timeout_secs == 0:
+                        self._wait_for_data(None)
+                    else:
+                        self._wait_for_data(
+                            max(0, timeout_secs - elapsed_secs(start)))
+                # Otherwise, sleep while awaiting the first byte (lazy). After
+                # the first byte, start to spin for the remaining bytes (greedy).
+                elif delay and len(rx_buf) == 0:
                     time.sleep(.001)
+                continue
 
+            rx_buf.extend(block)
             timeout_secs = CARD_INTRA_TRANSACTION_TIMEOUT_SEC
             start = start_timeout()
-            byte = self._read_byte()
-            data.extend(byte)
-            received_newline = byte == b'\n'
+
+        data = rx_buf[:newline_idx + 1]
+        del rx_buf[:newline_idx + 1]
 
         return data
 
@@ -471,42 +755,186 @@ class OpenSerial(Notecard):
         """Send `data` to the Notecard."""
         seg_off = 0
         seg_left = len(data)
+        seg_max_len = self._pacing.segment_max_len
+        seg_delay_ms = self._pacing.segment_delay_ms
 
         while seg_left > 0:
             seg_len = seg_left
-            if seg_len > CARD_REQUEST_SEGMENT_MAX_LEN:
-                seg_len = CARD_REQUEST_SEGMENT_MAX_LEN
+            if seg_len > seg_max_len:
+                seg_len = seg_max_len
 
             self.uart.write(data[seg_off:seg_off + seg_len])
             seg_off += seg_len
             seg_left -= seg_len
 
-            if delay:
-                time.sleep(CARD_REQUEST_SEGMENT_DELAY_MS / 1000)
+            if delay and seg_delay_ms > 0:
+                time.sleep(seg_delay_ms / 1000)
 
     def _available_micropython(self):
-        return self.uart.any()
+        return len(self._rx_buf) > 0 or self.uart.any()
 
     def _available_default(self):
-        return self.uart.in_waiting > 0
+        return len(self._rx_buf) > 0 or self.uart.in_waiting > 0
+
+    def _read_available_micropython(self):
+        """Read all bytes currently waiting in the UART."""
+        waiting = self.uart.any()
+        if not waiting:
+            return None
+        return self.uart.read(waiting)
+
+    def _read_available_default(self):
+        """Read all bytes currently waiting in the UART."""
+        waiting = self.uart.in_waiting
+        if not waiting:
+            return None
+        return self.uart.read(waiting)
+
+    def _wait_for_data_select(self, timeout_secs):
+        """Block until the UART has data to read, or `timeout_secs` passes.
+
+        A `timeout_secs` of None waits indefinitely.
+        """
+        readable, _, _ = select.select([self._uart_fd], [], [], timeout_secs)
+        return len(readable) > 0
+
+    def _wait_for_data_read_timeout(self, timeout_secs):
+        """Block in a read of one byte until data arrives, or `timeout_secs` passes.
+
+        For pyserial ports without a file descriptor (e.g. on Windows). The
+        byte read is kept in the receive buffer. No single read waits longer
+        than CARD_SERIAL_READ_WAIT_MAX_MS, and the port's timeout is only set
+        when it changes. The library's other reads never block, so the port
+        keeps the last timeout set.
+        """
+        max_secs = CARD_SERIAL_READ_WAIT_MAX_MS / 1000
+        if timeout_secs is None or timeout_secs > max_secs:
+            timeout_secs = max_secs
+        if timeout_secs != self._uart_timeout:
+            self.uart.timeout = timeout_secs
+            self._uart_timeout = timeout_secs
+
+        byte = self.uart.read(1)
+
+        if byte:
+            self._rx_buf.extend(byte)
+            return True
+        return False
+
+    def _select_wait_strategy(self):
+        """Choose how to wait for data from the Notecard.
+
+        On CPython, pyserial ports can block until data arrives, so a
+        response is picked up as soon as it starts instead of up to a poll
+        interval later. Anything else, including MicroPython and
+        CircuitPython UARTs, polls.
+        """
+        if sys.implementation.name != 'cpython':
+            return None
+
+        fileno = getattr(self.uart, 'fileno', None)
+        if fileno is not None and sys.platform != 'win32':
+            try:
+                self._uart_fd = fileno()
+                return self._wait_for_data_select
+            except Exception:
+                pass
+
+        if hasattr(self.uart, 'timeout') and hasattr(self.uart, 'read'):
+            self._uart_timeout = self.uart.timeout
+            return self._wait_for_data_read_timeout
+
+        return None
 
     def _read_byte(self):
         """Read a single byte from the Notecard."""
+        if self._rx_buf:
+            byte = bytes(self._rx_buf[:1])
+            del self._rx_buf[:1]
+            return byte
         return self.uart.read(1)
 
+    def _read_pending(self):
+        """Return and consume every byte received so far."""
+        block = self._read_available() or b''
+        if self._rx_buf:
+            block = bytes(self._rx_buf) + block
+            del self._rx_buf[:]
+        return block
+
+    def _wait_pending(self, timeout_secs):
+        """Wait up to `timeout_secs` for data, without reading any."""
+        if self._wait_for_data is not None:
+            self._wait_for_data(timeout_secs)
+        else:
+            time.sleep(.001)
+
+    def _quick_sync(self):
+        """Try to sync up with the Notecard by sending a single newline.
+
+        Return True if the Notecard answered with nothing but a newline, and
+        nothing else arrived after it. Any other data (e.g. the end of an
+        earlier response) means the full reset is needed to drain it.
+        """
+        try:
+            self.uart.write(b'\n')
+        except Exception as e:
+            if self._debug:
+                print(e)
+            return False
+
+        received_newline = False
+        start = start_timeout()
+        timeout_secs = CARD_RESET_QUICK_SYNC_MS / 1000
+        while not has_timed_out(start, timeout_secs):
+            block = self._read_pending()
+            if not block:
+                if received_newline:
+                    # Nothing arrived during the quiet period.
+                    return True
+                self._wait_pending(max(0, timeout_secs - elapsed_secs(start)))
+                continue
+
+            for byte in block:
+                if byte != ord('\n') and byte != ord('\r'):
+                    return False
+
+            if not received_newline and ord('\n') in block:
+                received_newline = True
+                # Now wait for a quiet period instead.
+                start = start_timeout()
+                timeout_secs = CARD_RESET_QUICK_SYNC_QUIET_MS / 1000
+
+        return received_newline
+
     def Reset(self):
-        """Reset the Notecard."""
+        """Reset the Notecard.
+
+        A single newline is tried first, which is enough when the channel is
+        already in sync. The full reset sequence only runs when the Notecard
+        answers it with anything else.
+        """
         if self._debug:
             print('Resetting Notecard serial communications.')
 
-        # Delay to give the Notecard a chance to process any segment sent prior
-        # to the coming reset sequence.
-        time.sleep(CARD_REQUEST_SEGMENT_DELAY_MS / 1000)
+        # Anything left over in the receive buffer predates the reset.
+        del self._rx_buf[:]
 
         notecard_ready = False
         try:
             self.lock()
 
+            if self._quick_sync():
+                self._reset_required = False
+                return
+
+            if self._debug:
+                print('Quick reset failed. Draining serial.')
+
+            # Delay to give the Notecard a chance to process any segment sent
+            # prior to the coming reset sequence.
+            time.sleep(CARD_REQUEST_SEGMENT_DELAY_MS / 1000)
+
             for i in range(CARD_RESET_SYNC_RETRIES):
                 try:
                     # Send a newline to the Notecard to terminate any partial
@@ -566,6 +994,25 @@ class OpenSerial(Notecard):
 
         self._reset_required = False
 
+    def _create_lock(self, strategy, lock_path):
+        """Create the serial lock for a lock strategy."""
+        if strategy not in SERIAL_LOCK_STRATEGIES:
+            raise ValueError(f'Unknown serial lock strategy "{strategy}". ' + \
+                             'Use "file", "device", "thread" or "none".')
+
+        port = getattr(self.uart, 'port', None)
+        if not isinstance(port, str):
+            port = str(self.uart)
+
+        if strategy == 'file' and use_serial_lock:
+            return FileLock(lock_path)
+        elif strategy == 'device' and use_serial_lock:
+            return FileLock(device_lock_path(port))
+        elif strategy == 'thread' and sys.implementation.name == 'cpython':
+            return ThreadSerialLock(port)
+
+        return NoOpSerialLock()
+
     def lock(self):
         """Lock access to the serial bus."""
         self.lock_handle.acquire(timeout=5)
@@ -574,65 +1021,90 @@ class OpenSerial(Notecard):
         """Unlock access to the serial bus."""
         self.lock_handle.release()
 
-    def __init__(self, uart_id, debug=False):
-        """Initialize the Notecard before a reset."""
+    def __init__(self, uart_id, debug=False, lock_path='serial.lock',
+                 lock_strategy='file'):
+        """Initialize the Notecard before a reset.
+
+        `lock_strategy` chooses how the serial port is locked:
+
+        - 'file' locks `lock_path` between processes. Give each Notecard its
+          own path when several are used at once, so they don't wait for each
+          other.
+        - 'device' locks a file named after the port in the temporary
+          directory, so processes started from different directories still
+          share it.
+        - 'thread' locks within this process only, which is much cheaper when
+          no other process uses the port.
+        - 'none' doesn't lock at all.
+
+        File locks are only used on Linux, as before.
+        """
         super().__init__(debug)
         self._user_agent['req_interface'] = 'serial'
         self._user_agent['req_port'] = str(uart_id)
 
         self.uart = uart_id
+        # Bytes read from the UART but not yet returned by `receive`.
+        self._rx_buf = bytearray()
 
-        if use_serial_lock:
-            self.lock_handle = FileLock('serial.lock')
-        else:
-            self.lock_handle = NoOpSerialLock()
+        self.lock_handle = self._create_lock(lock_strategy, lock_path)
 
         if sys.implementation.name == 'micropython':
             self._available = self._available_micropython
+            self._read_available = self._read_available_micropython
         else:
             if hasattr(self.uart, 'in_waiting'):
                 self._available = self._available_default
+                self._read_available = self._read_available_default
             else:
                 raise NotImplementedError('Serial communications with the ' + \
                                           'Notecard are not supported for ' + \
                                           'this platform.')
 
+        self._uart_fd = None
+        self._wait_for_data = self._select_wait_strategy()
+
         self.Reset()
 
 
 class OpenI2C(Notecard):
     """Notecard class for I2C communication."""
 
-    def _read(self, length):
-        """Perform a serial-over-I2C read."""
-        initiate_read = bytearray(2)
+    def _read_into(self, length):
+        """Perform a serial-over-I2C read into the packet buffer.
+
+        Return the number of bytes still available to read after this packet.
+        The `length` data bytes read are in `self._packet_view[2:length + 2]`
+        until the next read.
+        """
+        initiate_read = self._initiate_read
         # 0 indicates we are reading from the Notecard.
         initiate_read[0] = 0
         # This indicates how many bytes we are prepared to read.
         initiate_read[1] = length
-        # read_buf is a buffer to store the data we're reading.
         # length accounts for the payload and the +2 is for the header. The
         # header sent by the Notecard has one byte to indicate the number of
         # bytes still available to read and a second byte to indicate the number
         # of bytes coming in the current packet.
-        read_buf = bytearray(length + 2)
+        packet = self._packet_view[:length + 2]
 
-        self._platform_read(initiate_read, read_buf)
-        # First two bytes are the header.
-        header = read_buf[0:2]
+        self._platform_read(initiate_read, packet)
         # The number of bytes still available to read after this packet.
-        available = header[0]
+        available = packet[0]
         # The number of data bytes in this packet.
-        data_len = header[1]
-        # The rest is the data.
-        data = read_buf[2:]
+        data_len = packet[1]
 
-        if len(data) != data_len:
+        if data_len != length:
             raise Exception('Serial-over-I2C error: reported data length ' + \
                             f'({data_len}) differs from actual data length' + \
-                            f' ({len(data)}).')
+                            f' ({length}).')
 
-        return available, data
+        return available
+
+    def _read(self, length):
+        """Perform a serial-over-I2C read."""
+        available = self._read_into(length)
+        return available, bytearray(self._packet_view[2:length + 2])
 
     def _write(self, data):
         """Perform a serial-over-I2C write."""
@@ -645,18 +1117,27 @@ class OpenI2C(Notecard):
         received_newline = False
         timeout_secs = CARD_INTER_TRANSACTION_TIMEOUT_SEC
         start = start_timeout()
-        received_data = bytearray()
+        # Packets are copied straight into a buffer kept between calls, which
+        # only grows when a response is bigger than any before it.
+        rx_buf = self._rx_buf
+        rx_len = 0
+        packet_data = self._packet_view[2:]
+        poll_ms = CARD_I2C_POLL_MIN_MS
 
         while True:
-            available, data = self._read(read_len)
-            if len(data) > 0:
-                received_data += data
+            available = self._read_into(read_len)
+            if read_len > 0:
+                if rx_len + read_len > len(rx_buf):
+                    rx_buf.extend(bytes(max(len(rx_buf), read_len)))
+                rx_buf[rx_len:rx_len + read_len] = packet_data[:read_len]
+                rx_len += read_len
 
                 timeout_secs = CARD_INTRA_TRANSACTION_TIMEOUT_SEC
                 start = start_timeout()
+                poll_ms = CARD_I2C_POLL_MIN_MS
 
                 if not received_newline:
-                    received_newline = data[-1] == ord('\n')
+                    received_newline = rx_buf[rx_len - 1] == ord('\n')
 
             read_len = min(available, self.max)
             # Keep going if there are still bytes available to read, even if
@@ -674,21 +1155,30 @@ class OpenI2C(Notecard):
                 raise Exception('Timed out while reading data from the ' + \
                                 'Notecard.')
 
+            # Nothing pending yet. Poll again soon, backing off the longer
+            # the Notecard takes.
             if delay:
-                time.sleep(0.05)
+                time.sleep(poll_ms / 1000)
+                poll_ms = min(poll_ms * 2, CARD_I2C_POLL_MAX_MS)
 
-        return received_data
+        return rx_buf[:rx_len]
 
     def transmit(self, data, delay=True):
         """Send `data` to the Notecard."""
         chunk_offset = 0
         data_left = len(data)
         sent_in_seg = 0
+        seg_max_len = self._pacing.segment_max_len
+        seg_delay_ms = self._pacing.segment_delay_ms
+        chunk_delay_ms = self._pacing.chunk_delay_ms
+        chunk_pause_ms = self._pacing.chunk_pause_ms
 
         while data_left > 0:
-            # Delay for 5ms. This prevents a fast host from hammering a
-            # slow/busy Notecard with requests.
-            time.sleep(.005)
+            # Pause for the pacing policy's chunk pause (5 ms by default). This
+            # prevents a fast host from hammering a slow/busy Notecard with
+            # requests.
+            if chunk_pause_ms > 0:
+                time.sleep(chunk_pause_ms / 1000)
 
             chunk_len = min(data_left, self.max)
             write_data = data[chunk_offset:chunk_offset + chunk_len]
@@ -698,21 +1188,29 @@ class OpenI2C(Notecard):
             data_left -= chunk_len
             sent_in_seg += chunk_len
 
-            # We delay for CARD_REQUEST_SEGMENT_DELAY_MS ms every time a full
+            # We delay for the pacing policy's segment delay every time a full
             # "segment" of data has been transmitted.
-            if sent_in_seg > CARD_REQUEST_SEGMENT_MAX_LEN:
-                sent_in_seg -= CARD_REQUEST_SEGMENT_MAX_LEN
+            if sent_in_seg > seg_max_len:
+                sent_in_seg -= seg_max_len
 
-                if delay:
-                    time.sleep(CARD_REQUEST_SEGMENT_DELAY_MS / 1000)
+                if delay and seg_delay_ms > 0:
+                    time.sleep(seg_delay_ms / 1000)
 
-            if delay:
-                time.sleep(CARD_REQUEST_I2C_CHUNK_DELAY_MS / 1000)
+            if delay and chunk_delay_ms > 0:
+                time.sleep(chunk_delay_ms / 1000)
 
     def _transact(self, req_bytes, rsp_expected,
                   timeout_secs=CARD_INTER_TRANSACTION_TIMEOUT_SEC):
+        metrics = self._txn_metrics
+        if metrics is not None:
+            metrics.bytes_sent += len(req_bytes)
+            mark = start_timeout()
+
         self.transmit(req_bytes)
 
+        if metrics is not None:
+            metrics.transmit_secs += elapsed_secs(mark)
+
         if not rsp_expected:
             return
 
@@ -720,20 +1218,31 @@ class OpenI2C(Notecard):
         # Notecard with requests.
         time.sleep(0.005)
 
-        # Query the Notecard every 50 ms to see if there's data available to
-        # read.
+        # Query the Notecard to see if there's data available to read. I2C has
+        # no way to wait for data, so poll, starting quickly for short
+        # requests and backing off to every 50 ms for slow ones.
         start = start_timeout()
-        available = 0
+        poll_ms = CARD_I2C_POLL_MIN_MS
+        available = self._read_into(0)
         while available == 0:
-            available, _ = self._read(0)
-
             if timeout_secs != 0 and has_timed_out(start, timeout_secs):
                 raise Exception('Timed out while querying Notecard for ' + \
                                 'available data.')
 
-            time.sleep(0.05)
+            time.sleep(poll_ms / 1000)
+            poll_ms = min(poll_ms * 2, CARD_I2C_POLL_MAX_MS)
+            available = self._read_into(0)
+
+        if metrics is None:
+            return self.receive()
 
-        return self.receive()
+        metrics.first_byte_secs += elapsed_secs(start)
+        mark = start_timeout()
+        rsp_bytes = self.receive()
+        metrics.receive_secs += elapsed_secs(mark)
+        metrics.bytes_received += len(rsp_bytes)
+
+        return rsp_bytes
 
     def Reset(self):
         """Reset the Notecard."""
@@ -827,9 +1336,11 @@ class OpenI2C(Notecard):
 
     def _cpython_read(self, initiate_read_msg, read_buf):  # noqa: D403
         """CPython implementation of serial-over-I2C read."""
+        # periphery only takes bytes-like placeholders it can replace, not a
+        # memoryview, so the result is copied into read_buf.
         msgs = [
             I2C.Message(initiate_read_msg),
-            I2C.Message(read_buf, read=True)
+            I2C.Message(bytes(len(read_buf)), read=True)
         ]
         self.i2c.transfer(self.addr, msgs)
         read_bytes = msgs[1].data
@@ -845,7 +1356,15 @@ class OpenI2C(Notecard):
         self.i2c.writeto_then_readfrom(self.addr, initiate_read_msg, read_buf)
 
     def lock(self):
-        """Lock access to the I2C bus."""
+        """Lock access to the I2C bus.
+
+        The lock may be taken again while it is held, e.g. by a transaction
+        inside `locked()`. It is released by the matching last unlock.
+        """
+        if self._lock_depth > 0:
+            self._lock_depth += 1
+            return
+
         retries = 5
         while retries != 0:
             if self.lock_fn():
@@ -858,9 +1377,13 @@ class OpenI2C(Notecard):
         if retries == 0:
             raise Exception('Failed to acquire I2C lock.')
 
+        self._lock_depth = 1
+
     def unlock(self):
         """Unlock access to the I2C bus."""
-        self.unlock_fn()
+        self._lock_depth -= 1
+        if self._lock_depth == 0:
+            self.unlock_fn()
 
     def _i2c_no_op_try_lock(*args, **kwargs):
         """No-op lock function."""
@@ -877,6 +1400,7 @@ class OpenI2C(Notecard):
         self._user_agent['req_port'] = address
 
         self.i2c = i2c
+        self._lock_depth = 0
 
         if use_i2c_lock:
             self.lock_fn = self.i2c.try_lock
@@ -894,6 +1418,12 @@ class OpenI2C(Notecard):
         else:
             self.max = max_transfer
 
+        # Buffers reused by every read: the read request, one packet (header
+        # and data) and the response being received.
+        self._initiate_read = bytearray(2)
+        self._packet_view = memoryview(bytearray(self.max + 2))
+        self._rx_buf = bytearray()
+
         if sys.implementation.name == 'micropython':
             self._platform_write = self._non_cpython_write
             self._platform_read = self._micropython_read
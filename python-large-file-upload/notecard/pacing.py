@@ -0,0 +1,248 @@
+"""Request pacing policies for note-python."""
+
+##
+# @file pacing.py
+#
+# @brief Control how fast requests are pushed to the Notecard.
+#
+# The Notecard has a fixed size receive buffer, so requests are sent in
+# "segments" with a pause after each one. Over I2C, each segment is also
+# split into "chunks" of at most the I2C transfer size, with a short pause
+# before each chunk and a longer one after it. A PacingPolicy holds the segment
+# length and delays used by a single Notecard instance.
+
+import json
+import os
+
+# The documented, conservative values. See CARD_REQUEST_SEGMENT_MAX_LEN and
+# CARD_REQUEST_SEGMENT_DELAY_MS in notecard.py.
+SAFE_SEGMENT_MAX_LEN = 250
+SAFE_SEGMENT_DELAY_MS = 250
+# "A 20ms delay is commonly used to separate smaller I2C transactions known as
+# 'chunks'". See CARD_REQUEST_I2C_CHUNK_DELAY_MS in notecard.py.
+SAFE_CHUNK_DELAY_MS = 20
+# The pause before every I2C chunk, which keeps a fast host from hammering a
+# slow/busy Notecard.
+SAFE_CHUNK_PAUSE_MS = 5
+# Suitable for USB-connected Notecards, which buffer far more than a UART.
+FAST_SEGMENT_MAX_LEN = 8192
+FAST_SEGMENT_DELAY_MS = 0
+FAST_CHUNK_DELAY_MS = 0
+FAST_CHUNK_PAUSE_MS = 0
+# The number of consecutive successful transactions before an adaptive policy
+# tries the next faster step again.
+ADAPTIVE_RECOVER_AFTER = 20
+# The number of consecutive successful transactions before the auto-tuner
+# tries the next faster profile.
+TUNING_TIGHTEN_AFTER = 10
+
+
+class PacingPolicy:
+    """Fixed segment length and delay used when transmitting requests."""
+
+    def __init__(self, segment_max_len=SAFE_SEGMENT_MAX_LEN,
+                 segment_delay_ms=SAFE_SEGMENT_DELAY_MS,
+                 chunk_delay_ms=SAFE_CHUNK_DELAY_MS,
+                 chunk_pause_ms=SAFE_CHUNK_PAUSE_MS):
+        """Initialize the policy with a segment length and delays.
+
+        `chunk_delay_ms` (after each chunk) and `chunk_pause_ms` (before each
+        chunk) are only used over I2C.
+        """
+        self.segment_max_len = segment_max_len
+        self.segment_delay_ms = segment_delay_ms
+        self.chunk_delay_ms = chunk_delay_ms
+        self.chunk_pause_ms = chunk_pause_ms
+
+    def on_success(self):
+        """Record a transaction that completed without an I/O error."""
+        pass
+
+    def on_error(self):
+        """Record a transaction that failed with an I/O or CRC error."""
+        pass
+
+
+class AdaptivePacingPolicy(PacingPolicy):
+    """Pacing that starts fast and backs off when transactions fail.
+
+    Every failure moves the policy one step toward the safe pacing. After
+    `recover_after` consecutive successes it moves one step back toward fast.
+    If `start` is given, it is the fastest step instead, followed by the steps
+    that are no faster than it, e.g. to start at a pacing tuned earlier.
+    """
+
+    # (segment length, segment delay in ms, chunk delay in ms, chunk pause in
+    # ms), fastest first.
+    STEPS = [
+        (FAST_SEGMENT_MAX_LEN, FAST_SEGMENT_DELAY_MS, FAST_CHUNK_DELAY_MS,
+         FAST_CHUNK_PAUSE_MS),
+        (2048, 10, 1, 1),
+        (1024, 50, 5, 2),
+        (SAFE_SEGMENT_MAX_LEN, SAFE_SEGMENT_DELAY_MS, SAFE_CHUNK_DELAY_MS,
+         SAFE_CHUNK_PAUSE_MS),
+    ]
+
+    def __init__(self, recover_after=ADAPTIVE_RECOVER_AFTER, start=None):
+        """Initialize the policy at its fastest step."""
+        self.recover_after = recover_after
+        if start is None:
+            self.steps = self.STEPS
+        else:
+            start = tuple(start)
+            # A step is no faster if its segments are no longer and none of
+            # its delays are shorter.
+            self.steps = [start] + [
+                step for step in self.STEPS if step != start and
+                step[0] <= start[0] and
+                all(d >= s for d, s in zip(step[1:], start[1:]))
+            ]
+        self._step = 0
+        self._successes = 0
+        super().__init__(*self.steps[self._step])
+
+    def _set_step(self, step):
+        self._step = step
+        self._successes = 0
+        (self.segment_max_len, self.segment_delay_ms, self.chunk_delay_ms,
+         self.chunk_pause_ms) = self.steps[step]
+
+    def on_success(self):
+        """Move one step faster after enough consecutive successes."""
+        self._successes += 1
+        if self._step > 0 and self._successes >= self.recover_after:
+            self._set_step(self._step - 1)
+
+    def on_error(self):
+        """Move one step slower."""
+        self._set_step(min(self._step + 1, len(self.steps) - 1))
+
+
+class TuningPacingPolicy(PacingPolicy):
+    """Pacing that starts safe and tightens until transactions fail.
+
+    After `tighten_after` consecutive successes the policy moves to the next
+    faster profile. The first failure moves it back to the last profile that
+    succeeded, and it stays there: that profile has been tuned. A failure at
+    the safest profile only starts its count of successes again. Save it with a
+    PacingProfileStore so the tuning only happens once per device.
+    """
+
+    # (segment length, segment delay in ms, chunk delay in ms, chunk pause in
+    # ms), safest first.
+    PROFILES = [
+        (SAFE_SEGMENT_MAX_LEN, SAFE_SEGMENT_DELAY_MS, SAFE_CHUNK_DELAY_MS,
+         SAFE_CHUNK_PAUSE_MS),
+        (SAFE_SEGMENT_MAX_LEN, 100, 10, 5),
+        (512, 50, 5, 2),
+        (1024, 20, 2, 1),
+        (2048, 10, 1, 1),
+        (FAST_SEGMENT_MAX_LEN, FAST_SEGMENT_DELAY_MS, FAST_CHUNK_DELAY_MS,
+         FAST_CHUNK_PAUSE_MS),
+    ]
+
+    def __init__(self, tighten_after=TUNING_TIGHTEN_AFTER):
+        """Initialize the policy at its safest profile."""
+        self.tighten_after = tighten_after
+        self.tuned = False
+        self._profile = 0
+        self._successes = 0
+        super().__init__(*self.PROFILES[self._profile])
+
+    def _set_profile(self, profile):
+        self._profile = profile
+        self._successes = 0
+        (self.segment_max_len, self.segment_delay_ms, self.chunk_delay_ms,
+         self.chunk_pause_ms) = self.PROFILES[profile]
+
+    def on_success(self):
+        """Move one profile faster after enough consecutive successes."""
+        if self.tuned:
+            return
+
+        self._successes += 1
+        if self._successes >= self.tighten_after:
+            if self._profile == len(self.PROFILES) - 1:
+                self.tuned = True
+            else:
+                self._set_profile(self._profile + 1)
+
+    def on_error(self):
+        """Move one profile slower and stop tuning, unless already safest."""
+        if self._profile == 0:
+            # No profile has succeeded yet, so there's nothing to settle on.
+            self._successes = 0
+            return
+
+        # The slower profile succeeded `tighten_after` times to get here.
+        self._set_profile(self._profile - 1)
+        self.tuned = True
+
+
+class PacingProfileStore:
+    """Pacing policies saved per device in a JSON file.
+
+    Devices are identified by any string, e.g. the `device` field of a
+    card.version response.
+    """
+
+    def __init__(self, path):
+        """Initialize the store kept in the file at `path`."""
+        self.path = path
+        try:
+            with open(path, 'r') as f:
+                self._profiles = json.load(f)
+        except (OSError, ValueError):
+            # A missing or corrupt file only costs tuning again.
+            self._profiles = {}
+
+    def load(self, device):
+        """Return pacing that starts at the profile saved for `device`.
+
+        The pacing is an AdaptivePacingPolicy, so a Notecard that starts
+        failing at its saved profile still backs off. Return None if nothing
+        is saved for `device`.
+        """
+        profile = self._profiles.get(device)
+        if profile is None:
+            return None
+
+        # Profiles saved before the chunk pause was tunable used the safe one.
+        start = (profile['segment_max_len'], profile['segment_delay_ms'],
+                 profile['chunk_delay_ms'],
+                 profile.get('chunk_pause_ms', SAFE_CHUNK_PAUSE_MS))
+        return AdaptivePacingPolicy(start=start)
+
+    def save(self, device, policy):
+        """Save the segment length and delays of `policy` for `device`."""
+        self._profiles[device] = {
+            'segment_max_len': policy.segment_max_len,
+            'segment_delay_ms': policy.segment_delay_ms,
+            'chunk_delay_ms': policy.chunk_delay_ms,
+            'chunk_pause_ms': policy.chunk_pause_ms,
+        }
+        # Write a temporary file and move it into place, so a crash while
+        # saving can't leave a half written file.
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._profiles, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def pacing_policy(preset):
+    """Create a pacing policy from a preset name: safe, fast, auto or tune."""
+    if preset == 'safe':
+        return PacingPolicy(SAFE_SEGMENT_MAX_LEN, SAFE_SEGMENT_DELAY_MS,
+                            SAFE_CHUNK_DELAY_MS, SAFE_CHUNK_PAUSE_MS)
+    elif preset == 'fast':
+        return PacingPolicy(FAST_SEGMENT_MAX_LEN, FAST_SEGMENT_DELAY_MS,
+                            FAST_CHUNK_DELAY_MS, FAST_CHUNK_PAUSE_MS)
+    elif preset == 'auto':
+        return AdaptivePacingPolicy()
+    elif preset == 'tune':
+        return TuningPacingPolicy()
+
+    raise ValueError(f'Unknown pacing preset "{preset}". Use "safe", ' + \
+                     '"fast", "auto" or "tune".')
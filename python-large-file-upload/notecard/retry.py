@@ -0,0 +1,112 @@
+"""Transaction retry policies for note-python."""
+
+##
+# @file retry.py
+#
+# @brief Decide whether, and how soon, a failed transaction is retried.
+#
+# Notecard.Transaction asks its RetryPolicy after every failed attempt. The
+# policy is told what kind of failure it was, so e.g. a corrupted response can
+# be retried at once while an I/O error backs off.
+
+import random
+
+# The kinds of failure a transaction is retried after.
+# An exception while sending the request or waiting for the response.
+RETRY_TRANSPORT = 'transport'
+# A response that isn't valid JSON.
+RETRY_DECODE = 'decode'
+# A response whose CRC doesn't match.
+RETRY_CRC = 'crc'
+# An {io} error from the Notecard, which didn't get the request intact.
+RETRY_IO = 'io'
+
+# The total number of attempts made, as before retry policies.
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_DELAY_MS = 500
+
+# The delay before the first retry after each kind of failure. A corrupted
+# response is retried almost at once. Transport failures are followed by a
+# reset, which already gives the Notecard time.
+BACKOFF_DELAYS_MS = {
+    RETRY_TRANSPORT: 50,
+    RETRY_DECODE: 10,
+    RETRY_CRC: 10,
+    RETRY_IO: 100,
+}
+BACKOFF_MAX_DELAY_MS = 5000
+
+# Requests that change state on the Notecard or in Notehub. If a response is
+# lost, the Notecard may already have acted on one of these, and without a
+# CRC (and its sequence number) it can't tell a retry from a new request.
+NON_IDEMPOTENT_REQUESTS = ('note.add', 'web.post')
+
+
+class RetryPolicy:
+    """Retry every kind of failure after the same fixed delay.
+
+    At most `max_attempts` attempts are made. If `deadline_secs` isn't 0, no
+    retry is started that would wait past that many seconds since the start
+    of the transaction. Requests in `non_idempotent` are only retried after
+    failures the Notecard reports before acting on the request (I/O errors),
+    unless the Notecard supports CRCs.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 delay_ms=DEFAULT_DELAY_MS, deadline_secs=0,
+                 non_idempotent=NON_IDEMPOTENT_REQUESTS):
+        """Initialize the policy."""
+        self.max_attempts = max_attempts
+        self.delay_ms = delay_ms
+        self.deadline_secs = deadline_secs
+        self.non_idempotent = non_idempotent
+
+    def _delay_ms(self, kind, attempt):
+        """Return the delay in ms before retrying after failed `attempt`."""
+        return self.delay_ms
+
+    def retry_delay(self, req_name, kind, attempt, elapsed_secs, crc):
+        """Return the seconds to wait before retrying, or None to give up.
+
+        `attempt` is the number of attempts that have failed so far, the last
+        with a failure of `kind`. `crc` is True if the Notecard supports CRCs.
+        """
+        if attempt >= self.max_attempts:
+            return None
+
+        if not crc and kind != RETRY_IO and req_name in self.non_idempotent:
+            return None
+
+        delay_secs = self._delay_ms(kind, attempt) / 1000
+        if self.deadline_secs != 0 and \
+                elapsed_secs + delay_secs > self.deadline_secs:
+            return None
+
+        return delay_secs
+
+
+class BackoffRetryPolicy(RetryPolicy):
+    """Retry with exponential backoff and jitter.
+
+    The first retry waits `delays_ms[kind]`, and each one after that twice as
+    long as the last, up to `max_delay_ms`. Every delay is shortened by a
+    random fraction of up to `jitter`, so Notecards that failed together
+    don't all retry together.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, delays_ms=None,
+                 max_delay_ms=BACKOFF_MAX_DELAY_MS, jitter=0.5,
+                 deadline_secs=0, non_idempotent=NON_IDEMPOTENT_REQUESTS):
+        """Initialize the policy."""
+        super().__init__(max_attempts, 0, deadline_secs, non_idempotent)
+        self.delays_ms = dict(BACKOFF_DELAYS_MS)
+        if delays_ms is not None:
+            self.delays_ms.update(delays_ms)
+        self.max_delay_ms = max_delay_ms
+        self.jitter = jitter
+
+    def _delay_ms(self, kind, attempt):
+        """Return the delay in ms before retrying after failed `attempt`."""
+        delay_ms = min(self.delays_ms[kind] * 2 ** (attempt - 1),
+                       self.max_delay_ms)
+        return delay_ms * (1 - self.jitter * random.random())
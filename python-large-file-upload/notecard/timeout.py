@@ -36,3 +36,11 @@ def has_timed_out(start, timeout_secs):
 def start_timeout():
     """Start the timeout interval for I2C communication."""
     return ticks_ms() if not use_rtc else time.time()
+
+
+def elapsed_secs(start):
+    """Return the seconds passed since `start`, a value from start_timeout()."""
+    if not use_rtc:
+        return ticks_diff(ticks_ms(), start) / 1000
+    else:
+        return time.time() - start
@@ -1,14 +1,69 @@
 from notecard import binary_helpers
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+from uploadJournal import UploadJournal
+import os
+import tempfile
 import time
 import io
+import urllib.parse
+import zlib
 
 
 DEFAULT_WEB_TRANSACTION_TIMEOUT_SEC = 30
 DEFAULT_CARD_WEB_REQUEST = "web.post"
 DEFAULT_MS_AZURE_FILENAME = "datafile"
+DEFAULT_MIN_ADAPTIVE_CHUNK_SIZE = 4096
+DEFAULT_COMPRESSION_LEVEL = 6
+COMPRESSION_BLOCK_SIZE = 64 * 1024
+PACK_FILE_NAME_PREFIX = "pack"
+# Keeps the web request name, and the URL Notehub builds from it, within common URL length limits
+DEFAULT_PACK_MANIFEST_MAX_LEN = 1024
+DEFAULT_STRIPE_SIZE = 64 * 1024
+
+# Content type sent with the web request, and zlib wbits, for each compression method
+COMPRESSION_METHODS = {
+    "gzip": {"content": "application/gzip", "wbits": 16 + zlib.MAX_WBITS},
+    "zlib": {"content": "application/zlib", "wbits": zlib.MAX_WBITS},
+}
+
+
+class ChunkSizeTuner:
+    """
+    Choose the size of the next binary chunk from how the previous web requests went
+
+    The size doubles while throughput keeps up, holds when throughput drops, and
+    halves after a failed web request. It always stays between minSize and maxSize.
+    """
+
+    GrowthThreshold = 0.9
+
+    def __init__(self, maxSize, minSize=DEFAULT_MIN_ADAPTIVE_CHUNK_SIZE) -> None:
+        self.maxSize = maxSize
+        self.minSize = min(minSize, maxSize)
+        self.size = max(self.minSize, maxSize // 4)
+        self._lastRate = None
+
+    def success(self, numBytes, seconds):
+        """
+        Record a successful web request and return its throughput in bytes per second
+        """
+        rate = numBytes / max(seconds, 1e-6)
+        if self._lastRate is None or rate >= self._lastRate * self.GrowthThreshold:
+            self.size = min(self.maxSize, self.size * 2)
+        self._lastRate = rate
+        return rate
+
+    def failure(self):
+        self.size = max(self.minSize, self.size // 2)
+        self._lastRate = None
+
 
 class BinaryDataUploader:
 
+    # Template for the web request. Each instance works on its own copy
     webReqRoot = {"req":DEFAULT_CARD_WEB_REQUEST,
                 "seconds": DEFAULT_WEB_TRANSACTION_TIMEOUT_SEC,
                 "content":"application/octet-stream",
@@ -19,18 +74,28 @@ class BinaryDataUploader:
                 }
 
     ConnectionTimeoutSeconds = 90
+    AdaptiveChunkRetries = 3
+    PackManifestMaxLength = DEFAULT_PACK_MANIFEST_MAX_LEN
 
     def __init__(self, card, req, route, timeout=DEFAULT_WEB_TRANSACTION_TIMEOUT_SEC, printFcn=print, waitForNotehubConnection=True, setTempContinuousMode=True) -> None:
         self._card = card
         self._print = printFcn
         self.WaitForConnection = waitForNotehubConnection
         self.SetTemporaryContinuousMode=setTempContinuousMode
+        self.webReqRoot = dict(self.webReqRoot)
         self.webReqRoot['req'] = req
         self.webReqRoot['route'] = route
         self.webReqRoot['seconds'] = timeout
         self._fileName = None
         self._binaryBuffSize = None
         self._cloud_service = None
+        self._pipelined = False
+        self._journal = None
+        self._binaryMax = None
+        self._adaptive = False
+        self._compression = None
+        self._compressionLevel = DEFAULT_COMPRESSION_LEVEL
+        self.lastUploadStats = {}
 
     def setFileNameViaEnvDefault(self, fileName):
         """
@@ -84,6 +149,214 @@ class BinaryDataUploader:
             self._print(f"Waiting for Notehub connection")
             self._waitForConnection()
 
+        self._uploadData(data)
+
+        if self.SetTemporaryContinuousMode:
+            self._unsetTempContinuousMode()
+
+        if unsetFileName:
+            self.unsetFileName()
+
+    def uploadFiles(self, paths, includeFileName=True):
+        """
+        Upload several files back to back, paying for the Notehub connection setup only once
+
+        The Notecard stays in temporary continuous mode for the whole batch. A file that fails to
+        upload is reported and skipped. Returns a list with a dict per file containing the path,
+        bytes, seconds and error (None on success).
+        """
+        results = []
+
+        if self.SetTemporaryContinuousMode:
+            self._setTempContinuousMode()
+
+        try:
+            if self.WaitForConnection:
+                self._print(f"Waiting for Notehub connection")
+                self._waitForConnection()
+
+            for path in paths:
+                results.append(self._uploadFile(path, includeFileName))
+        finally:
+            if self.SetTemporaryContinuousMode:
+                self._unsetTempContinuousMode()
+
+        return results
+
+    def _uploadFile(self, path, includeFileName=True):
+        if includeFileName:
+            self.setFileName(os.path.basename(path))
+
+        error = None
+        numBytes = 0
+        startTime = time.time()
+        try:
+            # A spooled file may be gone by now. That only fails this file
+            numBytes = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                self._uploadData(f)
+        except Exception as e:
+            error = str(e)
+            self._print(f"Failed to upload {path}: {error}")
+
+        self.unsetFileName()
+
+        return {
+            "path": path,
+            "bytes": numBytes,
+            "seconds": time.time() - startTime,
+            "error": error,
+        }
+
+    def uploadFilesPacked(self, paths):
+        """
+        Upload many small files, packing as many as fit into each binary transfer
+
+        Files are concatenated in the Notecard's binary store and sent with a single web request.
+        The request name carries a manifest query parameter listing name:offset:length for each
+        file in the pack (names are URL-encoded), so the route can split them apart again, e.g.
+        pack-1700000000-0.bin?manifest=a.csv:0:120,b.csv:120:300
+
+        A pack ends when the next file would overflow the binary store, or would take the manifest
+        past PackManifestMaxLength characters. Files too large to share a transfer are uploaded on
+        their own, as uploadFiles does. Packed files are not compressed, and packs are always sent
+        as application/octet-stream. Returns the same per-file results as uploadFiles, with each
+        file's share of its pack's time counted by size.
+
+        Azure routes have no name field for the manifest, so they fall back to uploadFiles.
+        """
+        if self._cloud_service == "azure":
+            return self.uploadFiles(paths)
+
+        results = []
+
+        if self.SetTemporaryContinuousMode:
+            self._setTempContinuousMode()
+
+        try:
+            if self.WaitForConnection:
+                self._print(f"Waiting for Notehub connection")
+                self._waitForConnection()
+
+            binary_helpers.binary_store_reset(self._card)
+            capacity = self._getMaxChunkSize()
+
+            packs = []
+            pack = []
+            packBytes = 0
+            manifestLength = 0
+            for path in paths:
+                try:
+                    size = os.path.getsize(path)
+                except OSError as e:
+                    self._print(f"Failed to upload {path}: {e}")
+                    results.append({"path": path, "bytes": 0, "seconds": 0, "error": str(e)})
+                    continue
+
+                if size > capacity:
+                    packs.append([(path, size)])
+                    continue
+
+                entryLength = len(self._manifestEntry(path, packBytes, size))
+                if pack and (packBytes + size > capacity or
+                             manifestLength + 1 + entryLength > self.PackManifestMaxLength):
+                    packs.append(pack)
+                    pack = []
+                    packBytes = 0
+                    manifestLength = 0
+                    # The offset in the entry is now 0
+                    entryLength = len(self._manifestEntry(path, 0, size))
+                pack.append((path, size))
+                packBytes += size
+                manifestLength += entryLength + (1 if len(pack) > 1 else 0)
+            if pack:
+                packs.append(pack)
+
+            packPrefix = f"{PACK_FILE_NAME_PREFIX}-{int(time.time())}"
+            buffer = bytearray(capacity)
+            for index, pack in enumerate(packs):
+                path, size = pack[0]
+                if len(pack) == 1 and size > capacity:
+                    results.append(self._uploadFile(path))
+                    continue
+
+                results += self._uploadPack(pack, f"{packPrefix}-{index}.bin", buffer)
+        finally:
+            if self.SetTemporaryContinuousMode:
+                self._unsetTempContinuousMode()
+
+        return results
+
+    def _uploadPack(self, pack, packName, buffer: bytearray):
+        packBytes = sum(size for _, size in pack)
+        manifest = []
+        offset = 0
+
+        error = None
+        startTime = time.time()
+        try:
+            for path, size in pack:
+                with open(path, 'rb') as f:
+                    numBytes = f.readinto(memoryview(buffer)[offset:offset + size])
+                if numBytes != size:
+                    raise Exception(f"{path} changed size while being packed")
+
+                manifest.append(self._manifestEntry(path, offset, size))
+                offset += size
+
+            # Packs are never compressed, whatever setCompression chose for single files
+            self._sendChunk(memoryview(buffer)[0:packBytes], 0, packBytes,
+                            name=f"{packName}?manifest={','.join(manifest)}",
+                            content="application/octet-stream")
+        except Exception as e:
+            error = str(e)
+            self._print(f"Failed to upload {packName}: {error}")
+
+        seconds = time.time() - startTime
+        return [{
+            "path": path,
+            "bytes": size,
+            "seconds": seconds * size / packBytes if packBytes else 0,
+            "error": error,
+        } for path, size in pack]
+
+    def _manifestEntry(self, path, offset, size):
+        return f"{urllib.parse.quote(os.path.basename(path), safe='')}:{offset}:{size}"
+
+    def uploadStream(self, source, totalBytes=None, unsetFileName=True):
+        """
+        Upload data from a source that can't seek, such as a pipe, a socket or a generator
+
+        source is either a readable binary stream or an iterable of bytes-like blocks. Chunks are
+        sent as soon as enough data has arrived, so nothing is written to disk first.
+
+        If totalBytes is given, every web request carries it as the total and the source must
+        deliver exactly that many bytes. Otherwise the total isn't known until the source ends:
+        each web request carries the number of bytes read so far, which includes the next chunk
+        and so is always past the end of the current one, and the last chunk's web request carries
+        the final total. A route can treat a fragment ending at the total as the last one.
+
+        Resume and adaptive chunk sizes need to seek, so they aren't used here. With compression,
+        totalBytes is the uncompressed size and the compressed total is finalized on the last chunk.
+        """
+        if self.SetTemporaryContinuousMode:
+            self._setTempContinuousMode()
+
+        try:
+            if self.WaitForConnection:
+                self._print(f"Waiting for Notehub connection")
+                self._waitForConnection()
+
+            self._setAzureFileName()
+            self._writeAndFlushStream(source, totalBytes)
+        finally:
+            if self.SetTemporaryContinuousMode:
+                self._unsetTempContinuousMode()
+
+        if unsetFileName:
+            self.unsetFileName()
+
+    def _setAzureFileName(self):
         if self._cloud_service == "azure":
             # Due to a limitation in MS Azure where the filename cannot be set via a web request,
             # the filename is instead set via the env.default method. This means that the filename
@@ -93,13 +366,15 @@ class BinaryDataUploader:
                 self._fileName = DEFAULT_MS_AZURE_FILENAME
             self.setFileNameViaEnvDefault(self._fileName)
 
-        self._writeAndFlushBytes(data)
+    def _uploadData(self, data: io.IOBase):
+        self._setAzureFileName()
 
-        if self.SetTemporaryContinuousMode:
-            self._unsetTempContinuousMode()
-
-        if unsetFileName:
-            self.unsetFileName()
+        if self._compression is None:
+            self._writeAndFlushBytes(data)
+        else:
+            with self._compress(data) as compressed:
+                self._writeAndFlushBytes(compressed)
+                self.lastUploadStats["uncompressedBytes"] = data.seek(0, 2)
 
     ## Notecard Request Method
     def _sendRequest(self, req, args=None, errRaisesException=True):
@@ -117,14 +392,22 @@ class BinaryDataUploader:
 
         return rsp
 
-    def _writeWebReqBinary(self, offset, total):
+    def _writeWebReqBinary(self, offset, total, name=None, content=None):
         webReq = self.webReqRoot
+        if content is not None:
+            webReq = dict(webReq, content=content)
         webReq['offset'] = offset
         webReq['total'] = total
         # If the filename is set, add it to the web request. This is not supported for Azure
         # which doesn't have a filename field in the web request, and adding it will cause an error
-        if (self._fileName is not None) and (self._cloud_service != "azure"):
+        if name is not None:
+            webReq['name'] = name
+        elif (self._fileName is not None) and (self._cloud_service != "azure"):
             webReq['name'] = self._fileName
+            if self._compression == "gzip" and not self._fileName.endswith(".gz"):
+                webReq['name'] += ".gz"
+        else:
+            webReq.pop('name', None)
 
         rsp = self._sendRequest(webReq)
 
@@ -139,35 +422,229 @@ class BinaryDataUploader:
 
 
 
+    def _sendChunk(self, chunk, offset, total, name=None, content=None):
+        """
+        Send a chunk through an empty binary store. The store's capacity must already be known
+
+        content overrides the content type of the web request, e.g. for data that isn't compressed.
+        """
+        # The Notecard is locked once for the whole sequence of requests
+        with self._card.locked():
+            binary_helpers.binary_store_reset(self._card)
+            binary_helpers.binary_store_transmit(self._card, chunk, 0, known_max=self._binaryMax)
+            self._writeWebReqBinary(offset, total, name=name, content=content)
+
+    def _readChunk(self, data: io.IOBase, buffer: bytearray):
+        """Read the next chunk into buffer and encode it for the Notecard's binary store"""
+        numBytes = data.readinto(buffer)
+        chunk = memoryview(buffer)[0:numBytes]
+        return chunk, binary_helpers.binary_store_encode(chunk)
+
     def _writeAndFlushBytes(self, data: io.IOBase):
 
         totalBytes = data.seek(0,2)
         data.seek(0,0)
 
+        # In resume mode, skip whatever Notehub acknowledged on a previous attempt
+        journalKey = None
         bytesSent = 0
-        while bytesSent < totalBytes:
-            binary_helpers.binary_store_reset(self._card)
-            rsp = self._sendRequest("card.binary")
+        if self._journal is not None:
+            journalKey = UploadJournal.fileKey(data, self.webReqRoot['route'])
+            bytesSent = self._journal.getOffset(journalKey)
+            if bytesSent > 0:
+                self._print(f"Resuming upload at offset {bytesSent} of {totalBytes}")
+            data.seek(bytesSent, 0)
 
-            # First set the buffer size to be equal to the max binary buffer size supported by the notecard,
-            # then check if the user has specified a smaller buffer size through the -B/--binary-size flag
-            buffSize = rsp.get("max", 0)
-            if self._binaryBuffSize is not None:
-                buffSize = min(self._binaryBuffSize, buffSize)
+        # In pipelined mode the next chunk is read and encoded on this worker
+        # thread while the web request for the current chunk is in flight.
+        # The worker never talks to the Notecard.
+        worker = ThreadPoolExecutor(max_workers=1) if self._pipelined else None
+        nextChunk = None
 
-            # Create a buffer of the specified size
-            buffer = bytearray(buffSize)
+        # In adaptive mode the chunk size follows the measured web request throughput,
+        # and a failed web request is retried with a smaller chunk
+        tuner = None
+        failures = 0
 
-            # Read the data from the file and store it in the notecard's binary store
-            numBytes = data.readinto(buffer)
-            binary_helpers.binary_store_transmit(self._card, buffer[0:numBytes], 0)
+        startBytes = bytesSent
+        startTransactions = self._card.GetTransactionCount()
+        chunks = 0
 
-            # Send the binary data to notehub
-            self._writeWebReqBinary(bytesSent, totalBytes)
+        buffer = bytearray()
+        try:
+            while bytesSent < totalBytes:
+                binary_helpers.binary_store_reset(self._card)
 
-            bytesSent += numBytes
+                # First set the buffer size to be equal to the max binary buffer size supported by the notecard,
+                # then check if the user has specified a smaller buffer size through the -B/--binary-size flag
+                buffSize = self._getBinaryMax()
+                if self._binaryBuffSize is not None:
+                    buffSize = min(self._binaryBuffSize, buffSize)
+
+                if self._adaptive:
+                    if tuner is None or tuner.maxSize != buffSize:
+                        tuner = ChunkSizeTuner(buffSize)
+                    buffSize = tuner.size
+
+                if nextChunk is None:
+                    # Reuse the buffer from the previous chunk unless the size has changed
+                    if len(buffer) != buffSize:
+                        buffer = bytearray(buffSize)
+
+                    # Read the data from the file and store it in the notecard's binary store.
+                    # A memoryview is used so a short final chunk isn't copied.
+                    chunk, encoded = self._readChunk(data, buffer)
+                else:
+                    chunk, encoded = nextChunk.result()
+                    nextChunk = None
+
+                # The store was just reset, so its capacity is already known
+                numBytes = len(chunk)
+                binary_helpers.binary_store_transmit(self._card, chunk, 0, encoded, known_max=self._binaryMax)
+
+                # The chunk is in the Notecard now, so its buffer can be refilled
+                if worker is not None and bytesSent + numBytes < totalBytes:
+                    if len(buffer) != buffSize:
+                        buffer = bytearray(buffSize)
+                    nextChunk = worker.submit(self._readChunk, data, buffer)
+
+                # Send the binary data to notehub
+                postStartTime = time.time()
+                try:
+                    self._writeWebReqBinary(bytesSent, totalBytes)
+                except Exception as e:
+                    if tuner is None or failures >= self.AdaptiveChunkRetries:
+                        raise
+
+                    failures += 1
+                    tuner.failure()
+                    self._print(f"Web request for {numBytes} bytes at offset {bytesSent} failed ({e}). " +
+                                f"Retrying with {tuner.size} byte chunks")
+
+                    # Discard any chunk read ahead and read again from the failed offset
+                    if nextChunk is not None:
+                        nextChunk.result()
+                        nextChunk = None
+                    data.seek(bytesSent, 0)
+                    continue
+
+                failures = 0
+                if tuner is not None:
+                    postSeconds = time.time() - postStartTime
+                    rate = tuner.success(numBytes, postSeconds)
+                    self._print(f"Sent {numBytes} bytes at offset {bytesSent} in {postSeconds:.2f} seconds " +
+                                f"({rate/1024:.1f} KB/s). Next chunk size {tuner.size} bytes")
+
+                bytesSent += numBytes
+                chunks += 1
+
+                if journalKey is not None:
+                    self._journal.record(journalKey, bytesSent, totalBytes)
+        finally:
+            if worker is not None:
+                worker.shutdown()
+
+            self.lastUploadStats = {
+                "bytes": bytesSent - startBytes,
+                "chunks": chunks,
+                "transactions": self._card.GetTransactionCount() - startTransactions,
+            }
+
+        if journalKey is not None:
+            self._journal.remove(journalKey)
 
 
+    def _writeAndFlushStream(self, source, totalBytes=None):
+        binary_helpers.binary_store_reset(self._card)
+        chunkSize = self._getMaxChunkSize()
+
+        # The declared size is of the data read from the source, so with compression
+        # the total sent to Notehub is only known at the end
+        counter = _ByteCounter(_streamBlocks(source, chunkSize))
+        blocks = counter
+        declaredTotal = totalBytes
+        if self._compression is not None:
+            blocks = _compressBlocks(blocks, self._compression, self._compressionLevel)
+            declaredTotal = None
+
+        startTransactions = self._card.GetTransactionCount()
+        bytesSent = 0
+        chunks = 0
+
+        # Read one chunk ahead, so the last chunk is known before it is sent
+        streamChunks = _fixedSizeChunks(blocks, chunkSize)
+        chunk = next(streamChunks, None)
+        try:
+            while chunk is not None:
+                nextChunk = next(streamChunks, None)
+                end = bytesSent + len(chunk)
+
+                if declaredTotal is not None:
+                    if end > declaredTotal:
+                        raise Exception(f"Stream is longer than the declared {declaredTotal} bytes")
+                    total = declaredTotal
+                elif nextChunk is None:
+                    total = end
+                else:
+                    total = end + len(nextChunk)
+
+                self._sendChunk(chunk, bytesSent, total)
+
+                bytesSent = end
+                chunks += 1
+                chunk = nextChunk
+        finally:
+            self.lastUploadStats = {
+                "bytes": bytesSent,
+                "chunks": chunks,
+                "transactions": self._card.GetTransactionCount() - startTransactions,
+            }
+            if self._compression is not None:
+                self.lastUploadStats["uncompressedBytes"] = counter.count
+
+        if totalBytes is not None and counter.count != totalBytes:
+            raise Exception(f"Stream ended after {counter.count} of the declared {totalBytes} bytes")
+
+    def _compress(self, data: io.IOBase):
+        """
+        Compress the file block by block into a temporary file, so memory use stays bounded
+
+        The compressed size has to be known up front, because every web request carries the total.
+        """
+        method = COMPRESSION_METHODS[self._compression]
+        compressor = zlib.compressobj(self._compressionLevel, zlib.DEFLATED, method["wbits"])
+        compressed = tempfile.TemporaryFile()
+
+        data.seek(0, 0)
+        block = data.read(COMPRESSION_BLOCK_SIZE)
+        while block:
+            compressed.write(compressor.compress(block))
+            block = data.read(COMPRESSION_BLOCK_SIZE)
+        compressed.write(compressor.flush())
+
+        compressed.seek(0, 0)
+        return compressed
+
+    def _getBinaryMax(self):
+        """
+        Get the capacity of the Notecard's binary store, querying the Notecard only the first time
+        """
+        if self._binaryMax is None:
+            rsp = self._sendRequest("card.binary")
+            self._binaryMax = rsp.get("max", 0)
+
+        return self._binaryMax
+
+    def _getMaxChunkSize(self):
+        """
+        Get the largest chunk to send, which is the binary store capacity unless setBinaryBuffSize set less
+        """
+        chunkSize = self._getBinaryMax()
+        if self._binaryBuffSize is not None:
+            chunkSize = min(self._binaryBuffSize, chunkSize)
+
+        return chunkSize
+
     def _waitForConnection(self):
         startTime = time.time()
         isConnected=False
@@ -191,9 +668,349 @@ class BinaryDataUploader:
     def setBinaryBuffSize(self, binaryBuffSize):
         self._binaryBuffSize = binaryBuffSize
 
+    def setResumeJournal(self, journalPath):
+        """
+        Record acknowledged chunks in a journal file so a failed upload can resume where it stopped
+
+        Only the binary upload method supports this. Pass None to turn it off. An UploadJournal
+        can be passed instead of a path, so several uploaders can share it.
+        """
+        if journalPath is None or isinstance(journalPath, UploadJournal):
+            self._journal = journalPath
+        else:
+            self._journal = UploadJournal(journalPath)
+
+    def setAdaptiveChunkSize(self, adaptive=True):
+        """
+        Adjust the chunk size after every web request based on the measured throughput and failures
+
+        Chunks stay within the Notecard's binary store capacity and any size set with setBinaryBuffSize.
+        A failed web request is retried with a smaller chunk, up to AdaptiveChunkRetries times in a row.
+        """
+        self._adaptive = adaptive
+
+    def setCompression(self, method, level=DEFAULT_COMPRESSION_LEVEL):
+        """
+        Compress the file before it is sent, using "gzip" or "zlib". Pass None to send it as is
+
+        The web request content type is set to match, so the route receives a single valid gzip
+        (or zlib) stream once the chunks are put back together. With gzip, ".gz" is added to the file name.
+        """
+        if method is None:
+            self.webReqRoot['content'] = "application/octet-stream"
+        elif method in COMPRESSION_METHODS:
+            self.webReqRoot['content'] = COMPRESSION_METHODS[method]["content"]
+        else:
+            raise ValueError(f"Unsupported compression method: {method}, options are {list(COMPRESSION_METHODS)}")
+
+        self._compression = method
+        self._compressionLevel = level
+
+    def setPipelined(self, pipelined=True):
+        """
+        Read and encode the next chunk while the current chunk's web request is in flight
+        """
+        self._pipelined = pipelined
+
     def setCloudService(self, cloudService):
         self._cloud_service = cloudService
 
+def _streamBlocks(source, blockSize):
+    """Yield the blocks of a readable stream or an iterable of bytes-like objects"""
+    if hasattr(source, "read"):
+        block = source.read(blockSize)
+        while block:
+            yield block
+            block = source.read(blockSize)
+    else:
+        for block in source:
+            if block:
+                yield block
+
+
+def _compressBlocks(blocks, method, level):
+    """Compress a sequence of blocks into a single gzip or zlib stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, COMPRESSION_METHODS[method]["wbits"])
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _fixedSizeChunks(blocks, chunkSize):
+    """Regroup blocks of any size into chunks of chunkSize bytes. Only the last chunk may be shorter"""
+    pending = bytearray()
+    for block in blocks:
+        pending += block
+        while len(pending) >= chunkSize:
+            yield bytes(pending[:chunkSize])
+            del pending[:chunkSize]
+    if pending:
+        yield bytes(pending)
+
+
+class _ByteCounter:
+    """Pass blocks through, counting their bytes"""
+
+    def __init__(self, blocks):
+        self._blocks = blocks
+        self.count = 0
+
+    def __iter__(self):
+        for block in self._blocks:
+            self.count += len(block)
+            yield block
+
+
+class _StripeCoordinator:
+    """
+    Hand out the ranges of a file to the Notecards striping it, and take back the ones that fail
+
+    A failed range goes back in the queue and is given to a different Notecard, unless the one that
+    failed is the only one left. A range that fails maxAttempts times is given up on.
+    """
+
+    def __init__(self, data: io.IOBase, totalBytes, stripeSize, numCards, maxAttempts):
+        # Each range is (offset, length, card that last failed to send it, attempts so far)
+        self._ranges = deque((offset, min(stripeSize, totalBytes - offset), None, 0)
+                             for offset in range(0, totalBytes, stripeSize))
+        self._maxAttempts = maxAttempts
+        self._active = set(range(numCards))
+        self._inFlight = 0
+        self._cond = threading.Condition()
+        self._data = data
+        self._readLock = threading.Lock()
+        self.cardBytes = [0] * numCards
+        self.retries = 0
+        self.failedRanges = []
+
+    def next(self, card):
+        """Get the next (offset, length) for the card, waiting if need be. None when there's nothing left"""
+        with self._cond:
+            while True:
+                for i, (offset, length, lastCard, attempts) in enumerate(self._ranges):
+                    if lastCard != card or self._active == {card}:
+                        del self._ranges[i]
+                        self._inFlight += 1
+                        return offset, length, attempts
+
+                if not self._ranges and self._inFlight == 0:
+                    return None
+
+                # Wait for a range in flight to finish or fail, or for another card to retire
+                self._cond.wait()
+
+    def done(self, card, length):
+        with self._cond:
+            self._inFlight -= 1
+            self.cardBytes[card] += length
+            self._cond.notify_all()
+
+    def failed(self, card, offset, length, attempts, sent):
+        """The card failed after sending the first `sent` bytes of the range, so only the rest is retried"""
+        with self._cond:
+            self._inFlight -= 1
+            self.cardBytes[card] += sent
+            offset, length = offset + sent, length - sent
+            attempts += 1
+            if attempts >= self._maxAttempts:
+                self.failedRanges.append((offset, length))
+            else:
+                self.retries += 1
+                self._ranges.appendleft((offset, length, card, attempts))
+            self._cond.notify_all()
+
+    def retire(self, card):
+        with self._cond:
+            self._active.discard(card)
+            self._cond.notify_all()
+
+    def unsentRanges(self):
+        return self.failedRanges + [(offset, length) for offset, length, _, _ in self._ranges]
+
+    def read(self, offset, view: memoryview):
+        """Read the file at offset into view. Cards share the file, so reads are serialized"""
+        with self._readLock:
+            self._data.seek(offset, 0)
+            return self._data.readinto(view)
+
+
+class MultiCardUploader:
+    """
+    Upload over several Notecards at once, for example on a gateway with one Notecard per cellular link
+
+    Each BinaryDataUploader must drive its own Notecard, and runs on its own thread. Work is handed
+    out from a shared queue, so a faster link simply takes more of it. Notecards on serial ports
+    need separate serial lock files (see OpenSerial's lock_path), otherwise they wait for each
+    other's web requests.
+    """
+
+    StripeAttempts = 3
+    CardFailureLimit = 2
+
+    def __init__(self, uploaders, printFcn=print) -> None:
+        self._uploaders = uploaders
+        self._print = printFcn
+        self.lastUploadStats = {}
+
+    def setFileName(self, fileName):
+        for uploader in self._uploaders:
+            uploader.setFileName(fileName)
+
+    def unsetFileName(self):
+        for uploader in self._uploaders:
+            uploader.unsetFileName()
+
+    def upload(self, data: io.IOBase, stripeSize=DEFAULT_STRIPE_SIZE, unsetFileName=True):
+        """
+        Upload one file by striping it across all Notecards
+
+        The file is split into ranges of stripeSize bytes, and each Notecard sends the next unsent
+        range in web requests carrying its offset and the file's total, so the route reassembles a
+        single object. A slow link takes fewer ranges. A range that fails is retried on another
+        Notecard, up to StripeAttempts times, and a Notecard that fails CardFailureLimit ranges in a
+        row stops taking part. Raises an exception if any range couldn't be sent.
+
+        The first uploader's compression setting applies to the whole file. Resume isn't supported.
+        """
+        compressed = None
+        if self._uploaders[0]._compression is not None:
+            compressed = data = self._uploaders[0]._compress(data)
+
+        try:
+            totalBytes = data.seek(0, 2)
+            stripe = _StripeCoordinator(data, totalBytes, stripeSize, len(self._uploaders), self.StripeAttempts)
+
+            threads = [threading.Thread(target=self._uploadRangesWorker,
+                                        args=(index, uploader, stripe, totalBytes))
+                       for index, uploader in enumerate(self._uploaders)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            if compressed is not None:
+                compressed.close()
+            if unsetFileName:
+                self.unsetFileName()
+
+        self.lastUploadStats = {
+            "bytes": sum(stripe.cardBytes),
+            "cardBytes": stripe.cardBytes,
+            "retries": stripe.retries,
+        }
+
+        unsent = stripe.unsentRanges()
+        if unsent:
+            raise Exception(f"{sum(length for _, length in unsent)} of {totalBytes} bytes in {len(unsent)} " +
+                            "ranges could not be uploaded by any Notecard")
+
+    def _uploadRangesWorker(self, index, uploader, stripe, totalBytes):
+        try:
+            if uploader.SetTemporaryContinuousMode:
+                uploader._setTempContinuousMode()
+
+            try:
+                if uploader.WaitForConnection:
+                    self._print(f"Card {index}: waiting for Notehub connection")
+                    uploader._waitForConnection()
+
+                uploader._setAzureFileName()
+                binary_helpers.binary_store_reset(uploader._card)
+                buffer = bytearray(uploader._getMaxChunkSize())
+
+                failures = 0
+                while failures < self.CardFailureLimit:
+                    nextRange = stripe.next(index)
+                    if nextRange is None:
+                        break
+
+                    offset, length, attempts = nextRange
+                    sent = 0
+                    try:
+                        # A range bigger than this Notecard's binary store is sent in several chunks
+                        while sent < length:
+                            chunk = memoryview(buffer)[0:min(len(buffer), length - sent)]
+                            stripe.read(offset + sent, chunk)
+                            uploader._sendChunk(chunk, offset + sent, totalBytes)
+                            sent += len(chunk)
+                    except Exception as e:
+                        self._print(f"Card {index}: failed to send {length - sent} bytes at offset {offset + sent}: {e}")
+                        stripe.failed(index, offset, length, attempts, sent)
+                        failures += 1
+                        continue
+
+                    failures = 0
+                    stripe.done(index, length)
+            finally:
+                if uploader.SetTemporaryContinuousMode:
+                    uploader._unsetTempContinuousMode()
+        except Exception as e:
+            self._print(f"Card {index}: stopped uploading: {e}")
+        finally:
+            stripe.retire(index)
+
+    def uploadFiles(self, paths, includeFileName=True):
+        """
+        Upload the files over all Notecards in parallel
+
+        Returns the same per-file results as BinaryDataUploader.uploadFiles, in the order of paths,
+        with the index of the uploader that sent each file added as "card". If a Notecard can't
+        connect to Notehub, the other Notecards carry on with its share of the files.
+        """
+        pending = queue.Queue()
+        for position, path in enumerate(paths):
+            pending.put((position, path))
+        results = [None] * len(paths)
+
+        threads = [threading.Thread(target=self._uploadFilesWorker,
+                                    args=(index, uploader, pending, results, includeFileName))
+                   for index, uploader in enumerate(self._uploaders)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Anything left over had no Notecard able to send it
+        for position, path in enumerate(paths):
+            if results[position] is None:
+                try:
+                    # A queued file may be gone by now. Its result still reports the failed upload
+                    numBytes = os.path.getsize(path)
+                except OSError:
+                    numBytes = 0
+                results[position] = {"path": path, "bytes": numBytes, "seconds": 0,
+                                     "error": "No Notecard was able to upload this file", "card": None}
+
+        return results
+
+    def _uploadFilesWorker(self, index, uploader, pending, results, includeFileName):
+        try:
+            if uploader.SetTemporaryContinuousMode:
+                uploader._setTempContinuousMode()
+
+            try:
+                if uploader.WaitForConnection:
+                    self._print(f"Card {index}: waiting for Notehub connection")
+                    uploader._waitForConnection()
+
+                while True:
+                    try:
+                        position, path = pending.get_nowait()
+                    except queue.Empty:
+                        break
+
+                    result = uploader._uploadFile(path, includeFileName)
+                    result["card"] = index
+                    results[position] = result
+            finally:
+                if uploader.SetTemporaryContinuousMode:
+                    uploader._unsetTempContinuousMode()
+        except Exception as e:
+            self._print(f"Card {index}: stopped uploading: {e}")
+
+
 import binascii
 class BinaryDataUploaderLegacy(BinaryDataUploader):
     webReqRoot = {"req":DEFAULT_CARD_WEB_REQUEST,
@@ -212,11 +1029,14 @@ class BinaryDataUploaderLegacy(BinaryDataUploader):
             self._print(f"Waiting for Notehub connection")
             self._waitForConnection()
 
-        self._sendBytesBase64Payload(data)
+        self._uploadData(data)
 
         if self.SetTemporaryContinuousMode:
             self._unsetTempContinuousMode()
 
+    def _uploadData(self, data: io.IOBase):
+        self._sendBytesBase64Payload(data)
+
     def _sendBytesBase64Payload(self, data: io.IOBase):
         buffer = bytearray(self.chunk_size)
 
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import tracemalloc
+from unittest.mock import Mock
+from notecard import binary_helpers
+from notecard.cobs import cobs_encode, cobs_decode
+import pytest
+
+
+def mockCard(maxLen=1024 * 1024):
+    card = Mock()
+    card._debug = False
+    card.Transaction.side_effect = lambda req, lock=True: \
+        {'max': maxLen} if req == {'req': 'card.binary'} else {}
+    return card
+
+
+def test_binary_store_transmit_sendsTerminatedCobsData():
+    card = mockCard()
+    data = bytearray(b'\x00hello\nworld\x00')
+
+    binary_helpers.binary_store_transmit(card, data, 0)
+
+    putReq = card.Transaction.call_args_list[1][0][0]
+    sent = card.transmit.call_args[0][0]
+    assert putReq['req'] == 'card.binary.put'
+    assert putReq['status'] == hashlib.md5(data).hexdigest()
+    assert putReq['cobs'] == len(sent) - 1
+    assert sent[-1] == ord('\n')
+    assert ord('\n') not in sent[:-1]
+    assert cobs_decode(sent[:-1], ord('\n')) == data
+
+
+@pytest.mark.parametrize("view", [lambda b: memoryview(b), lambda b: memoryview(b)[3:-5], bytes])
+def test_binary_store_transmit_acceptsBytesLikeObjects(view):
+    card = mockCard()
+    buffer = bytearray(os.urandom(4096))
+    original = bytes(buffer)
+    data = view(buffer)
+
+    binary_helpers.binary_store_transmit(card, data, 0)
+
+    sent = card.transmit.call_args[0][0]
+    assert cobs_decode(sent[:-1], ord('\n')) == bytes(data)
+    assert card.Transaction.call_args_list[1][0][0]['status'] == hashlib.md5(data).hexdigest()
+    assert buffer == original
+
+
+def test_binary_store_transmit_doesNotCopyInput():
+    size = 1024 * 1024
+    card = mockCard(size)
+    buffer = bytearray(os.urandom(size))
+
+    tracemalloc.start()
+    try:
+        binary_helpers.binary_store_transmit(card, memoryview(buffer), 0)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # One XOR-translated working copy plus the encoded output.
+    assert peak < 2.1 * size
+
+
+def test_binary_store_receive_decodesWithoutTrailingNewline():
+    data = bytes(range(256)) * 4
+    encoded = cobs_encode(data, ord('\n'), terminate=True)
+    card = Mock()
+    card.Transaction.return_value = {'status': hashlib.md5(data).hexdigest()}
+    card.receive.return_value = bytearray(encoded)
+
+    assert binary_helpers.binary_store_receive(card, 0, len(data)) == data
+
+
+def test_binary_store_transmit_knownMaxSkipsCapacityQuery():
+    card = mockCard()
+
+    binary_helpers.binary_store_transmit(card, b'abc', 0, known_max=1024)
+
+    assert [c[0][0]['req'] for c in card.Transaction.call_args_list] == ['card.binary.put', 'card.binary']
+
+
+def test_binary_store_transmit_knownMaxTooSmall():
+    card = mockCard()
+
+    with pytest.raises(Exception, match='won\'t fit'):
+        binary_helpers.binary_store_transmit(card, b'abcd', 0, known_max=3)
+
+    with pytest.raises(Exception, match='max is zero'):
+        binary_helpers.binary_store_transmit(card, b'abcd', 0, known_max=0)
+
+
+def test_binary_store_transmit_locksOnceForPutTransmitAndCheck():
+    card = mockCard()
+
+    binary_helpers.binary_store_transmit(card, bytearray(b'hello'), 0, known_max=1024)
+
+    assert card.lock.call_count == 1
+    assert card.unlock.call_count == 1
+    assert [c[1].get('lock') for c in card.Transaction.call_args_list] == [False, False]
@@ -0,0 +1,103 @@
+import random
+from notecard.cobs import cobs_encode, cobs_decode, \
+    _cobs_encode_fast, _cobs_decode_fast, _cobs_encode_loop, _cobs_decode_loop
+import pytest
+
+EOP = ord('\n')
+
+
+def randomInputs(count=300, maxLen=2000, seed=42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        length = rng.randrange(maxLen)
+        # Vary how often zeros and the end of packet marker appear so both
+        # long runs and short runs are covered.
+        zeroOdds = rng.choice([2, 16, 256, 100000])
+        data = bytearray(rng.getrandbits(8) for _ in range(length))
+        for i in range(length):
+            if rng.randrange(zeroOdds) == 0:
+                data[i] = rng.choice([0, EOP])
+        yield bytes(data)
+
+
+EDGE_CASES = [
+    b'',
+    b'\x00',
+    b'\x00\x00',
+    b'\n',
+    b'\x01' * 253,
+    b'\x01' * 254,
+    b'\x01' * 255,
+    b'\x01' * 254 + b'\x00',
+    b'\x00' + b'\x01' * 508 + b'\x00',
+    bytes(range(256)) * 3,
+]
+
+
+@pytest.mark.parametrize("data", EDGE_CASES)
+def test_cobs_fastMatchesLoop_edgeCases(data):
+    encoded = _cobs_encode_fast(data, EOP)
+
+    assert encoded == _cobs_encode_loop(data, EOP)
+    assert _cobs_decode_fast(encoded, EOP) == _cobs_decode_loop(encoded, EOP) == data
+
+
+def test_cobs_fastMatchesLoop_fuzz():
+    for data in randomInputs():
+        encoded = _cobs_encode_fast(data, EOP)
+
+        assert encoded == _cobs_encode_loop(data, EOP)
+        assert EOP not in encoded
+        assert _cobs_decode_fast(encoded, EOP) == data
+
+
+def test_cobs_decode_fastMatchesLoopOnArbitraryInput():
+    rng = random.Random(7)
+    for _ in range(300):
+        encoded = bytes(rng.getrandbits(8) for _ in range(rng.randrange(600)))
+
+        assert _cobs_decode_fast(encoded, EOP) == _cobs_decode_loop(encoded, EOP)
+
+
+def test_cobs_roundTrip_otherEop():
+    for data in randomInputs(count=50, seed=3):
+        assert cobs_decode(cobs_encode(data, 0x7E), 0x7E) == data
+
+
+def test_cobs_acceptsBytearrayAndLeavesInputUnchanged():
+    data = bytearray(b'\x00abc\x00\ndef')
+    original = bytes(data)
+
+    encoded = cobs_encode(data, EOP)
+
+    assert data == original
+    assert isinstance(encoded, bytearray)
+    assert cobs_decode(encoded, EOP) == original
+
+
+@pytest.mark.parametrize("encode", [_cobs_encode_fast, _cobs_encode_loop])
+def test_cobs_encode_terminate(encode):
+    for data in EDGE_CASES:
+        encoded = encode(data, EOP, terminate=True)
+
+        assert encoded[-1] == EOP
+        assert encoded[:-1] == encode(data, EOP)
+
+
+def test_cobs_encode_memoryviewSlice():
+    data = bytes(range(256)) * 4
+
+    assert cobs_encode(memoryview(data)[10:900], EOP) == cobs_encode(data[10:900], EOP)
+    assert cobs_decode(memoryview(cobs_encode(data, EOP)), EOP) == data
+
+
+@pytest.mark.parametrize("view", [lambda b: memoryview(b)[::-1],
+                                  lambda b: memoryview(b + b)[::2]])
+def test_cobs_encode_reversedOrStridedMemoryview(view):
+    buffer = bytearray(b'\x00abc\ndef\x00gh')
+    data = view(buffer)
+
+    encoded = cobs_encode(data, EOP)
+
+    assert encoded == _cobs_encode_loop(bytearray(data.tobytes()), EOP)
+    assert cobs_decode(encoded, EOP) == data.tobytes()
@@ -0,0 +1,44 @@
+import random
+from notecard.crc32 import crc32, crc32_lookup_table, _crc32_table
+import pytest
+from testutil import halfByteCrc32
+
+
+def randomInputs(count=200, maxLen=600, seed=1234):
+    rng = random.Random(seed)
+    for _ in range(count):
+        length = rng.randrange(maxLen)
+        yield bytes(rng.getrandbits(8) for _ in range(length))
+
+
+@pytest.mark.parametrize("fcn", [crc32, _crc32_table])
+def test_crc32_matchesHalfByteImplementation(fcn):
+    for data in randomInputs():
+        assert fcn(data) == halfByteCrc32(data)
+
+
+@pytest.mark.parametrize("fcn", [crc32, _crc32_table])
+def test_crc32_knownValues(fcn):
+    assert fcn(b'') == 0
+    assert fcn(b'123456789') == 0xCBF43926
+    assert fcn(b'{"req":"card.version"}') == halfByteCrc32(b'{"req":"card.version"}')
+
+
+@pytest.mark.parametrize("fcn", [crc32, _crc32_table])
+def test_crc32_acceptsBytearrayAndMemoryview(fcn):
+    data = b'{"req":"note.add","body":{"temp":21.5}}'
+
+    assert fcn(bytearray(data)) == fcn(data)
+    assert fcn(memoryview(data)) == fcn(data)
+
+
+@pytest.mark.parametrize("fcn", [crc32, _crc32_table])
+def test_crc32_continuesFromPreviousCrc(fcn):
+    for data in randomInputs(count=20):
+        split = len(data) // 3
+        assert fcn(data[split:], fcn(data[:split])) == fcn(data)
+
+
+def test_crc32_lookupTableSize():
+    assert len(crc32_lookup_table) == 256
+    assert crc32_lookup_table[0x80] == 0xEDB88320
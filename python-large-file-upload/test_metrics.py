@@ -0,0 +1,89 @@
+import binascii
+import notecard
+from notecard.metrics import MetricsCollector
+from notecard.retry import RetryPolicy
+import pytest
+from testutil import FakeUart, jsonResponder
+
+
+def test_Transaction_notMeasuredWithoutSink():
+    uart = FakeUart(jsonResponder({}))
+    card = notecard.OpenSerial(uart)
+
+    card.Transaction({'req': 'card.version'})
+
+    assert card._txn_metrics is None
+
+
+def test_Transaction_reportsBytesAndTimesToCallable():
+    uart = FakeUart(jsonResponder({'card.version': {'version': '1.2.3'}}))
+    card = notecard.OpenSerial(uart)
+    received = []
+    card.SetMetricsSink(received.append)
+    uart.written = bytearray()
+
+    card.Transaction({'req': 'card.version'})
+
+    m, = received
+    assert m.name == 'card.version'
+    assert m.bytes_sent == len(uart.written)
+    assert m.bytes_received == len(b'{"version": "1.2.3"}\r\n')
+    assert (m.retries, m.crc_errors, m.resets, m.error) == (0, 0, 0, False)
+    assert m.total_secs >= m.transmit_secs + m.first_byte_secs + m.receive_secs >= 0
+
+
+def test_Transaction_countsCrcErrorsAndRetries():
+    goodCrc = binascii.crc32(b'{}') & 0xFFFFFFFF
+    rsps = iter([b'{"crc":"0000:deadbeef"}\r\n', f'{{"crc":"0000:{goodCrc:08x}"}}\r\n'.encode()])
+    uart = FakeUart(lambda line: next(rsps))
+    card = notecard.OpenSerial(uart)
+    collector = MetricsCollector()
+    card.SetMetricsSink(collector)
+
+    card.Transaction({'req': 'card.version'})
+
+    totals = collector.totals['card.version']
+    assert (totals['count'], totals['retries'], totals['crc_errors'], totals['errors']) == (1, 1, 1, 0)
+
+
+def test_Transaction_failureNotRetriedIsNotCountedAsRetry():
+    uart = FakeUart(lambda line: b'{"err":"serial {io}"}\r\n')
+    card = notecard.OpenSerial(uart)
+    card.SetRetryPolicy(RetryPolicy(max_attempts=2, delay_ms=0))
+    received = []
+    card.SetMetricsSink(received.append)
+
+    with pytest.raises(Exception):
+        card.Transaction({'req': 'card.version'})
+
+    m, = received
+    assert (m.retries, m.error) == (1, True)
+
+
+def test_Transaction_countsResets():
+    uart = FakeUart(jsonResponder({}))
+    card = notecard.OpenSerial(uart)
+    collector = MetricsCollector()
+    card.SetMetricsSink(collector)
+    card._reset_required = True
+
+    card.Transaction({'req': 'card.version'})
+    card.Transaction({'req': 'hub.status'})
+
+    assert collector.totals['card.version']['resets'] == 1
+    assert collector.totals['card.version']['reset_secs'] > 0
+    assert collector.totals['hub.status']['resets'] == 0
+    assert 'card.version' in collector.summary()
+
+
+def test_SetMetricsSink_noneStopsMeasuring():
+    uart = FakeUart(jsonResponder({}))
+    card = notecard.OpenSerial(uart)
+    collector = MetricsCollector()
+    card.SetMetricsSink(collector)
+    card.Transaction({'req': 'card.version'})
+
+    card.SetMetricsSink(None)
+    card.Transaction({'req': 'card.version'})
+
+    assert collector.totals['card.version']['count'] == 1
@@ -0,0 +1,687 @@
+import gzip
+import io
+import os
+import threading
+import time
+import urllib.parse
+import zlib
+import notecard
+import notecardDataTransfer
+import pytest
+from testutil import FakeNotecard, FakeUart
+
+
+def makeUploader(card, **kwargs):
+    return notecardDataTransfer.BinaryDataUploader(card, "web.post", "ping", printFcn=lambda *a: None,
+                                                   waitForNotehubConnection=False, **kwargs)
+
+
+def test_upload_sendsFileInChunksOfCardMax():
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    content = os.urandom(10000)
+
+    u.upload(io.BytesIO(content))
+
+    assert [(p['offset'], p['total'], len(p['data'])) for p in card.posts] == \
+        [(0, 10000, 4096), (4096, 10000, 4096), (8192, 10000, 1808)]
+    assert card.uploadedBytes() == content
+
+
+def test_upload_respectsBinaryBuffSize():
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    u.setBinaryBuffSize(1000)
+    content = os.urandom(2500)
+
+    u.upload(io.BytesIO(content))
+
+    assert [len(p['data']) for p in card.posts] == [1000, 1000, 500]
+    assert card.uploadedBytes() == content
+
+
+@pytest.mark.parametrize("size", [1, 4096, 4097, 3 * 4096, 50000])
+def test_upload_pipelinedMatchesSerial(size):
+    content = os.urandom(size)
+    serialCard = FakeNotecard()
+    pipelinedCard = FakeNotecard()
+    p = makeUploader(pipelinedCard)
+    p.setPipelined()
+
+    makeUploader(serialCard).upload(io.BytesIO(content))
+    p.upload(io.BytesIO(content))
+
+    assert pipelinedCard.posts == serialCard.posts
+    assert pipelinedCard.requests == serialCard.requests
+    assert pipelinedCard.uploadedBytes() == content
+
+
+def test_upload_pipelinedReadsNextChunkOnWorkerThread():
+    card = FakeNotecard(binaryMax=1000)
+    u = makeUploader(card)
+    u.setPipelined()
+    readThreads = []
+    readChunk = u._readChunk
+
+    def recordingReadChunk(data, buffer):
+        readThreads.append(threading.current_thread())
+        return readChunk(data, buffer)
+
+    u._readChunk = recordingReadChunk
+    u.upload(io.BytesIO(os.urandom(3500)))
+
+    assert len(readThreads) == 4
+    assert readThreads[0] is threading.main_thread()
+    assert all(t is not threading.main_thread() for t in readThreads[1:])
+
+
+def failWebRequestAt(card, postNumber):
+    """Make the given web request fail once"""
+    transaction = card.Transaction
+    failed = []
+
+    def failingTransaction(req, lock=True):
+        if req.get('req') == 'web.post' and len(card.posts) == postNumber - 1 and not failed:
+            failed.append(req)
+            raise Exception('Failed to transact with Notecard.')
+        return transaction(req, lock)
+
+    card.Transaction = failingTransaction
+
+
+def test_upload_resumesFromLastAcknowledgedChunk(tmp_path):
+    journalPath = str(tmp_path / "journal.json")
+    content = os.urandom(10000)
+    card = FakeNotecard(binaryMax=4096)
+    failWebRequestAt(card, 3)
+    u = makeUploader(card)
+    u.setResumeJournal(journalPath)
+
+    with pytest.raises(Exception):
+        u.upload(io.BytesIO(content))
+
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    u.setResumeJournal(journalPath)
+    u.upload(io.BytesIO(content))
+
+    assert [(p['offset'], p['total']) for p in card.posts] == [(8192, 10000)]
+    assert card.posts[0]['data'] == content[8192:]
+
+
+def test_upload_resumeStartsOverWhenFileChanged(tmp_path):
+    journalPath = str(tmp_path / "journal.json")
+    card = FakeNotecard(binaryMax=4096)
+    failWebRequestAt(card, 2)
+    u = makeUploader(card)
+    u.setResumeJournal(journalPath)
+    with pytest.raises(Exception):
+        u.upload(io.BytesIO(os.urandom(10000)))
+
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    u.setResumeJournal(journalPath)
+    content = os.urandom(10000)
+    u.upload(io.BytesIO(content))
+
+    assert card.posts[0]['offset'] == 0
+    assert card.uploadedBytes() == content
+
+
+def test_upload_completedUploadIsRemovedFromJournal(tmp_path):
+    journalPath = str(tmp_path / "journal.json")
+    content = os.urandom(5000)
+    u = makeUploader(FakeNotecard(binaryMax=4096))
+    u.setResumeJournal(journalPath)
+    u.upload(io.BytesIO(content))
+
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    u.setResumeJournal(journalPath)
+    u.upload(io.BytesIO(content))
+
+    assert [p['offset'] for p in card.posts] == [0, 4096]
+
+
+def test_upload_queriesBinaryCapacityOncePerSession():
+    card = FakeNotecard(binaryMax=1000)
+    u = makeUploader(card, setTempContinuousMode=False)
+
+    u.upload(io.BytesIO(os.urandom(3000)))
+    u.upload(io.BytesIO(os.urandom(1000)))
+
+    queries = [r for r in card.requests if r == {'req': 'card.binary'}]
+    # One capacity query, plus one verification after each of the 4 puts.
+    assert len(queries) == 1 + 4
+
+
+def test_upload_reportsTransactionsPerChunk():
+    card = FakeNotecard(binaryMax=1000)
+    u = makeUploader(card, setTempContinuousMode=False)
+
+    u.upload(io.BytesIO(os.urandom(3000)))
+
+    # reset, put, verify and web.post per chunk, plus the capacity query.
+    assert u.lastUploadStats == {"bytes": 3000, "chunks": 3, "transactions": 3 * 4 + 1}
+    assert card.requestNames()[:6] == ['card.binary', 'card.binary', 'card.binary.put', 'card.binary',
+                                       'web.post', 'card.binary']
+
+
+def test_ChunkSizeTuner_growsWhileThroughputKeepsUp():
+    t = notecardDataTransfer.ChunkSizeTuner(64 * 1024)
+    assert t.size == 16 * 1024
+
+    t.success(16 * 1024, 1.0)
+    assert t.size == 32 * 1024
+    t.success(32 * 1024, 2.0)
+    assert t.size == 64 * 1024
+    t.success(64 * 1024, 4.0)
+    assert t.size == 64 * 1024
+
+
+def test_ChunkSizeTuner_holdsWhenThroughputDrops():
+    t = notecardDataTransfer.ChunkSizeTuner(64 * 1024)
+    t.success(16 * 1024, 1.0)
+
+    t.success(32 * 1024, 4.0)
+
+    assert t.size == 32 * 1024
+
+
+def test_ChunkSizeTuner_shrinksOnFailureWithinLimits():
+    t = notecardDataTransfer.ChunkSizeTuner(64 * 1024, minSize=8 * 1024)
+
+    for _ in range(5):
+        t.failure()
+
+    assert t.size == 8 * 1024
+    assert notecardDataTransfer.ChunkSizeTuner(1000).size == 1000
+
+
+def test_upload_adaptiveRetriesFailedChunkWithSmallerSize():
+    card = FakeNotecard(binaryMax=64 * 1024)
+    failWebRequestAt(card, 2)
+    messages = []
+    u = notecardDataTransfer.BinaryDataUploader(card, "web.post", "ping", printFcn=messages.append,
+                                                waitForNotehubConnection=False)
+    u.setAdaptiveChunkSize()
+    content = os.urandom(100000)
+
+    u.upload(io.BytesIO(content))
+
+    sizes = [len(p['data']) for p in card.posts]
+    assert sizes[:2] == [16 * 1024, 16 * 1024]
+    assert card.uploadedBytes() == content
+    assert any("Retrying with 16384 byte chunks" in str(m) for m in messages)
+    assert any("Next chunk size" in str(m) for m in messages)
+
+
+def test_upload_adaptiveGivesUpAfterRepeatedFailures():
+    card = FakeNotecard(binaryMax=64 * 1024)
+    transaction = card.Transaction
+
+    def alwaysFailingWebRequest(req, lock=True):
+        if req.get('req') == 'web.post':
+            raise Exception('Failed to transact with Notecard.')
+        return transaction(req, lock)
+
+    card.Transaction = alwaysFailingWebRequest
+    u = makeUploader(card)
+    u.setAdaptiveChunkSize()
+
+    with pytest.raises(Exception):
+        u.upload(io.BytesIO(os.urandom(10000)))
+
+    assert card.requestNames().count('card.binary.put') == 1 + u.AdaptiveChunkRetries
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_upload_adaptiveChunksStayWithinLimits(pipelined):
+    card = FakeNotecard(binaryMax=64 * 1024)
+    u = makeUploader(card)
+    u.setAdaptiveChunkSize()
+    u.setBinaryBuffSize(20000)
+    u.setPipelined(pipelined)
+    content = os.urandom(200000)
+
+    u.upload(io.BytesIO(content))
+
+    assert all(len(p['data']) <= 20000 for p in card.posts)
+    assert card.uploadedBytes() == content
+
+
+@pytest.mark.parametrize("method,content,decompress", [
+    ("gzip", "application/gzip", gzip.decompress),
+    ("zlib", "application/zlib", zlib.decompress),
+])
+def test_upload_compressedRouteReceivesValidStream(method, content, decompress):
+    card = FakeNotecard(binaryMax=1000)
+    u = makeUploader(card)
+    u.setCompression(method)
+    original = b"time,temp,humidity\n" + b"".join(b"%d,21.5,40\n" % i for i in range(2000))
+
+    u.upload(io.BytesIO(original))
+
+    webReqs = [r for r in card.requests if r.get('req') == 'web.post']
+    assert all(r['content'] == content for r in webReqs)
+    assert all(r['total'] == len(card.uploadedBytes()) for r in webReqs)
+    assert len(card.uploadedBytes()) < len(original) / 5
+    assert decompress(card.uploadedBytes()) == original
+    assert u.lastUploadStats["uncompressedBytes"] == len(original)
+
+
+def test_upload_gzipAddsFileNameSuffix():
+    card = FakeNotecard()
+    u = makeUploader(card)
+    u.setCompression("gzip")
+    u.setFileName("log.csv")
+
+    u.upload(io.BytesIO(b"a,b\n" * 100))
+
+    assert card.posts[0]['name'] == "log.csv.gz"
+
+
+def test_setCompression_rejectsUnknownMethod():
+    u = makeUploader(FakeNotecard())
+
+    with pytest.raises(ValueError):
+        u.setCompression("lzma")
+
+
+def test_upload_uncompressedByDefault():
+    makeUploader(FakeNotecard()).setCompression("gzip")
+    card = FakeNotecard()
+
+    makeUploader(card).upload(io.BytesIO(b"abc"))
+
+    webReq = [r for r in card.requests if r.get('req') == 'web.post'][0]
+    assert webReq['content'] == "application/octet-stream"
+    assert card.uploadedBytes() == b"abc"
+
+
+def test_uploadFiles_setsUpConnectionOnceForTheBatch(tmp_path):
+    contents = {}
+    for i in range(3):
+        p = tmp_path / f"snippet{i}.json"
+        contents[p.name] = os.urandom(500 + i)
+        p.write_bytes(contents[p.name])
+    card = FakeNotecard()
+    u = notecardDataTransfer.BinaryDataUploader(card, "web.post", "ping", printFcn=lambda *a: None)
+
+    results = u.uploadFiles(sorted(str(p) for p in tmp_path.iterdir()))
+
+    names = card.requestNames()
+    assert names.count('hub.set') == 2
+    assert names.count('hub.status') == 1
+    assert {p['name']: p['data'] for p in card.posts} == contents
+    assert [r['bytes'] for r in results] == [500, 501, 502]
+    assert all(r['error'] is None for r in results)
+    assert u._fileName is None
+
+
+def test_uploadFiles_reportsFailureAndContinues(tmp_path):
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"f{i}.bin"
+        p.write_bytes(b"x" * 10)
+        paths.append(str(p))
+    card = FakeNotecard()
+    failWebRequestAt(card, 2)
+    u = makeUploader(card)
+
+    results = u.uploadFiles(paths)
+
+    assert [r['error'] is None for r in results] == [True, False, True]
+    assert [p['name'] for p in card.posts] == ["f0.bin", "f2.bin"]
+    assert card.requestNames()[-1] == 'hub.set'
+
+
+def test_uploadFiles_deletedFileOnlyFailsThatFile(tmp_path):
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"f{i}.bin"
+        p.write_bytes(b"x" * 10)
+        paths.append(str(p))
+    os.remove(paths[1])
+    card = FakeNotecard()
+    u = makeUploader(card)
+
+    results = u.uploadFiles(paths)
+
+    assert [r['error'] is None for r in results] == [True, False, True]
+    assert results[1]['bytes'] == 0
+    assert [p['name'] for p in card.posts] == ["f0.bin", "f2.bin"]
+
+
+def test_uploadFilesPacked_deletedFileOnlyFailsThatFile(tmp_path):
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"f{i}.bin"
+        p.write_bytes(b"x" * 10)
+        paths.append(str(p))
+    os.remove(paths[1])
+    card = FakeNotecard()
+    u = makeUploader(card)
+
+    results = u.uploadFilesPacked(paths)
+
+    assert sorted((r['path'], r['error'] is None) for r in results) == \
+        [(paths[0], True), (paths[1], False), (paths[2], True)]
+    assert card.posts[0]['data'] == b"x" * 20
+
+
+def test_uploadFilesPacked_sendsManifestWithEachPack(tmp_path):
+    contents = {}
+    for i in range(5):
+        p = tmp_path / f"reading {i}.csv"
+        contents[p.name] = os.urandom(1000 + i)
+        p.write_bytes(contents[p.name])
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+
+    results = u.uploadFilesPacked(sorted(str(p) for p in tmp_path.iterdir()))
+
+    assert len(card.posts) == 2
+    received = {}
+    for post in card.posts:
+        name, _, query = post['name'].partition('?manifest=')
+        assert name.startswith(notecardDataTransfer.PACK_FILE_NAME_PREFIX)
+        assert (post['offset'], post['total']) == (0, len(post['data']))
+        for entry in query.split(','):
+            fileName, offset, length = entry.split(':')
+            received[urllib.parse.unquote(fileName)] = post['data'][int(offset):int(offset) + int(length)]
+    assert received == contents
+    assert [r['bytes'] for r in results] == [1000, 1001, 1002, 1003, 1004]
+    assert all(r['error'] is None for r in results)
+
+
+def test_uploadFilesPacked_splitsPackWhoseManifestIsTooLong(tmp_path):
+    paths = []
+    for i in range(40):
+        p = tmp_path / f"{i:02d}-{'long file name ' * 4}.csv"
+        p.write_bytes(b"x" * 10)
+        paths.append(str(p))
+    card = FakeNotecard()
+    u = makeUploader(card)
+
+    results = u.uploadFilesPacked(paths)
+
+    manifests = [post['name'].partition('?manifest=')[2] for post in card.posts]
+    assert len(manifests) > 1
+    assert all(len(m) <= notecardDataTransfer.DEFAULT_PACK_MANIFEST_MAX_LEN for m in manifests)
+    assert sum(len(m.split(',')) for m in manifests) == 40
+    assert all(m.split(',')[0].endswith(':0:10') for m in manifests)
+    assert all(r['error'] is None for r in results)
+
+
+def test_uploadFilesPacked_sendsLargeFilesOnTheirOwn(tmp_path):
+    small = tmp_path / "a.txt"
+    small.write_bytes(b"small")
+    large = tmp_path / "b.bin"
+    large.write_bytes(os.urandom(5000))
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+
+    results = u.uploadFilesPacked([str(large), str(small)])
+
+    assert [p['name'] for p in card.posts[:2]] == ["b.bin", "b.bin"]
+    assert card.posts[2]['name'].endswith("?manifest=a.txt:0:5")
+    assert card.posts[2]['data'] == b"small"
+    assert [r['path'] for r in results] == [str(large), str(small)]
+
+
+def test_uploadFilesPacked_sendsPacksUncompressedWhenCompressionIsSet(tmp_path):
+    small = tmp_path / "a.txt"
+    small.write_bytes(b"small")
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    u.setCompression("gzip")
+
+    u.uploadFilesPacked([str(small)])
+
+    webReq, = [r for r in card.requests if r['req'] == 'web.post']
+    assert webReq['content'] == "application/octet-stream"
+    assert card.posts[0]['data'] == b"small"
+    assert u.webReqRoot['content'] == "application/gzip"
+
+
+class NonSeekable(io.RawIOBase):
+    def __init__(self, content):
+        self._content = io.BytesIO(content)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._content.readinto(b)
+
+
+def blocksOf(content, size):
+    for i in range(0, len(content), size):
+        yield content[i:i + size]
+
+
+def test_uploadStream_finalizesTotalOnLastChunk():
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    content = os.urandom(10000)
+
+    u.uploadStream(blocksOf(content, 700))
+
+    assert [(p['offset'], p['total'], len(p['data'])) for p in card.posts] == \
+        [(0, 8192, 4096), (4096, 10000, 4096), (8192, 10000, 1808)]
+    assert card.uploadedBytes() == content
+
+
+def test_uploadStream_usesDeclaredSize():
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+    content = os.urandom(5000)
+
+    u.uploadStream(NonSeekable(content), totalBytes=5000)
+
+    assert [(p['offset'], p['total']) for p in card.posts] == [(0, 5000), (4096, 5000)]
+    assert card.uploadedBytes() == content
+
+
+@pytest.mark.parametrize("declared", [4000, 6000])
+def test_uploadStream_rejectsWrongDeclaredSize(declared):
+    card = FakeNotecard(binaryMax=4096)
+    u = makeUploader(card)
+
+    with pytest.raises(Exception):
+        u.uploadStream(NonSeekable(os.urandom(5000)), totalBytes=declared)
+
+
+def test_uploadStream_compressed():
+    card = FakeNotecard(binaryMax=1024)
+    u = makeUploader(card)
+    u.setCompression("gzip")
+    content = os.urandom(3000) + b"a" * 20000
+
+    u.uploadStream(blocksOf(content, 1000), totalBytes=len(content))
+
+    assert card.posts[-1]['total'] == len(card.uploadedBytes())
+    assert gzip.decompress(card.uploadedBytes()) == content
+    assert u.lastUploadStats["uncompressedBytes"] == len(content)
+
+
+def test_uploaders_haveTheirOwnRequestTemplate():
+    card0, card1 = FakeNotecard(), FakeNotecard()
+    u0 = notecardDataTransfer.BinaryDataUploader(card0, "web.post", "route0", printFcn=lambda *a: None,
+                                                 waitForNotehubConnection=False)
+    u1 = notecardDataTransfer.BinaryDataUploader(card1, "web.put", "route1", printFcn=lambda *a: None,
+                                                 waitForNotehubConnection=False)
+    u1.setCompression("gzip")
+
+    u0.upload(io.BytesIO(b"abc"))
+
+    webReq = [r for r in card0.requests if r.get('binary')][0]
+    assert (webReq['req'], webReq['route'], webReq['content']) == ("web.post", "route0", "application/octet-stream")
+    assert notecardDataTransfer.BinaryDataUploader.webReqRoot['route'] == ''
+
+
+def writeFiles(tmp_path, count):
+    paths = []
+    for i in range(count):
+        p = tmp_path / f"f{i}.bin"
+        p.write_bytes(os.urandom(100 + i))
+        paths.append(str(p))
+    return paths
+
+
+def test_MultiCardUploader_sendsOverAllCardsAtOnce(tmp_path):
+    paths = writeFiles(tmp_path, 2)
+    cards = [FakeNotecard(), FakeNotecard()]
+    # Each web request waits for the other card's, which only works if they run in parallel
+    barrier = threading.Barrier(2, timeout=5)
+    for card in cards:
+        def waitingTransaction(req, lock=True, transaction=card.Transaction):
+            if req.get('req') == 'web.post':
+                barrier.wait()
+            return transaction(req, lock)
+        card.Transaction = waitingTransaction
+
+    multi = notecardDataTransfer.MultiCardUploader([makeUploader(c) for c in cards], printFcn=lambda *a: None)
+    results = multi.uploadFiles(paths)
+
+    assert [r['path'] for r in results] == paths
+    assert all(r['error'] is None for r in results)
+    assert sorted(r['card'] for r in results) == [0, 1]
+    assert sorted(p['name'] for c in cards for p in c.posts) == ["f0.bin", "f1.bin"]
+
+
+def test_MultiCardUploader_otherCardsTakeOverFromOneThatFails(tmp_path):
+    paths = writeFiles(tmp_path, 5)
+    cards = [FakeNotecard(), FakeNotecard()]
+
+    def failingTransaction(req, lock=True):
+        raise Exception('Failed to transact with Notecard.')
+    cards[0].Transaction = failingTransaction
+
+    multi = notecardDataTransfer.MultiCardUploader([makeUploader(c) for c in cards], printFcn=lambda *a: None)
+    results = multi.uploadFiles(paths)
+
+    assert all(r['error'] is None and r['card'] == 1 for r in results)
+    assert [p['name'] for p in cards[1].posts] == [os.path.basename(p) for p in paths]
+
+
+def test_MultiCardUploader_reportsVanishedFileWhenNoCardConnects(tmp_path):
+    paths = writeFiles(tmp_path, 2)
+    os.remove(paths[0])
+    uploaders = [makeUploader(FakeNotecard()) for _ in range(2)]
+    for u in uploaders:
+        u.WaitForConnection = True
+        u.ConnectionTimeoutSeconds = -1
+
+    multi = notecardDataTransfer.MultiCardUploader(uploaders, printFcn=lambda *a: None)
+    results = multi.uploadFiles(paths)
+
+    assert [(r['bytes'], r['card']) for r in results] == [(0, None), (101, None)]
+    assert all(r['error'] == "No Notecard was able to upload this file" for r in results)
+
+
+def stripedBytes(cards):
+    posts = sorted((p for c in cards for p in c.posts), key=lambda p: p['offset'])
+    return b''.join(p['data'] for p in posts)
+
+
+def test_MultiCardUploader_stripesOneFileAcrossCards():
+    cards = [FakeNotecard(binaryMax=4096) for _ in range(3)]
+    multi = notecardDataTransfer.MultiCardUploader([makeUploader(c) for c in cards], printFcn=lambda *a: None)
+    content = os.urandom(50000)
+
+    multi.upload(io.BytesIO(content), stripeSize=5000)
+
+    assert stripedBytes(cards) == content
+    assert all(p['total'] == 50000 for c in cards for p in c.posts)
+    # Stripes are bigger than the binary store, so each is sent in two chunks
+    assert sorted(len(p['data']) for c in cards for p in c.posts) == [904] * 10 + [4096] * 10
+    assert sum(multi.lastUploadStats['cardBytes']) == 50000
+
+
+def test_MultiCardUploader_retriesFailedRangeOnAnotherCard():
+    cards = [FakeNotecard(), FakeNotecard()]
+    failedOffsets = []
+    transaction = cards[0].Transaction
+
+    def failingTransaction(req, lock=True):
+        if req.get('req') == 'web.post' and not failedOffsets:
+            failedOffsets.append(req['offset'])
+            raise Exception('Failed to transact with Notecard.')
+        return transaction(req, lock)
+    cards[0].Transaction = failingTransaction
+
+    multi = notecardDataTransfer.MultiCardUploader([makeUploader(c) for c in cards], printFcn=lambda *a: None)
+    content = os.urandom(10000)
+
+    multi.upload(io.BytesIO(content), stripeSize=1000)
+
+    assert stripedBytes(cards) == content
+    assert failedOffsets[0] in [p['offset'] for p in cards[1].posts]
+    assert failedOffsets[0] not in [p['offset'] for p in cards[0].posts]
+    assert multi.lastUploadStats['retries'] == 1
+
+
+def test_MultiCardUploader_slowCardTakesFewerRanges():
+    cards = [FakeNotecard(), FakeNotecard()]
+    transaction = cards[0].Transaction
+
+    def slowTransaction(req, lock=True):
+        if req.get('req') == 'web.post':
+            time.sleep(0.05)
+        return transaction(req, lock)
+    cards[0].Transaction = slowTransaction
+
+    multi = notecardDataTransfer.MultiCardUploader([makeUploader(c) for c in cards], printFcn=lambda *a: None)
+    content = os.urandom(20000)
+
+    multi.upload(io.BytesIO(content), stripeSize=1000)
+
+    assert stripedBytes(cards) == content
+    cardBytes = multi.lastUploadStats['cardBytes']
+    assert cardBytes[0] < cardBytes[1]
+
+
+def test_MultiCardUploader_raisesWhenNoCardCanSendARange():
+    cards = [FakeNotecard(), FakeNotecard()]
+    for card in cards:
+        def failingTransaction(req, lock=True, transaction=card.Transaction):
+            if req.get('req') == 'web.post':
+                raise Exception('Failed to transact with Notecard.')
+            return transaction(req, lock)
+        card.Transaction = failingTransaction
+
+    multi = notecardDataTransfer.MultiCardUploader([makeUploader(c) for c in cards], printFcn=lambda *a: None)
+
+    with pytest.raises(Exception, match="could not be uploaded"):
+        multi.upload(io.BytesIO(os.urandom(3000)), stripeSize=1000)
+
+
+@pytest.mark.parametrize("uploaderClass", [notecardDataTransfer.BinaryDataUploader,
+                                           notecardDataTransfer.BinaryDataUploaderLegacy])
+def test_upload_overSerialToSimulatedNotecard(uploaderClass):
+    fake = FakeNotecard(binaryMax=4096)
+    card = notecard.OpenSerial(FakeUart(fake.respond))
+    card.SetPacing('fast')
+    u = uploaderClass(card, "web.post", "ping", printFcn=lambda *a: None,
+                      waitForNotehubConnection=False, setTempContinuousMode=False)
+    content = os.urandom(5000)
+
+    u.upload(io.BytesIO(content))
+
+    assert fake.uploadedBytes() == content
+    assert all(p['total'] == 5000 for p in fake.posts)
+
+
+def test_BinaryDataUploaderLegacy_requestHasNoContentType():
+    card = FakeNotecard()
+    u = notecardDataTransfer.BinaryDataUploaderLegacy(card, "web.post", "ping", printFcn=lambda *a: None,
+                                                      waitForNotehubConnection=False,
+                                                      setTempContinuousMode=False)
+
+    u.upload(io.BytesIO(os.urandom(100)))
+
+    webReqs = [r for r in card.requests if r['req'] == 'web.post']
+    assert webReqs
+    assert all('content' not in r for r in webReqs)
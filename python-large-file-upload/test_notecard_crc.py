@@ -0,0 +1,125 @@
+import binascii
+import importlib
+import json
+import notecard
+from notecard import json_backend
+import pytest
+import sys
+from testutil import FakeUart, jsonResponder
+
+
+def withCrc(body, seqNumber=0):
+    crc = binascii.crc32(body) & 0xFFFFFFFF
+    field = f'"crc":"{seqNumber:04x}:{crc:08x}"'.encode()
+    return body[:-1] + (b'' if body == b'{}' else b',') + field + b'}\r\n'
+
+
+def stringCrcAdd(req_string, seq_number):
+    """The string-based _crc_add this library used before, kept as a reference."""
+    crc_hex = '{:08x}'.format(binascii.crc32(req_string.encode('utf-8')) & 0xFFFFFFFF)
+    crc_field = f'"crc":"{seq_number:04x}:{crc_hex}"'
+    sep = '' if req_string[-2] == '{' else ','
+    return req_string[:-1] + sep + crc_field + '}'
+
+
+@pytest.fixture
+def card():
+    return notecard.OpenSerial(FakeUart(jsonResponder({})))
+
+
+@pytest.mark.parametrize("req", [{'req': 'card.version'},
+                                 {'req': 'note.add', 'body': {'temp': 21.5, 'name': 'café'}}])
+def test_prepareRequest_matchesStringImplementation(card, req):
+    req_bytes, rsp_expected = card._prepare_request(req)
+
+    # The CRC is over the request as serialized, whichever JSON library did it
+    expected = stringCrcAdd(json_backend.dumps(req).decode('utf-8'), card._last_request_seq_number)
+    assert rsp_expected
+    assert req_bytes == expected.encode('utf-8') + b'\n'
+    assert json.loads(req_bytes).get('body') == req.get('body')
+
+
+JSON_BACKENDS = ['orjson', 'ujson', 'json']
+
+
+@pytest.fixture(params=JSON_BACKENDS)
+def backend(request, monkeypatch):
+    if request.param != 'json':
+        pytest.importorskip(request.param)
+    # Hide the libraries preferred over the one under test.
+    for name in JSON_BACKENDS[:JSON_BACKENDS.index(request.param)]:
+        monkeypatch.setitem(sys.modules, name, None)
+    importlib.reload(json_backend)
+    assert json_backend.backend == request.param
+    yield json_backend
+    monkeypatch.undo()
+    importlib.reload(json_backend)
+
+
+def test_dumps_requestBytesSameWithEveryBackend(backend):
+    req = {'req': 'note.add', 'body': {'name': 'café ☕', 'nan': float('nan'), 1: 'one'}}
+
+    assert backend.dumps(req) == json.dumps(req, separators=(',', ':')).encode('utf-8')
+
+
+def test_prepareRequest_commandHasNoCrc(card):
+    req_bytes, rsp_expected = card._prepare_request({'cmd': 'card.attn'})
+
+    assert not rsp_expected
+    assert req_bytes == json_backend.dumps({'cmd': 'card.attn'}) + b'\n'
+
+
+@pytest.mark.parametrize("body", [
+    b'{}',
+    b'{"version":"8.1.3"}',
+    # Long decimals get truncated when parsed, so the CRC has to be over the bytes
+    b'{"lat":10.11111111111111123445522123,"lon":-2.5}',
+    # A "crc" key inside the body isn't the response's CRC field
+    b'{"body":{"crc":"not:this"},"total":3}',
+])
+def test_crcError_validResponses(card, body):
+    rsp_bytes = bytearray(withCrc(body))
+
+    assert not card._crc_error(rsp_bytes, json_backend.loads(rsp_bytes))
+
+
+def test_crcError_corruptedResponse(card):
+    rsp_bytes = bytearray(withCrc(b'{"version":"8.1.3"}').replace(b'8.1.3', b'8.1.4'))
+
+    assert card._crc_error(rsp_bytes, json_backend.loads(rsp_bytes))
+
+
+def test_crcError_sequenceMismatch(card):
+    rsp_bytes = bytearray(withCrc(b'{"version":"8.1.3"}', seqNumber=7))
+
+    assert card._crc_error(rsp_bytes, json_backend.loads(rsp_bytes))
+
+
+def test_crcError_missingCrcOnlyAnErrorOnceCardSupportsIt(card):
+    assert not card._crc_error(b'{}', {})
+
+    card._crc_error(bytearray(withCrc(b'{}')), json_backend.loads(withCrc(b'{}')))
+
+    assert card._crc_error(b'{}', {})
+
+
+def test_Transaction_parsesLongDecimalResponse():
+    body = b'{"lat":10.11111111111111123445522123}'
+    uart = FakeUart(lambda line: withCrc(body))
+    card = notecard.OpenSerial(uart)
+
+    rsp = card.Transaction({'req': 'card.location'})
+
+    assert rsp['lat'] == pytest.approx(10.111111111111111)
+
+
+def test_Transaction_withStandardLibraryJson(monkeypatch):
+    monkeypatch.setattr(json_backend, 'loads', json_backend._json_loads)
+    monkeypatch.setattr(json_backend, 'dumps', json_backend._json_dumps)
+    uart = FakeUart(lambda line: withCrc(b'{"version":"8.1.3"}'))
+    card = notecard.OpenSerial(uart)
+
+    rsp = card.Transaction({'req': 'card.version', 'body': {'name': 'café'}})
+
+    assert rsp['version'] == '8.1.3'
+    assert b'caf\\u00e9' in uart.written
@@ -0,0 +1,98 @@
+import notecard
+from notecard.pacing import PacingPolicy
+from testutil import FakeI2C, jsonResponder
+
+
+def openCard(i2c, maxTransfer=0):
+    return notecard.OpenI2C(i2c, 0, maxTransfer)
+
+
+def test_receive_responseSpreadOverManyPackets():
+    payload = bytes(range(32, 127)) * 100 + b'\r\n'
+    i2c = FakeI2C()
+    card = openCard(i2c, maxTransfer=64)
+    i2c.uart.feed(payload)
+
+    data = card.receive()
+
+    assert data == payload
+    assert isinstance(data, bytearray)
+
+
+def test_receive_returnsCopyOfReusedBuffer():
+    i2c = FakeI2C()
+    card = openCard(i2c)
+    i2c.uart.feed(b'{"first":1}\r\n')
+    first = card.receive()
+    i2c.uart.feed(b'{"2":2}\r\n')
+
+    second = card.receive()
+
+    assert first == b'{"first":1}\r\n'
+    assert second == b'{"2":2}\r\n'
+
+
+def test_receive_pollsQuicklyForLateData(monkeypatch):
+    i2c = FakeI2C()
+    card = openCard(i2c)
+    i2c.uart.feed(b'{"partial":')
+    sleeps = []
+    realSleep = notecard.notecard.time.sleep
+
+    def recordingSleep(secs):
+        sleeps.append(secs)
+        if len(sleeps) == 3:
+            i2c.uart.feed(b'true}\r\n')
+        realSleep(secs)
+
+    monkeypatch.setattr(notecard.notecard.time, 'sleep', recordingSleep)
+    data = card.receive()
+
+    assert data == b'{"partial":true}\r\n'
+    assert sleeps == [0.005, 0.01, 0.02]
+
+
+def test_Transaction_overI2C():
+    i2c = FakeI2C(jsonResponder({'card.version': {'version': '1' * 600}}))
+    card = openCard(i2c)
+
+    rsp = card.Transaction({'req': 'card.version'})
+
+    assert rsp == {'version': '1' * 600}
+
+
+def test_transmit_usesPacingChunkDelay(monkeypatch):
+    i2c = FakeI2C()
+    card = openCard(i2c, maxTransfer=100)
+    card.SetPacing(PacingPolicy(8192, 0, 3))
+    i2c.uart.written = bytearray()
+    sleeps = []
+    monkeypatch.setattr(notecard.notecard.time, 'sleep', sleeps.append)
+
+    card.transmit(b'x' * 250)
+
+    assert sleeps == [0.005, 0.003] * 3
+    assert bytes(i2c.uart.written) == b'x' * 250
+
+
+def test_transmit_defaultPacingKeepsBaselineChunkTiming(monkeypatch):
+    i2c = FakeI2C()
+    card = openCard(i2c, maxTransfer=100)
+    sleeps = []
+    monkeypatch.setattr(notecard.notecard.time, 'sleep', sleeps.append)
+
+    card.transmit(b'x' * 200)
+
+    assert sleeps == [0.005, 0.02] * 2
+
+
+def test_transmit_fastPacingSkipsChunkPause(monkeypatch):
+    i2c = FakeI2C()
+    card = openCard(i2c, maxTransfer=100)
+    card.SetPacing('fast')
+    sleeps = []
+    monkeypatch.setattr(notecard.notecard.time, 'sleep', sleeps.append)
+
+    card.transmit(b'x' * 250)
+
+    assert sleeps == []
@@ -0,0 +1,337 @@
+import notecard
+import os
+import pytest
+import tempfile
+import threading
+import time
+from testutil import FakeUart, PipeUart, jsonResponder
+
+
+def openCard(uart):
+    return notecard.OpenSerial(uart)
+
+
+def test_receive_lineSpreadAcrossSeveralBlocks():
+    uart = FakeUart(maxWaiting=7)
+    card = openCard(uart)
+    uart.feed(b'{"status":"ok","length":1234}\r\n')
+
+    data = card.receive()
+
+    assert data == b'{"status":"ok","length":1234}\r\n'
+    assert isinstance(data, bytearray)
+
+
+def test_receive_readsInBlocksNotBytes():
+    uart = FakeUart()
+    card = openCard(uart)
+    payload = bytes(range(11, 255)) * 400 + b'\n'
+    uart.feed(payload)
+    uart.readCalls = 0
+
+    data = card.receive(delay=False)
+
+    assert data == payload
+    assert uart.readCalls == 1
+
+
+def test_receive_keepsBytesAfterNewlineForNextCall():
+    uart = FakeUart()
+    card = openCard(uart)
+    uart.feed(b'{"a":1}\r\n{"b":2}\r\n')
+
+    first = card.receive()
+    assert uart.rx == b''
+    second = card.receive()
+
+    assert first == b'{"a":1}\r\n'
+    assert second == b'{"b":2}\r\n'
+
+
+def test_receive_timesOutWithoutNewline():
+    uart = FakeUart()
+    card = openCard(uart)
+    uart.feed(b'{"partial":')
+
+    with pytest.raises(Exception, match='Timed out'):
+        card.receive(timeout_secs=0.05)
+
+
+def test_Reset_discardsBufferedBytes():
+    uart = FakeUart()
+    card = openCard(uart)
+    uart.feed(b'{"a":1}\r\n{"stale"')
+    card.receive()
+
+    card.Reset()
+
+    uart.feed(b'{"b":2}\r\n')
+    assert card.receive() == b'{"b":2}\r\n'
+
+
+def test_Reset_quickWhenInSync():
+    uart = FakeUart()
+    card = openCard(uart)
+    uart.written = bytearray()
+    start = time.time()
+
+    card.Reset()
+
+    assert time.time() - start < 0.2
+    assert uart.written == b'\n'
+
+
+def test_Reset_drainsWhenQuickSyncGetsGarbage():
+    uart = FakeUart()
+    card = openCard(uart)
+    uart.feed(b'{"late":"response"}\r\n')
+    uart.written = bytearray()
+    start = time.time()
+
+    card.Reset()
+
+    assert time.time() - start >= notecard.notecard.CARD_RESET_DRAIN_MS / 1000
+    assert uart.written == b'\n\n'
+    uart.feed(b'{"b":2}\r\n')
+    assert card.receive() == b'{"b":2}\r\n'
+
+
+def test_Transaction_returnsParsedResponse():
+    uart = FakeUart(jsonResponder({'card.version': {'version': 'notecard-5.3.1'}}),
+                    maxWaiting=16)
+    card = openCard(uart)
+
+    rsp = card.Transaction({'req': 'card.version'})
+
+    assert rsp == {'version': 'notecard-5.3.1'}
+
+
+def test_Transaction_blocksOnPortInsteadOfPolling():
+    uart = PipeUart(jsonResponder({'card.version': {'version': '1'}}), latency=0.3)
+    try:
+        card = openCard(uart)
+        uart.waitingCalls = 0
+
+        rsp = card.Transaction({'req': 'card.version'})
+
+        assert rsp == {'version': '1'}
+        # Polling every 10 ms would ask about 30 times.
+        assert uart.waitingCalls < 10
+    finally:
+        uart.close()
+
+
+def test_Transaction_waitTimesOut():
+    uart = PipeUart(lambda line: None)
+    try:
+        card = openCard(uart)
+        start = time.time()
+
+        with pytest.raises(Exception, match='Timed out'):
+            card._transact(b'{"req":"card.version"}\n', True, timeout_secs=0.2)
+
+        assert time.time() - start < 1
+    finally:
+        uart.close()
+
+
+def test_OpenSerial_pollsWithoutFileno():
+    card = openCard(FakeUart())
+
+    assert card._wait_for_data is None
+
+
+def portUart(port, responder=None):
+    uart = FakeUart(responder)
+    uart.port = port
+    return uart
+
+
+def test_device_lock_path_isSharedAcrossDirectories():
+    path = notecard.device_lock_path('/dev/ttyACM0')
+
+    assert os.path.dirname(path) == tempfile.gettempdir()
+    assert os.path.basename(path) == 'notecard-dev_ttyACM0.lock'
+
+
+@pytest.mark.skipif(not notecard.notecard.use_serial_lock,
+                    reason='File locks are only used on Linux.')
+def test_OpenSerial_deviceLockStrategy_usesLockNamedAfterPort():
+    card = notecard.OpenSerial(portUart('/dev/ttyACM0'), lock_strategy='device')
+
+    assert card.lock_handle.lock_file == notecard.device_lock_path('/dev/ttyACM0')
+
+
+def test_OpenSerial_threadLockStrategy_sharedPerPortAndTimesOut():
+    card = notecard.OpenSerial(portUart('/dev/ttyTHREAD0'), lock_strategy='thread')
+    other = notecard.OpenSerial(portUart('/dev/ttyTHREAD0'), lock_strategy='thread')
+    timedOut = []
+
+    def lockFromOtherThread():
+        try:
+            other.lock_handle.acquire(timeout=0.05)
+        except notecard.SerialLockTimeout:
+            timedOut.append(True)
+
+    with card.locked():
+        thread = threading.Thread(target=lockFromOtherThread)
+        thread.start()
+        thread.join()
+
+    assert timedOut == [True]
+    other.lock_handle.acquire(timeout=0.05)
+    other.lock_handle.release()
+
+
+def test_locked_holdsThreadLockAcrossTransactions():
+    uart = portUart('/dev/ttyTHREAD1', jsonResponder({'card.version': {'version': '1'}}))
+    card = notecard.OpenSerial(uart, lock_strategy='thread')
+
+    with card.locked():
+        assert card.Transaction({'req': 'card.version'}) == {'version': '1'}
+        assert card.Transaction({'req': 'card.version'}) == {'version': '1'}
+
+    assert card.lock_handle._lock.acquire(blocking=False)
+    card.lock_handle._lock.release()
+
+
+def test_OpenSerial_unknownLockStrategy():
+    with pytest.raises(ValueError):
+        notecard.OpenSerial(FakeUart(), lock_strategy='mutex')
+
+
+class CountingLock:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, timeout=-1):
+        self.acquired += 1
+
+    def release(self):
+        pass
+
+
+def test_Transactions_locksOnceAndReturnsResponsesInOrder():
+    uart = FakeUart(jsonResponder({'card.version': {'version': '1'},
+                                   'hub.status': {'connected': True}}))
+    card = openCard(uart)
+    card.lock_handle = CountingLock()
+    uart.written = bytearray()
+
+    rsps = card.Transactions([{'req': 'card.version'},
+                              {'cmd': 'card.led'},
+                              {'req': 'hub.status'}])
+
+    assert rsps == [{'version': '1'}, None, {'connected': True}]
+    assert card.lock_handle.acquired == 1
+    lines = uart.written.split(b'\n')
+    assert b'"crc":"0000:' in lines[0]
+    assert b'"crc":"0002:' in lines[2]
+
+
+def test_Transactions_stopOnError():
+    uart = FakeUart(jsonResponder({'card.binary': {'err': 'no binary'}}))
+    card = openCard(uart)
+    reqs = [{'req': 'card.version'}, {'req': 'card.binary'}, {'req': 'hub.status'}]
+
+    assert len(card.Transactions(reqs, stop_on_error=True)) == 2
+    assert len(card.Transactions(reqs)) == 3
+
+
+def test_Transactions_reserializesIfAnotherRequestGotIn():
+    uart = FakeUart(jsonResponder({}))
+    card = openCard(uart)
+    realLocked = card.locked
+
+    def lockedAfterAnotherRequest():
+        card.Transaction({'req': 'hub.status'})
+        return realLocked()
+
+    card.locked = lockedAfterAnotherRequest
+    uart.written = bytearray()
+
+    card.Transactions([{'req': 'card.version'}])
+
+    assert b'"crc":"0001:' in uart.written.split(b'\n')[1]
+
+
+class TimeoutUart(FakeUart):
+    """A pyserial-like port without a fileno, as on Windows.
+
+    The `\\n` of the Notecard's `\\r\\n` arrives late: only after the host has
+    found nothing waiting once.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.timeout = None
+        self._late = bytearray()
+
+    def feed(self, data):
+        if data == b'\r\n':
+            self.rx.extend(b'\r')
+            self._late.extend(b'\n')
+        else:
+            super().feed(data)
+
+    @property
+    def in_waiting(self):
+        waiting = len(self.rx)
+        if waiting == 0:
+            self.rx.extend(self._late)
+            del self._late[:]
+        return waiting
+
+
+def test_quick_sync_withoutFileno():
+    uart = TimeoutUart()
+    card = openCard(uart)
+    assert card._wait_for_data == card._wait_for_data_read_timeout
+
+    assert card._quick_sync()
+    assert card._rx_buf == bytearray()
+
+
+class TimeoutSettingUart(TimeoutUart):
+    """A TimeoutUart that counts how often its timeout is set."""
+
+    def __init__(self):
+        self.timeoutSets = []
+        super().__init__()
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.timeoutSets.append(value)
+        self._timeout = value
+
+
+def test_waitForDataReadTimeout_setsPortTimeoutOnlyWhenItChanges():
+    uart = TimeoutSettingUart()
+    card = openCard(uart)
+    card._wait_for_data(0.01)
+    uart.timeoutSets = []
+
+    for _ in range(3):
+        card._wait_for_data(1)
+    card._wait_for_data(None)
+    card._wait_for_data(0.01)
+
+    assert uart.timeoutSets == [0.05, 0.01]
+
+
+def test_receive_noTimeoutWaitsWithoutSpinning():
+    uart = FakeUart()
+    card = openCard(uart)
+    waits = []
+
+    def recordingWait(timeout_secs):
+        waits.append(timeout_secs)
+        uart.feed(b'{}\r\n')
+    card._wait_for_data = recordingWait
+
+    assert card.receive(timeout_secs=0) == b'{}\r\n'
+    assert waits == [None]
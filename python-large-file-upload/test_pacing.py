@@ -0,0 +1,221 @@
+import json
+import notecard
+from notecard.pacing import AdaptivePacingPolicy, PacingPolicy, PacingProfileStore, \
+    TuningPacingPolicy, pacing_policy
+import pytest
+from testutil import FakeUart, jsonResponder
+
+
+def pacingOf(policy):
+    return (policy.segment_max_len, policy.segment_delay_ms, policy.chunk_delay_ms,
+            policy.chunk_pause_ms)
+
+
+def test_pacing_policy_presets():
+    safe = pacing_policy('safe')
+    fast = pacing_policy('fast')
+
+    assert (safe.segment_max_len, safe.segment_delay_ms) == (250, 250)
+    assert fast.segment_max_len > safe.segment_max_len
+    assert fast.segment_delay_ms == 0
+    assert isinstance(pacing_policy('auto'), AdaptivePacingPolicy)
+    assert isinstance(pacing_policy('tune'), TuningPacingPolicy)
+    assert safe.chunk_delay_ms == 20
+    assert fast.chunk_delay_ms == 0
+    assert safe.chunk_pause_ms == 5
+    assert fast.chunk_pause_ms == 0
+
+
+def test_pacing_policy_unknownPreset():
+    with pytest.raises(ValueError):
+        pacing_policy('ludicrous')
+
+
+def test_AdaptivePacingPolicy_backsOffOnErrorAndRecovers():
+    p = AdaptivePacingPolicy(recover_after=3)
+    fastest = pacingOf(p)
+
+    for _ in range(10):
+        p.on_error()
+    assert pacingOf(p) == AdaptivePacingPolicy.STEPS[-1]
+
+    for _ in range(3 * (len(AdaptivePacingPolicy.STEPS) - 1)):
+        p.on_success()
+    assert pacingOf(p) == fastest
+
+
+def test_AdaptivePacingPolicy_errorResetsSuccessCount():
+    p = AdaptivePacingPolicy(recover_after=3)
+    p.on_error()
+    p.on_error()
+    assert pacingOf(p) == AdaptivePacingPolicy.STEPS[2]
+
+    p.on_success()
+    p.on_success()
+    p.on_error()
+    p.on_success()
+    p.on_success()
+
+    assert pacingOf(p) == AdaptivePacingPolicy.STEPS[3]
+
+
+def test_OpenSerial_transmit_usesInstancePacing():
+    uart = FakeUart()
+    card = notecard.OpenSerial(uart)
+    card.SetPacing(PacingPolicy(100, 0))
+    uart.writeSizes = []
+
+    card.transmit(b'x' * 250)
+
+    assert uart.writeSizes == [100, 100, 50]
+
+
+def test_OpenSerial_transmit_defaultIsSafe():
+    uart = FakeUart()
+    card = notecard.OpenSerial(uart)
+    uart.writeSizes = []
+
+    card.transmit(b'x' * 600, delay=False)
+
+    assert uart.writeSizes == [250, 250, 100]
+
+
+def test_Transaction_ioErrorSlowsAutoPacing():
+    rsps = iter([{'err': 'serial {io}'}, {'err': 'serial {io}'}, {}])
+    uart = FakeUart(lambda line: json.dumps(next(rsps)).encode() + b'\r\n')
+    card = notecard.OpenSerial(uart)
+    card.SetPacing('auto')
+
+    card.Transaction({'req': 'card.version'})
+
+    assert pacingOf(card.GetPacing()) == \
+        AdaptivePacingPolicy.STEPS[2]
+
+
+def test_Transaction_successDoesNotSlowPacing():
+    uart = FakeUart(jsonResponder({}))
+    card = notecard.OpenSerial(uart)
+    card.SetPacing('fast')
+
+    card.Transaction({'req': 'card.version'})
+
+    assert card.GetPacing().segment_delay_ms == 0
+
+
+def test_TuningPacingPolicy_tightensUntilErrorThenSettles():
+    p = TuningPacingPolicy(tighten_after=2)
+    assert pacingOf(p) == \
+        TuningPacingPolicy.PROFILES[0]
+
+    for _ in range(6):
+        p.on_success()
+    assert pacingOf(p) == \
+        TuningPacingPolicy.PROFILES[3]
+
+    p.on_error()
+    for _ in range(10):
+        p.on_success()
+
+    assert p.tuned
+    assert pacingOf(p) == \
+        TuningPacingPolicy.PROFILES[2]
+
+
+def test_TuningPacingPolicy_errorAtSafestProfileDoesNotSettle():
+    p = TuningPacingPolicy(tighten_after=2)
+    p.on_success()
+
+    p.on_error()
+
+    assert not p.tuned
+    assert pacingOf(p) == TuningPacingPolicy.PROFILES[0]
+    p.on_success()
+    p.on_success()
+    assert pacingOf(p) == TuningPacingPolicy.PROFILES[1]
+
+
+def test_AdaptivePacingPolicy_adaptsChunkDelay():
+    p = AdaptivePacingPolicy()
+    assert p.chunk_delay_ms == 0
+
+    for _ in range(len(AdaptivePacingPolicy.STEPS)):
+        p.on_error()
+
+    assert p.chunk_delay_ms == 20
+
+
+def test_TuningPacingPolicy_tunedAtFastestProfile():
+    p = TuningPacingPolicy(tighten_after=1)
+
+    for _ in range(len(TuningPacingPolicy.PROFILES)):
+        p.on_success()
+
+    assert p.tuned
+    assert p.segment_delay_ms == 0
+
+
+def test_PacingProfileStore_savesPerDevice(tmp_path):
+    path = str(tmp_path / 'pacing.json')
+    store = PacingProfileStore(path)
+    assert store.load('dev:1') is None
+
+    store.save('dev:1', PacingPolicy(1024, 20, 2))
+    store.save('dev:2', PacingPolicy(512, 50, 5))
+    p = PacingProfileStore(path).load('dev:1')
+
+    assert pacingOf(p) == (1024, 20, 2, 5)
+
+
+def test_PacingProfileStore_loadedProfileBacksOffOnError(tmp_path):
+    path = str(tmp_path / 'pacing.json')
+    PacingProfileStore(path).save('dev:1', pacing_policy('fast'))
+    p = PacingProfileStore(path).load('dev:1')
+    assert pacingOf(p) == pacingOf(pacing_policy('fast'))
+
+    for _ in range(10):
+        p.on_error()
+
+    assert pacingOf(p) == pacingOf(pacing_policy('safe'))
+
+
+def test_PacingProfileStore_loadedProfileRecoversNoFasterThanSaved(tmp_path):
+    path = str(tmp_path / 'pacing.json')
+    PacingProfileStore(path).save('dev:1', PacingPolicy(1024, 20, 2, 1))
+    p = PacingProfileStore(path).load('dev:1')
+    p.recover_after = 1
+
+    assert p.steps == [(1024, 20, 2, 1)] + AdaptivePacingPolicy.STEPS[2:]
+
+    p.on_error()
+    p.on_error()
+    assert pacingOf(p) == AdaptivePacingPolicy.STEPS[-1]
+    for _ in range(5):
+        p.on_success()
+
+    assert pacingOf(p) == (1024, 20, 2, 1)
+
+
+def test_PacingProfileStore_loadsProfileSavedWithoutChunkPause(tmp_path):
+    path = tmp_path / 'pacing.json'
+    path.write_text(json.dumps({'dev:1': {'segment_max_len': 1024, 'segment_delay_ms': 20,
+                                          'chunk_delay_ms': 2}}))
+
+    p = PacingProfileStore(str(path)).load('dev:1')
+
+    assert p.chunk_pause_ms == 5
+
+
+def test_PacingProfileStore_replacesFileAtomically(tmp_path):
+    path = tmp_path / 'pacing.json'
+    store = PacingProfileStore(str(path))
+
+    store.save('dev:1', PacingPolicy(1024, 20, 2))
+
+    assert [f.name for f in tmp_path.iterdir()] == ['pacing.json']
+
+
+def test_PacingProfileStore_ignoresCorruptFile(tmp_path):
+    path = tmp_path / 'pacing.json'
+    path.write_text('{not json')
+
+    assert PacingProfileStore(str(path)).load('dev:1') is None
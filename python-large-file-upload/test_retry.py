@@ -0,0 +1,108 @@
+import binascii
+import notecard
+from notecard.retry import BackoffRetryPolicy, RetryPolicy, RETRY_CRC, RETRY_IO, \
+    RETRY_TRANSPORT
+from testutil import FakeUart
+
+
+def test_RetryPolicy_fixedDelayUntilMaxAttempts():
+    p = RetryPolicy(max_attempts=3, delay_ms=200)
+
+    assert p.retry_delay('card.version', RETRY_CRC, 1, 0, True) == 0.2
+    assert p.retry_delay('card.version', RETRY_IO, 2, 0, True) == 0.2
+    assert p.retry_delay('card.version', RETRY_IO, 3, 0, True) is None
+
+
+def test_RetryPolicy_deadline():
+    p = RetryPolicy(delay_ms=500, deadline_secs=2)
+
+    assert p.retry_delay('card.version', RETRY_IO, 1, 1.4, True) == 0.5
+    assert p.retry_delay('card.version', RETRY_IO, 1, 1.6, True) is None
+
+
+def test_RetryPolicy_nonIdempotentOnlyRetriedOnIoErrorWithoutCrc():
+    p = RetryPolicy()
+
+    assert p.retry_delay('note.add', RETRY_TRANSPORT, 1, 0, False) is None
+    assert p.retry_delay('note.add', RETRY_CRC, 1, 0, False) is None
+    assert p.retry_delay('note.add', RETRY_IO, 1, 0, False) is not None
+    assert p.retry_delay('note.add', RETRY_TRANSPORT, 1, 0, True) is not None
+
+
+def test_BackoffRetryPolicy_doublesPerKindUpToMax():
+    p = BackoffRetryPolicy(max_attempts=10, delays_ms={RETRY_IO: 100},
+                           max_delay_ms=500, jitter=0)
+
+    delays = [p.retry_delay('hub.sync', RETRY_IO, n, 0, True) for n in range(1, 6)]
+
+    assert delays == [0.1, 0.2, 0.4, 0.5, 0.5]
+    assert p.retry_delay('hub.sync', RETRY_CRC, 1, 0, True) == 0.01
+
+
+def test_BackoffRetryPolicy_jitterShortensDelay():
+    p = BackoffRetryPolicy(delays_ms={RETRY_IO: 100}, jitter=0.5)
+
+    for _ in range(20):
+        assert 0.05 <= p.retry_delay('hub.sync', RETRY_IO, 1, 0, True) <= 0.1
+
+
+def crcResponse(rsp):
+    body = rsp.encode()
+    crc = binascii.crc32(body) & 0xFFFFFFFF
+    return body[:-1] + f',"crc":"0000:{crc:08x}"}}\r\n'.encode()
+
+
+def test_Transaction_badResponseRetriedQuickly():
+    rsps = iter([b'{"crc":"0000:deadbeef"}\r\n', crcResponse('{"a":1}')])
+    card = notecard.OpenSerial(FakeUart(lambda line: next(rsps)))
+    card.SetPacing('fast')
+    received = []
+    card.SetMetricsSink(received.append)
+
+    assert card.Transaction({'req': 'card.version'})['a'] == 1
+    assert received[0].retries == 1
+    assert received[0].total_secs < 0.1
+
+
+def test_Transaction_perRequestPolicy():
+    calls = []
+
+    def respond(line):
+        calls.append(line)
+        return b'{"err":"serial {io}"}\r\n'
+
+    card = notecard.OpenSerial(FakeUart(respond))
+    card.SetRetryPolicy(RetryPolicy(max_attempts=2, delay_ms=0), req='hub.status')
+    card.SetRetryPolicy(RetryPolicy(max_attempts=1))
+
+    for req in ('hub.status', 'card.version'):
+        try:
+            card.Transaction({'req': req})
+        except Exception:
+            pass
+
+    assert [b'hub.status' in line for line in calls] == [True, True, False]
+
+
+def test_Transaction_noteAddWithoutCrcNotRetriedAfterBadResponse():
+    calls = []
+
+    def respond(line):
+        calls.append(line)
+        return b'not json\r\n'
+
+    card = notecard.OpenSerial(FakeUart(respond))
+
+    try:
+        card.Transaction({'req': 'note.add'})
+    except Exception:
+        pass
+
+    assert len(calls) == 1
+
+
+def test_Transaction_stillRetriesIdempotentRequests():
+    rsps = iter([b'not json\r\n', b'not json\r\n', b'{}\r\n'])
+    card = notecard.OpenSerial(FakeUart(lambda line: next(rsps)))
+
+    assert card.Transaction({'req': 'card.version'}) == {}
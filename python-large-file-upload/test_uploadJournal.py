@@ -0,0 +1,44 @@
+import io
+from uploadJournal import UploadJournal
+
+
+def test_fileKey_dependsOnContentAndRestoresPosition():
+    a = io.BytesIO(b'a' * 100)
+    b = io.BytesIO(b'b' * 100)
+    a.seek(10)
+
+    keyA = UploadJournal.fileKey(a)
+
+    assert a.tell() == 10
+    assert keyA != UploadJournal.fileKey(b)
+    assert keyA == UploadJournal.fileKey(io.BytesIO(b'a' * 100))
+    assert keyA != UploadJournal.fileKey(io.BytesIO(b'a' * 100), route='other')
+
+
+def test_fileKey_includesPath(tmp_path):
+    p = tmp_path / "data.bin"
+    p.write_bytes(b'x' * 10)
+
+    with open(p, 'rb') as f:
+        key = UploadJournal.fileKey(f)
+
+    assert str(p) in key
+
+
+def test_journal_persistsOffsets(tmp_path):
+    path = str(tmp_path / "journal.json")
+    j = UploadJournal(path)
+    j.record("k", 4096, 10000)
+
+    assert UploadJournal(path).getOffset("k") == 4096
+    assert UploadJournal(path).getOffset("other") == 0
+
+    j.remove("k")
+    assert UploadJournal(path).getOffset("k") == 0
+
+
+def test_journal_ignoresCorruptFile(tmp_path):
+    path = tmp_path / "journal.json"
+    path.write_text("{not json")
+
+    assert UploadJournal(str(path)).getOffset("k") == 0
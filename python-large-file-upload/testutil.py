@@ -0,0 +1,316 @@
+import binascii
+import copy
+import fcntl
+import hashlib
+import json
+import os
+import struct
+import termios
+import threading
+import time
+from notecard.cobs import cobs_decode
+from notecard.notecard import HeldLock
+
+
+class FakeUart:
+    """In-memory stand-in for a pyserial port with a Notecard on the other end.
+
+    Bytes written by the host are split into newline-terminated lines. A bare
+    newline is answered with `\\r\\n`, the same as a real Notecard does during a
+    reset. Every other line is passed to `responder`, and whatever it returns
+    is queued for the host to read.
+
+    With `record` False, the bytes written aren't kept in `written` and
+    `writeSizes`, so long benchmarks don't accumulate them.
+    """
+
+    def __init__(self, responder=None, maxWaiting=None, record=True):
+        self.responder = responder
+        self.maxWaiting = maxWaiting
+        self.record = record
+        self.rx = bytearray()
+        self.written = bytearray()
+        self.writeSizes = []
+        self.readCalls = 0
+        self._line = bytearray()
+
+    @property
+    def in_waiting(self):
+        if self.maxWaiting is None:
+            return len(self.rx)
+        return min(len(self.rx), self.maxWaiting)
+
+    def read(self, size=1):
+        self.readCalls += 1
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def write(self, data):
+        if self.record:
+            self.written.extend(data)
+            self.writeSizes.append(len(data))
+        self._line.extend(data)
+        while True:
+            idx = self._line.find(b'\n')
+            if idx == -1:
+                break
+            line = bytes(self._line[:idx])
+            del self._line[:idx + 1]
+            self._handleLine(line)
+
+        return len(data)
+
+    def feed(self, data):
+        self.rx.extend(data)
+
+    def _handleLine(self, line):
+        if line.strip() == b'':
+            self.feed(b'\r\n')
+            return
+
+        if self.responder is None:
+            return
+
+        rsp = self.responder(line)
+        if rsp is not None:
+            self.feed(rsp)
+
+
+class PipeUart(FakeUart):
+    """FakeUart whose receive side is an OS pipe, so it has a real fileno.
+
+    Responses arrive `latency` seconds after the request, from a timer
+    thread, the way a Notecard answers after doing some work. `waitingCalls`
+    counts how often the host asked how many bytes were waiting.
+    """
+
+    def __init__(self, responder=None, latency=0):
+        super().__init__(responder)
+        self.latency = latency
+        self.waitingCalls = 0
+        self._rfd, self._wfd = os.pipe()
+
+    def close(self):
+        os.close(self._rfd)
+        os.close(self._wfd)
+
+    def fileno(self):
+        return self._rfd
+
+    @property
+    def in_waiting(self):
+        self.waitingCalls += 1
+        buf = bytearray(4)
+        fcntl.ioctl(self._rfd, termios.FIONREAD, buf)
+        return struct.unpack('i', buf)[0]
+
+    def read(self, size=1):
+        self.readCalls += 1
+        return os.read(self._rfd, size) if size > 0 else b''
+
+    def feed(self, data):
+        os.write(self._wfd, data)
+
+    def _handleLine(self, line):
+        if self.latency == 0 or line.strip() == b'':
+            super()._handleLine(line)
+            return
+
+        timer = threading.Timer(self.latency, super()._handleLine, (line,))
+        timer.daemon = True
+        timer.start()
+
+
+def jsonResponder(responses):
+    """Build a FakeUart responder that answers each request by name.
+
+    `responses` maps a request name (e.g. "card.version") to the response
+    dictionary. Commands sent with "cmd" get no response.
+    """
+    def respond(line):
+        req = json.loads(line)
+        if 'req' not in req:
+            return None
+        rsp = responses.get(req['req'], {})
+        return json.dumps(rsp).encode('utf-8') + b'\r\n'
+
+    return respond
+
+
+_HALF_BYTE_CRC32_TABLE = [
+    0x00000000, 0x1DB71064, 0x3B6E20C8, 0x26D930AC, 0x76DC4190, 0x6B6B51F4,
+    0x4DB26158, 0x5005713C, 0xEDB88320, 0xF00F9344, 0xD6D6A3E8, 0xCB61B38C,
+    0x9B64C2B0, 0x86D3D2D4, 0xA00AE278, 0xBDBDF21C
+]
+
+
+def halfByteCrc32(data):
+    """The original half-byte CRC32 from notecard/crc32.py, kept as a reference."""
+    def rshift(val, amount):
+        return (val % (1 << 32)) >> amount
+
+    crc = ~0
+    for idx in range(len(data)):
+        crc = _HALF_BYTE_CRC32_TABLE[(crc ^ data[idx]) & 0x0F] ^ rshift(crc, 4)
+        crc = _HALF_BYTE_CRC32_TABLE[(crc ^ rshift(data[idx], 4)) & 0x0F] ^ rshift(crc, 4)
+
+    return ~crc & 0xffffffff
+
+
+class FakeNotecard:
+    """Transaction-level stand-in for a Notecard with a binary data store.
+
+    Supports the requests BinaryDataUploader and BinaryDataUploaderLegacy
+    make. Data sent after a card.binary.put is COBS decoded and checked
+    against its MD5, the same as the Notecard does. Web requests record the
+    offset, total, name and data (the store contents, or the decoded
+    payload) in `posts`.
+
+    It can also sit behind a FakeUart, by passing its `respond` method as the
+    responder, so the host's serial and CRC code runs too.
+
+    `latency` is the time in seconds each request takes, and `bandwidth` the
+    rate in bytes per second at which web requests send their data to
+    Notehub (None for no limit). With `keepData` False the data sent isn't
+    kept, so long benchmarks don't accumulate it.
+    """
+
+    def __init__(self, binaryMax=4096, latency=0, bandwidth=None, keepData=True):
+        self.binaryMax = binaryMax
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.keepData = keepData
+        self.store = bytearray()
+        self.requests = []
+        self.posts = []
+        self._debug = False
+        self._pendingPut = None
+        self._badBin = False
+
+    def lock(self):
+        pass
+
+    def unlock(self):
+        pass
+
+    def locked(self):
+        return HeldLock(self)
+
+    def GetTransactionCount(self):
+        return len(self.requests)
+
+    def Transaction(self, req, lock=True):
+        req = copy.deepcopy(req)
+        self.requests.append(req if self.keepData else {k: v for k, v in req.items() if k != 'payload'})
+        name = req.get('req', req.get('cmd'))
+        if self.latency:
+            time.sleep(self.latency)
+
+        if name == 'card.binary':
+            return self._cardBinary(req)
+        if name == 'card.binary.put':
+            self._pendingPut = req
+            return {}
+        if name in ('web.post', 'web.put'):
+            return self._web(req)
+        if name == 'hub.status':
+            return {'connected': True}
+
+        return {}
+
+    def transmit(self, data, delay=True):
+        put = self._pendingPut
+        self._pendingPut = None
+        data = bytes(data)
+        decoded = cobs_decode(data[:-1], ord('\n'))
+        if data[-1:] != b'\n' or put['cobs'] != len(data) - 1 or \
+                hashlib.md5(decoded).hexdigest() != put['status']:
+            self._badBin = True
+            return
+
+        self._badBin = False
+        offset = put.get('offset', 0)
+        self.store[offset:] = decoded
+
+    def respond(self, line):
+        """Answer a line sent over a FakeUart, adding a CRC like the Notecard does."""
+        if self._pendingPut is not None:
+            # The line following a card.binary.put is the COBS encoded data
+            self.transmit(line + b'\n')
+            return None
+
+        req = json.loads(line)
+        seqNumber = req.pop('crc', '0000:').split(':')[0]
+        rsp = self.Transaction(req)
+        if 'req' not in req:
+            return None
+
+        rspStr = json.dumps(rsp, separators=(',', ':'))
+        crcField = f'"crc":"{seqNumber}:{binascii.crc32(rspStr.encode()) & 0xFFFFFFFF:08x}"'
+        rspStr = rspStr[:-1] + ('' if rspStr == '{}' else ',') + crcField + '}'
+        return rspStr.encode() + b'\r\n'
+
+    def requestNames(self):
+        return [r.get('req', r.get('cmd')) for r in self.requests]
+
+    def uploadedBytes(self):
+        return b''.join(p['data'] for p in sorted(self.posts, key=lambda p: p['offset']))
+
+    def _cardBinary(self, req):
+        if req.get('delete'):
+            self.store = bytearray()
+            self._badBin = False
+            return {}
+
+        rsp = {'max': self.binaryMax}
+        if self.store:
+            rsp['length'] = len(self.store)
+        if self._badBin:
+            rsp['err'] = 'binary data corrupted {bad-bin}'
+        return rsp
+
+    def _web(self, req):
+        if req.get('binary'):
+            data = self.store
+        elif 'payload' in req:
+            data = binascii.a2b_base64(req['payload'])
+        else:
+            return {'result': 200}
+
+        if self.bandwidth:
+            time.sleep(len(data) / self.bandwidth)
+
+        self.posts.append({
+            'offset': req.get('offset'),
+            'total': req.get('total'),
+            'name': req.get('name'),
+            'data': bytes(data) if self.keepData else len(data),
+        })
+        return {'result': 200}
+
+
+class FakeI2C:
+    """Stand-in for a periphery I2C bus with a Notecard at any address.
+
+    The Notecard side is a FakeUart: serial-over-I2C writes are passed to it,
+    and reads return its queued bytes with the two byte header the Notecard
+    sends. `reads` counts the read transfers, including polls for data.
+    """
+
+    def __init__(self, responder=None):
+        self.uart = FakeUart(responder)
+        self.reads = 0
+
+    def transfer(self, address, messages):
+        if len(messages) == 1:
+            data = bytes(messages[0].data)
+            self.uart.write(data[1:1 + data[0]])
+            return
+
+        self.reads += 1
+        length = messages[0].data[1]
+        data = self.uart.read(length)
+        assert len(data) == length, 'Read more than the Notecard reported'
+        available = min(len(self.uart.rx), 255)
+        messages[1].data = bytes([available, length]) + data
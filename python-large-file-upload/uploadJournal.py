@@ -0,0 +1,88 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+class UploadJournal:
+    """
+    Small on-disk record of how much of each file has been acknowledged by Notehub
+
+    Entries are keyed by the file path, size and content hash, so a file that
+    changes between attempts starts over from the beginning. The journal is
+    rewritten atomically after every acknowledged chunk. Uploaders running on
+    different threads may share one journal.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self._path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            # A corrupt journal only costs a full re-send
+            return {}
+
+    def _save(self):
+        tmpPath = self._path + ".tmp"
+        with open(tmpPath, 'w') as f:
+            json.dump(self._entries, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath, self._path)
+
+    @staticmethod
+    def fileKey(data: io.IOBase, route=''):
+        """
+        Build the journal key for a seekable file. The file position is restored afterwards.
+        """
+        position = data.tell()
+        size = data.seek(0, 2)
+        data.seek(0, 0)
+
+        h = hashlib.md5()
+        block = data.read(HASH_BLOCK_SIZE)
+        while block:
+            h.update(block)
+            block = data.read(HASH_BLOCK_SIZE)
+        data.seek(position, 0)
+
+        path = getattr(data, 'name', '')
+        if not isinstance(path, str):
+            path = ''
+        path = os.path.abspath(path) if path else ''
+
+        return f"{path}|{size}|{h.hexdigest()}|{route}"
+
+    def getOffset(self, key):
+        """
+        Get the offset to resume from, or 0 if there's nothing to resume
+        """
+        return self._entries.get(key, {}).get('offset', 0)
+
+    def record(self, key, offset, total):
+        """
+        Record that Notehub has acknowledged everything before `offset`
+        """
+        with self._lock:
+            self._entries[key] = {"offset": offset, "total": total, "updated": int(time.time())}
+            self._save()
+
+    def remove(self, key):
+        """
+        Forget a file once it has been uploaded completely
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()